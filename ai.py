@@ -0,0 +1,179 @@
+"""Target-seeking ghosts: chase, scatter and flee
+
+Every ghost picks its way by the distance fields in navigation.py.
+Ghosts heading for the same cell share one field, and a field is only
+rebuilt when its target moves, so more ghosts do not mean more
+pathfinding.
+"""
+from navigation import DIRECTIONS, DIR_INDEX, MASK_DIRS, REVERSE, REVERSE_CLEAR, STOP, UNREACHABLE
+from scheduler import ticks_until
+
+# Seconds of scatter then chase per wave; the last chase never ends
+MODE_WAVES = ((7, 20), (7, 20), (5, 20), (5, None))
+
+# How far ahead of pacman the ambushing ghost aims
+AMBUSH_STEPS = 4
+# The shy ghost gives up the chase inside this many steps of pacman
+SHY_DISTANCE = 8
+
+class GhostAI:
+    """Steers ghosts towards a target cell that depends on the mode and the ghost"""
+    def __init__(self, game, state=None):
+        self.game = game
+        self.nav = game.nav
+        # Ghosts take turns being a chaser, an ambusher, a flanker and a shy one
+        self.personalities = (self.chase_target, self.ambush_target,
+                              self.flank_target, self.shy_target)
+        self.corners = self.scatter_corners()
+        if state is None:
+            self.reset()
+        else:
+            self.set_state(state)
+    
+    def reset(self):
+        """Start the scatter/chase waves again, e.g. after a life is lost"""
+        self.wave = 0
+        self.scatter = True
+        self.wave_start = self.game.ticks
+        self.wave_end = MODE_WAVES[0][0]
+        self.schedule_wave()
+    
+    def schedule_wave(self):
+        # Waves end a whole number of seconds after the reset; counting from it keeps ticks from rounding twice
+        self.game.timers.set('next_ghost_wave', self.wave_start + ticks_until(self.wave_end, self.game.speed))
+    
+    def state(self):
+        """Where the waves are, for snapshots and clones"""
+        return self.wave, self.scatter, self.wave_start, self.wave_end
+    
+    def set_state(self, state):
+        self.wave, self.scatter, self.wave_start, self.wave_end = state
+    
+    def next_wave(self):
+        """Switch between scatter and chase, when the wave timer fires"""
+        scatter, chase = MODE_WAVES[self.wave]
+        if self.scatter:
+            self.scatter = False
+            if chase is None:
+                return
+            self.wave_end += chase
+        else:
+            self.wave += 1
+            self.scatter = True
+            self.wave_end += MODE_WAVES[self.wave][0]
+        self.schedule_wave()
+    
+    def scatter_corners(self):
+        """Walkable cells nearest the four corners, worked out once per maze"""
+        nav = self.nav
+        if not hasattr(nav, 'scatter_corners'):
+            nav.scatter_corners = [self.nearest_walkable(y, x) for y, x in
+                                   ((0, nav.width - 1), (0, 0), (nav.height - 1, nav.width - 1), (nav.height - 1, 0))]
+        return nav.scatter_corners
+    
+    def nearest_walkable(self, y, x):
+        """Walkable cell closest to (y, x) as the crow flies, for scatter corners
+
+        Searches square rings of growing radius around (y, x), which only
+        visits cells near the answer even on very large mazes.
+        """
+        nav = self.nav
+        best = None
+        for r in range(max(nav.width, nav.height)):
+            if best and r * r > best[0]:
+                break
+            for cy in range(y - r, y + r + 1):
+                if not 0 <= cy < nav.height:
+                    continue
+                edge = cy in (y - r, y + r)
+                for cx in range(x - r, x + r + 1) if edge else (x - r, x + r):
+                    if 0 <= cx < nav.width and nav.walkable[cy * nav.width + cx]:
+                        # Ties go to the lowest cell index
+                        candidate = ((cy - y) ** 2 + (cx - x) ** 2, cy * nav.width + cx)
+                        if best is None or candidate < best:
+                            best = candidate
+        return best[1] if best else 0
+    
+    def scattering(self):
+        return self.scatter
+    
+    def pacman_cell(self):
+        pacman = self.game.pacman
+        return pacman.y * self.nav.width + pacman.x
+    
+    def cell_ahead(self, steps):
+        """The cell pacman reaches after up to steps moves in a straight line"""
+        pacman = self.game.pacman
+        cell = self.pacman_cell()
+        heading = DIR_INDEX[(pacman.dy + 1) * 3 + pacman.dx + 1]
+        for _ in range(steps):
+            if heading >= len(DIRECTIONS) or not self.nav.exits[cell] >> heading & 1:
+                break
+            cell += self.nav.offsets[heading]
+        return cell
+    
+    def chase_target(self, index):
+        return self.pacman_cell()
+    
+    def ambush_target(self, index):
+        return self.cell_ahead(AMBUSH_STEPS)
+    
+    def flank_target(self, index):
+        return self.cell_ahead(AMBUSH_STEPS // 2)
+    
+    def shy_target(self, index):
+        ghost = self.game.ghosts[index]
+        field = self.nav.distance_field(self.pacman_cell())
+        if field.distance(ghost.y * self.nav.width + ghost.x) < SHY_DISTANCE:
+            return self.corners[index % len(self.corners)]
+        return self.pacman_cell()
+    
+    def exits(self, cell, mask, heading):
+        """(direction, next cell) pairs out of cell, tunnels included, never reversing"""
+        nav = self.nav
+        if cell not in nav.warp_cells:
+            return [(d, cell + d[0] * nav.width + d[1]) for d in MASK_DIRS[mask & REVERSE_CLEAR[heading]]]
+        options = []
+        for i, d in enumerate(DIRECTIONS):
+            if i == REVERSE[heading]:
+                continue
+            if mask >> i & 1:
+                options.append((d, cell + nav.offsets[i]))
+            elif cell * 5 + i in nav.warps:
+                options.append((d, nav.warps[cell * 5 + i]))
+        return options
+    
+    def steer(self, ghost, index, cell, mask):
+        """Point the ghost down the exit that best serves its current goal"""
+        heading = DIR_INDEX[(ghost.dy + 1) * 3 + ghost.dx + 1]
+        options = self.exits(cell, mask, heading)
+        if not options:
+            # Dead end: turning back is the only way out
+            options = self.exits(cell, mask, STOP)
+            if not options:
+                return
+        if len(options) == 1:
+            ghost.dy, ghost.dx = options[0][0]
+            return
+        
+        nav = self.nav
+        if ghost.frightened:
+            # Run from pacman: take the exit that ends up farthest away
+            field = nav.distance_field(self.pacman_cell())
+            sign = -1
+        else:
+            if self.scattering():
+                target = self.corners[index % len(self.corners)]
+            else:
+                target = self.personalities[index % len(self.personalities)](index)
+            field = nav.distance_field(target)
+            sign = 1
+        
+        best = None
+        for direction, next_cell in options:
+            d = field.distance(next_cell)
+            if d >= UNREACHABLE:
+                continue
+            if best is None or sign * d < best[0]:
+                best = (sign * d, direction)
+        ghost.dy, ghost.dx = best[1] if best else options[0][0]
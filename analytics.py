@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Aggregates and heatmaps from gameplay event logs
+
+Reads logs written by pacman.py --events or replay.py --events, in
+either format, streaming one event at a time, so memory stays the same
+however long the logs are. It reports:
+- how often each kind of event happened
+- ticks taken to clear each level, by level
+- lives lost per level
+- ghosts eaten per power pill, and how many were eaten on each pill
+- heatmaps of where pacman died and where ghosts were eaten
+
+    python3 analytics.py game.jsonl more.evt --map pacman-map.txt
+    python3 analytics.py game.evt --level 1 --json summary.json
+"""
+import argparse
+import json
+import statistics
+from collections import Counter, defaultdict
+
+from events import (GAME_START, GHOST_EATEN, KINDS, LEVEL_CLEARED, LEVEL_START, LIFE_LOST, POWER_END,
+                    POWER_PILL, read_events)
+from mapcache import load_maze
+
+# Heatmap shading from fewest to most events; walls are drawn as '#'
+SHADES = '.:-=+*%@'
+
+class Summary:
+    """Running totals over a stream of events"""
+    def __init__(self):
+        self.counts = Counter()
+        self.deaths = Counter()
+        self.ghost_eats = Counter()
+        self.deaths_by_level = Counter()
+        # Ticks taken to clear each level, by level
+        self.clear_ticks = defaultdict(list)
+        self.level_start = None
+        # Ghosts eaten on each power pill, by how many were eaten
+        self.ghosts_per_pill = Counter()
+        self.pill_ghosts = None
+        # Ticks played, summed over every log read
+        self.ticks = 0
+        self.last_tick = None
+    
+    def add(self, event):
+        tick, kind, level, y, x, value = event
+        self.counts[kind] += 1
+        if self.last_tick is None or tick < self.last_tick:
+            # The start of a log
+            self.level_start = tick
+        else:
+            self.ticks += tick - self.last_tick
+        self.last_tick = tick
+        if kind == LEVEL_START or kind == GAME_START:
+            self.level_start = tick
+            self.end_pill()
+        elif kind == LEVEL_CLEARED:
+            if self.level_start is not None:
+                self.clear_ticks[level].append(tick - self.level_start)
+            self.level_start = None
+            self.end_pill()
+        elif kind == LIFE_LOST:
+            self.deaths[y, x] += 1
+            self.deaths_by_level[level] += 1
+            self.end_pill()
+        elif kind == GHOST_EATEN:
+            self.ghost_eats[y, x] += 1
+            if self.pill_ghosts is not None:
+                self.pill_ghosts += 1
+        elif kind == POWER_PILL:
+            self.end_pill()
+            self.pill_ghosts = 0
+        elif kind == POWER_END:
+            self.end_pill()
+    
+    def end_pill(self):
+        """Close the count of ghosts eaten on the last power pill, if one is open"""
+        if self.pill_ghosts is not None:
+            self.ghosts_per_pill[self.pill_ghosts] += 1
+            self.pill_ghosts = None
+    
+    def finish(self):
+        self.end_pill()
+        return self
+    
+    def as_dict(self):
+        pills = sum(self.ghosts_per_pill.values())
+        clear_ticks = self.clear_ticks
+        return {
+            'ticks': self.ticks,
+            'events': {KINDS[kind]: count for kind, count in sorted(self.counts.items())},
+            'levels': {
+                level: {
+                    'cleared': len(clear_ticks.get(level, ())),
+                    'median_clear_ticks': statistics.median(clear_ticks[level]) if clear_ticks.get(level) else None,
+                    'lives_lost': self.deaths_by_level.get(level, 0),
+                }
+                for level in sorted(set(clear_ticks) | set(self.deaths_by_level))
+            },
+            'ghosts_per_pill': self.counts[GHOST_EATEN] / pills if pills else 0.0,
+            'ghosts_eaten_on_a_pill': {count: pills for count, pills in sorted(self.ghosts_per_pill.items())},
+        }
+
+def summarise(paths, level=None):
+    """A Summary of the events in the files at paths, optionally of one level"""
+    summary = Summary()
+    for path in paths:
+        for event in read_events(path):
+            if level is None or event.level == level:
+                summary.add(event)
+    return summary.finish()
+
+def heatmap(counts, height=None, width=None, walls=None):
+    """Lines of text shading each cell by its count in counts, keyed by (y, x)
+
+    walls, a Maze, draws the maze's walls and sets the size; otherwise
+    the map covers every cell counted.
+    """
+    if walls:
+        height, width = walls.height, walls.width
+    elif height is None:
+        height = max((y for y, _ in counts), default=-1) + 1
+        width = max((x for _, x in counts), default=-1) + 1
+    most = max(counts.values(), default=0)
+    lines = []
+    for y in range(height):
+        line = []
+        for x in range(width):
+            count = counts.get((y, x))
+            if count:
+                line.append(SHADES[min(len(SHADES) - 1, (count - 1) * len(SHADES) // most)])
+            elif walls and not walls.is_valid_move(y, x):
+                line.append('#')
+            else:
+                line.append(' ')
+        lines.append(''.join(line).rstrip())
+    return lines
+
+def report(summary, maze=None):
+    data = summary.as_dict()
+    print(f"{data['ticks']} ticks, {sum(summary.counts.values())} events")
+    print('  ' + ', '.join(f"{name} {count}" for name, count in data['events'].items()))
+    for level, stats in data['levels'].items():
+        median = stats['median_clear_ticks']
+        cleared = f"cleared {stats['cleared']}x, median {median:.0f} ticks" if median is not None else "never cleared"
+        print(f"level {level}: {cleared}, {stats['lives_lost']} lives lost")
+    spread = ', '.join(f"{count}: {pills}" for count, pills in data['ghosts_eaten_on_a_pill'].items())
+    print(f"ghosts eaten per power pill: {data['ghosts_per_pill']:.2f} ({spread or 'no pills'})")
+    for title, counts in (('deaths', summary.deaths), ('ghosts eaten', summary.ghost_eats)):
+        if counts:
+            print(f"\nwhere {title} happened (most: {max(counts.values())}, shaded {SHADES!r}):")
+            for line in heatmap(counts, walls=maze):
+                print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise gameplay event logs')
+    parser.add_argument('logs', nargs='+', help='files written by --events, JSON lines or binary')
+    parser.add_argument('--map', help='draw the heatmaps over this map')
+    parser.add_argument('--level', type=int, default=None, help='only count events on this level')
+    parser.add_argument('--json', metavar='FILE', help='also write the aggregates to FILE')
+    args = parser.parse_args()
+    
+    summary = summarise(args.logs, args.level)
+    report(summary, load_maze(args.map) if args.map else None)
+    if args.json:
+        data = summary.as_dict()
+        data['deaths'] = [[y, x, count] for (y, x), count in sorted(summary.deaths.items())]
+        data['ghost_eats'] = [[y, x, count] for (y, x), count in sorted(summary.ghost_eats.items())]
+        with open(args.json, 'w') as f:
+            json.dump(data, f, indent=2)
+
+if __name__ == '__main__':
+    main()
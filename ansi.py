@@ -0,0 +1,276 @@
+"""Drawing the game as ANSI escape sequences instead of through curses
+
+AnsiScreen stands in for the curses window CursesRenderer draws on. It
+turns each frame's writes into cursor moves, colour changes and text,
+and hands the bytes to a callback on refresh(). CursesRenderer already
+repaints only the cells that changed, so a frame is usually a few dozen
+bytes. The bytes can be sent to a network client that has no curses.
+
+FrameScreen is the local terminal's alternative to curses output (pacman.py
+--backend ansi). It keeps the last frame sent as rows of characters and
+SGR attributes, diffs each new frame against it a row at a time and sends
+only the runs that changed, as one write per frame.
+"""
+import curses
+import os
+import sys
+
+ESC = '\x1b['
+# Full frames start from a clean screen with the cursor hidden
+CLEAR = ESC + '0m' + ESC + '2J' + ESC + '?25l'
+# Puts a client's terminal back the way it was: colours, cursor, a fresh line
+RESTORE = ESC + '0m' + ESC + '?25h\r\n'
+
+# SGR parameters for the curses attributes CursesRenderer passes to addstr
+CURSES_SGR = {
+    0: '0',
+    curses.A_BOLD: '0;1',
+    curses.A_REVERSE: '0;7',
+}
+
+# (character, SGR parameters) for each kind of cell, as curses_glyphs() gives for curses
+ANSI_GLYPHS = {
+    'pacman': ('C', '0;1;33'),
+    'wall': ('#', '0;34'),
+    'pellet': ('.', '0;37'),
+    'ghost': ('W', '0;1;31'),
+    'frightened': ('M', '0;36'),
+    'fruit': ('*', '0;35'),
+    'pill': ('O', '0;1;32'),
+    'blank': (' ', '0'),
+}
+
+# The curses color pairs, which are all on black, as SGR parameters
+PAIR_SGR = {
+    'pacman': '0;1;33;40',
+    'wall': '0;34;40',
+    'pellet': '0;37;40',
+    'ghost': '0;1;31;40',
+    'frightened': '0;36;40',
+    'fruit': '0;35;40',
+    'pill': '0;1;32;40',
+    'blank': '0;37;40',
+}
+# The attributes CursesRenderer passes to addstr, over curses' default white on black
+TERMINAL_SGR = {
+    0: '0;37;40',
+    curses.A_BOLD: '0;1;37;40',
+    curses.A_REVERSE: '0;7;37;40',
+}
+# Widest gap of unchanged cells that may be sent again rather than skipped
+MERGE_GAP = 8
+
+def terminal_glyphs(encoding=None):
+    """(character, SGR parameters) for each kind of cell in the curses colors, for FrameScreen
+
+    Walls are the checkerboard curses draws for ACS_CKBOARD where the
+    terminal takes UTF-8, and '#' elsewhere.
+    """
+    encoding = (encoding or sys.stdout.encoding or '').lower().replace('-', '')
+    glyphs = {name: (char, PAIR_SGR[name]) for name, (char, _) in ANSI_GLYPHS.items()}
+    if encoding == 'utf8':
+        glyphs['wall'] = ('\u2592', PAIR_SGR['wall'])
+    return glyphs
+
+def fd_writer(fd):
+    """A write(data) for FrameScreen that sends data to a file descriptor, unbuffered"""
+    def write(data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    return write
+
+class AnsiScreen:
+    """Just enough of a curses window for CursesRenderer, writing ANSI text
+
+    Writes are buffered until refresh(), which passes the frame to
+    write(data) as bytes. Cursor moves and colour changes are left out
+    where the cursor or colour is already right.
+    """
+    def __init__(self, rows, cols, write):
+        self.rows = rows
+        self.cols = cols
+        self.write = write
+        self.parts = []
+        # Where the cursor is and which SGR is in effect, None when unknown
+        self.y = None
+        self.x = None
+        self.sgr = None
+    
+    def resize(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+    
+    def getmaxyx(self):
+        return self.rows, self.cols
+    
+    def emit(self, y, x, text, sgr):
+        if not (0 <= y < self.rows and 0 <= x < self.cols):
+            return
+        text = text[:self.cols - x]
+        parts = self.parts
+        if y != self.y or x != self.x:
+            parts.append(f"{ESC}{y + 1};{x + 1}H")
+        if sgr != self.sgr:
+            parts.append(f"{ESC}{sgr}m")
+            self.sgr = sgr
+        parts.append(text)
+        self.y = y
+        self.x = x + len(text)
+    
+    def addch(self, y, x, ch, attr=0):
+        self.emit(y, x, ch, attr if isinstance(attr, str) else CURSES_SGR.get(attr, '0'))
+    
+    def addstr(self, y, x, text, attr=0):
+        self.emit(y, x, text, attr if isinstance(attr, str) else CURSES_SGR.get(attr, '0'))
+    
+    def erase(self):
+        self.parts.append(CLEAR)
+        self.y = self.x = self.sgr = None
+    
+    def refresh(self):
+        if self.parts:
+            data = ''.join(self.parts).encode()
+            self.parts = []
+            self.write(data)
+    
+    def getch(self):
+        return -1
+
+def rewrite_cost(chars, sgrs, start, stop, sgr):
+    """Bytes to send the cells from start up to stop again, starting in sgr"""
+    cost = 0
+    for x in range(start, stop):
+        if sgrs[x] != sgr:
+            sgr = sgrs[x]
+            cost += len(sgr) + 3
+        cost += len(chars[x].encode())
+    return cost
+
+class FrameScreen:
+    """Just enough of a curses window for CursesRenderer, sending each frame as one ANSI write
+
+    Drawing goes into a buffer of characters and SGR attributes. refresh()
+    compares it with what was last sent, row by row, and passes write(data)
+    the cursor moves, colour changes and text for the runs that changed,
+    so erasing and redrawing the screen costs nothing for cells that came
+    back the same. The size follows window, the curses screen.
+    """
+    def __init__(self, window, write, attrs=TERMINAL_SGR):
+        self.window = window
+        self.write = write
+        self.attrs = attrs
+        self.blank = attrs[0]
+        self.allocate(*window.getmaxyx())
+        # Bytes sent: in all, in the last frame and in the largest
+        self.frames = 0
+        self.bytes = 0
+        self.frame_bytes = 0
+        self.max_frame_bytes = 0
+    
+    def allocate(self, rows, cols):
+        """Start over at a new size, clearing the terminal with the next frame"""
+        self.rows = rows
+        self.cols = cols
+        self.chars = [[' '] * cols for _ in range(rows)]
+        self.sgrs = [[self.blank] * cols for _ in range(rows)]
+        self.shown_chars = [[' '] * cols for _ in range(rows)]
+        self.shown_sgrs = [[self.blank] * cols for _ in range(rows)]
+        self.dirty = set(range(rows))
+        self.cleared = False
+    
+    def getmaxyx(self):
+        return self.window.getmaxyx()
+    
+    def put(self, y, x, text, attr):
+        if not (0 <= y < self.rows and 0 <= x < self.cols):
+            return
+        text = text[:self.cols - x]
+        end = x + len(text)
+        self.chars[y][x:end] = text
+        self.sgrs[y][x:end] = [attr if isinstance(attr, str) else self.attrs.get(attr, self.blank)] * len(text)
+        self.dirty.add(y)
+    
+    def addch(self, y, x, ch, attr=0):
+        self.put(y, x, ch, attr)
+    
+    def addstr(self, y, x, text, attr=0):
+        self.put(y, x, text, attr)
+    
+    def erase(self):
+        if (self.rows, self.cols) != self.window.getmaxyx():
+            self.allocate(*self.window.getmaxyx())
+            return
+        blank = self.blank
+        for y in range(self.rows):
+            self.chars[y] = [' '] * self.cols
+            self.sgrs[y] = [blank] * self.cols
+        self.dirty = set(range(self.rows))
+    
+    def refresh(self):
+        parts = []
+        if not self.cleared:
+            parts.append(f"{ESC}{self.blank}m{ESC}2J{ESC}?25l")
+            self.cleared = True
+        # Other output, such as curses' own, may have moved the cursor since the last frame
+        cursor_y = cursor_x = sgr = None
+        if parts:
+            sgr = self.blank
+        cols = self.cols
+        for y in sorted(self.dirty):
+            chars, sgrs = self.chars[y], self.sgrs[y]
+            shown_chars, shown_sgrs = self.shown_chars[y], self.shown_sgrs[y]
+            if chars == shown_chars and sgrs == shown_sgrs:
+                continue
+            changed = [x for x in range(cols) if chars[x] != shown_chars[x] or sgrs[x] != shown_sgrs[x]]
+            index = 0
+            while index < len(changed):
+                start = end = changed[index]
+                index += 1
+                while index < len(changed):
+                    # Send the unchanged cells up to the next change again if that is
+                    # cheaper than moving the cursor past them
+                    gap = changed[index] - end - 1
+                    if gap > MERGE_GAP:
+                        break
+                    if rewrite_cost(chars, sgrs, end + 1, changed[index], sgrs[end]) > len(str(gap)) + 3:
+                        break
+                    end = changed[index]
+                    index += 1
+                if cursor_y != y or cursor_x is None or cursor_x > start:
+                    parts.append(f"{ESC}{y + 1};{start + 1}H")
+                elif cursor_x < start:
+                    parts.append(f"{ESC}{start - cursor_x}C")
+                for x in range(start, end + 1):
+                    if sgrs[x] != sgr:
+                        sgr = sgrs[x]
+                        parts.append(f"{ESC}{sgr}m")
+                    parts.append(chars[x])
+                cursor_y = y
+                # Past the last column the cursor waits to wrap, so its place is unknown
+                cursor_x = end + 1 if end + 1 < cols else None
+            self.shown_chars[y] = chars[:]
+            self.shown_sgrs[y] = sgrs[:]
+        self.dirty.clear()
+        if parts:
+            data = ''.join(parts).encode()
+            self.write(data)
+            size = len(data)
+        else:
+            size = 0
+        self.frames += 1
+        self.bytes += size
+        self.frame_bytes = size
+        if size > self.max_frame_bytes:
+            self.max_frame_bytes = size
+    
+    def getch(self):
+        return self.window.getch()
+    
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'bytes_per_frame': self.bytes / self.frames if self.frames else 0.0,
+            'max_frame_bytes': self.max_frame_bytes,
+        }
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Autopilot that plays Pac-Man by searching ahead
+
+Before each move the autopilot runs as many rollouts as its time budget
+allows. A rollout clones the game, takes one of pacman's possible
+directions, then plays on for a few dozen ticks with a cheap random
+policy; it is worth the points scored, minus a large penalty for losing
+a life. Directions are sampled by UCB1, so promising ones get most of
+the rollouts, and the direction with the best average wins. Rollouts can
+be spread over worker processes, which each get a snapshot of the game.
+
+It drives the live game with pacman.py --autopilot, or plays headless
+games for evaluation, reporting rollouts/sec:
+
+    python3 autopilot.py --games 5 --budget 0.05
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from mapcache import load_maze
+from mazegen import level_maze
+from montecarlo import greedy_policy
+from navigation import DIRECTIONS, DIR_INDEX, JUNCTION
+from simulation import Simulation
+
+# Ticks played out by each rollout
+ROLLOUT_DEPTH = 40
+# Value of losing a life, against points scored
+DEATH_PENALTY = 2000
+# Bonus for the way to the nearest dot, which breaks ties when no rollout scores
+GREEDY_BONUS = 5
+# UCB1 exploration constant, in points
+EXPLORATION = 100
+
+def rollout_policy(game, rng):
+    """Keep going, turning at random at junctions but never straight back"""
+    pacman = game.pacman
+    cell = pacman.y * game.width + pacman.x
+    heading = DIR_INDEX[(pacman.dy + 1) * 3 + pacman.dx + 1]
+    exits = game.nav.exits[cell]
+    if JUNCTION[exits] or not exits >> heading & 1:
+        choices = game.nav.directions(cell, heading)
+        return rng.choice(choices) if choices else None
+    return None
+
+def rollout(game, direction, depth, rng):
+    """Value of heading in direction and then playing on at random"""
+    sim = game.clone(rng)
+    score, lives = sim.score, sim.lives
+    action = direction
+    for _ in range(depth):
+        sim.step(action)
+        if sim.lives < lives or sim.game_over:
+            return sim.score - score - DEATH_PENALTY
+        if sim.won:
+            break
+        action = rollout_policy(sim, rng)
+    return sim.score - score
+
+def candidate_moves(game):
+    """Directions pacman can set off in from where it stands, tunnels included"""
+    pacman = game.pacman
+    cell = pacman.y * game.width + pacman.x
+    return sorted({DIRECTIONS[i] for i, _ in game.nav.moves(cell)}, key=DIRECTIONS.index)
+
+def search(game, budget, rng, depth=ROLLOUT_DEPTH):
+    """Run UCB1-sampled rollouts for budget seconds; returns {direction: [total value, rollouts]}"""
+    moves = candidate_moves(game)
+    stats = {direction: [0.0, 0] for direction in moves}
+    if len(moves) < 2:
+        return stats
+    deadline = time.perf_counter() + budget
+    total = 0
+    while True:
+        best = None
+        for direction, (value, count) in stats.items():
+            if not count:
+                best = direction
+                break
+            ucb = value / count + EXPLORATION * math.sqrt(math.log(total) / count)
+            if best is None or ucb > best_ucb:
+                best, best_ucb = direction, ucb
+        stats[best][0] += rollout(game, best, depth, rng)
+        stats[best][1] += 1
+        total += 1
+        if time.perf_counter() >= deadline and total >= len(moves):
+            return stats
+
+# Per-process games restored from snapshots, by map file and generated level
+_worker_games = {}
+
+def search_snapshot(args):
+    """Worker entry point: search from a snapshot of a game on map_file
+
+    level is None on the map itself, or (LevelQueue.spec(), level) for a
+    generated maze, which the worker makes for itself once.
+    """
+    map_file, level, ghost_ai, snapshot, budget, seed, depth = args
+    game = _worker_games.get((map_file, level))
+    if game is None:
+        maze = level_maze(dict(level[0]), level[1]) if level else map_file
+        game = _worker_games[map_file, level] = Simulation(maze, rng=random.Random(), ghost_ai=ghost_ai)
+    game.restore(snapshot)
+    return search(game, budget, random.Random(seed), depth)
+
+class Autopilot:
+    """Chooses pacman's moves by rollout search within a time budget per move
+
+    With workers > 1 every decision is searched in that many processes at
+    once, each from a snapshot of the game, and their statistics pooled;
+    map_file must then name the game's map.
+    """
+    def __init__(self, budget=0.05, workers=1, map_file=None, depth=ROLLOUT_DEPTH, seed=None):
+        self.budget = budget
+        self.workers = workers
+        self.map_file = map_file
+        self.depth = depth
+        self.rng = random.Random(seed)
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.rollouts = 0
+        self.search_time = 0.0
+        self.moves = 0
+    
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+    
+    def choose(self, game, budget=None):
+        """The direction pacman should take next, searched for budget seconds (default self.budget)"""
+        budget = self.budget if budget is None else budget
+        start = time.perf_counter()
+        if self.pool:
+            snapshot = game.snapshot()
+            level = (tuple(game.levels.spec().items()), game.level) if game.levels and game.level > 1 else None
+            jobs = [(self.map_file, level, game.ghost_ai, snapshot, budget, self.rng.randrange(1 << 32), self.depth)
+                    for _ in range(self.workers)]
+            stats = {}
+            for result in self.pool.map(search_snapshot, jobs):
+                for direction, (value, count) in result.items():
+                    pooled = stats.setdefault(direction, [0.0, 0])
+                    pooled[0] += value
+                    pooled[1] += count
+        else:
+            stats = search(game, budget, self.rng, self.depth)
+        self.search_time += time.perf_counter() - start
+        self.moves += 1
+        self.rollouts += sum(count for _, count in stats.values())
+        
+        if not stats:
+            return None
+        greedy = greedy_policy(game, self.rng)
+        return max(stats, key=lambda d: (stats[d][0] / stats[d][1] if stats[d][1] else -math.inf)
+                   + (GREEDY_BONUS if d == greedy else 0))
+    
+    def rollouts_per_sec(self):
+        return self.rollouts / self.search_time if self.search_time else 0.0
+
+def clone_cost(game, count=10000):
+    """Mean seconds for one clone of game"""
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(count):
+        game.clone(rng)
+    return (time.perf_counter() - start) / count
+
+def play(map_file, seed, autopilot, max_ticks, max_levels):
+    """Play one headless game under the autopilot; returns (score, levels cleared, ticks)"""
+    game = Simulation(map_file, rng=random.Random(seed))
+    ticks = 0
+    while ticks < max_ticks:
+        in_play = game.step(autopilot.choose(game))
+        ticks += 1
+        if not in_play:
+            if game.game_over or game.level >= max_levels:
+                break
+            game.next_level()
+    return game.score, game.level - 1 + game.won, ticks
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate the search autopilot on headless games')
+    parser.add_argument('map_file', nargs='?', default='pacman-map.txt')
+    parser.add_argument('--games', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--budget', type=float, default=0.02, help='seconds of search per move')
+    parser.add_argument('--depth', type=int, default=ROLLOUT_DEPTH, help='ticks per rollout')
+    parser.add_argument('--workers', type=int, default=1, help=f"rollout processes (this machine has {os.cpu_count()} cores)")
+    parser.add_argument('--max-ticks', type=int, default=2000, help='per game')
+    parser.add_argument('--max-levels', type=int, default=5, help='per game')
+    args = parser.parse_args()
+    
+    game = Simulation(load_maze(args.map_file))
+    print(f"clone: {clone_cost(game) * 1e6:.1f} us")
+    
+    autopilot = Autopilot(args.budget, args.workers, args.map_file, args.depth, args.seed)
+    try:
+        scores = []
+        for seed in range(args.seed, args.seed + args.games):
+            score, levels, ticks = play(args.map_file, seed, autopilot, args.max_ticks, args.max_levels)
+            scores.append(score)
+            print(f"seed {seed}: score {score}, {levels} levels cleared in {ticks} ticks")
+    finally:
+        autopilot.close()
+    print(f"mean score {statistics.fmean(scores):.0f}; {autopilot.rollouts} rollouts, "
+          f"{autopilot.rollouts_per_sec():.0f} rollouts/sec, "
+          f"{autopilot.rollouts / max(1, autopilot.moves):.0f} per move")
+
+if __name__ == '__main__':
+    main()
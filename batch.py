@@ -0,0 +1,417 @@
+"""Vectorized engine that steps many independent Pac-Man games at once
+
+BatchEngine keeps N games of the same maze as NumPy arrays (pellet
+bitmaps, entity positions and directions, timers, scores) and advances
+all of them with one call to step(). The rules are the ones in
+simulation.py with ghost_ai='random': warp tunnels, fruit at 70 and 170 dots, six seconds of
+power mode, ghosts respawning when eaten, crossing collisions and the
+speed ramp between levels. Only the random numbers differ, since the
+ghosts draw from a NumPy generator instead of the random module.
+
+Running this file benchmarks the engine against the scalar Simulation.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from scheduler import ticks_after
+from simulation import DIRECTIONS, Simulation, run_headless
+
+# Direction indices; STOP means "not moving" / "no turn requested"
+STOP = len(DIRECTIONS)
+DY = np.array([dy for dy, dx in DIRECTIONS] + [0])
+DX = np.array([dx for dy, dx in DIRECTIONS] + [0])
+LEFT = DIRECTIONS.index((0, -1))
+RIGHT = DIRECTIONS.index((0, 1))
+OPPOSITE = np.array([DIRECTIONS.index((-dy, -dx)) for dy, dx in DIRECTIONS] + [STOP])
+
+def unpack_bits(bitset, size):
+    """Bool array from a board.Bitset"""
+    bits = np.unpackbits(np.frombuffer(bytes(bitset), dtype=np.uint8), bitorder='little')
+    return bits[:size].astype(bool)
+
+class BatchEngine:
+    """N games of one maze, advanced together by step()"""
+    def __init__(self, map_file, n_games, seed=None, auto_next_level=True):
+        template = Simulation(map_file, ghost_ai='random')
+        if not template.pacman_start:
+            raise ValueError(f"{map_file} has no pacman start")
+        # Timings and the speed ramp come from Simulation's rule constants
+        self.rules = template
+        self.n = n_games
+        self.rng = np.random.default_rng(seed)
+        self.auto_next_level = auto_next_level
+        self.compile_maze(template)
+        
+        n, g = self.n, self.n_ghosts
+        self.score = np.zeros(n, dtype=np.int64)
+        self.lives = np.full(n, template.lives, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.speed = np.full(n, template.speed)
+        # Ticks played; power mode and fruit end on a tick, as Simulation's timers do
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.won = np.zeros(n, dtype=bool)
+        self.extra_life_awarded = np.zeros(n, dtype=bool)
+        # Tick power mode ends on, 0 when not powered up
+        self.power_due = np.zeros(n, dtype=np.int64)
+        
+        self.fruit_active = np.zeros(n, dtype=bool)
+        self.fruit_due = np.zeros(n, dtype=np.int64)
+        self.dots_eaten = np.zeros(n, dtype=np.int64)
+        self.fruit_triggered_70 = np.zeros(n, dtype=bool)
+        self.fruit_triggered_170 = np.zeros(n, dtype=bool)
+        
+        self.pellets = np.tile(self.initial_pellets, (n, 1))
+        self.power_pills = np.tile(self.initial_power_pills, (n, 1))
+        self.pellets_remaining = np.full(n, self.initial_remaining, dtype=np.int64)
+        
+        self.pacman = np.full(n, self.pacman_start, dtype=np.int64)
+        self.pacman_dir = np.full(n, STOP, dtype=np.int64)
+        self.pacman_next = np.full(n, STOP, dtype=np.int64)
+        self.ghosts = np.tile(self.ghost_starts, (n, 1))
+        self.ghost_dir = np.full((n, g), STOP, dtype=np.int64)
+        self.frightened = np.zeros((n, g), dtype=bool)
+        
+        # Games that finished (or were reset) each level, for callers to inspect
+        self.levels_cleared = np.zeros(n, dtype=np.int64)
+    
+    def compile_maze(self, template):
+        """Turn a parsed Simulation into lookup tables over flat cell indices"""
+        h, w = template.height, template.width
+        self.height, self.width = h, w
+        cells = h * w
+        
+        # move[cell, dir] is the neighbouring cell in that direction, or -1 into a wall
+        self.move = np.full((cells, STOP + 1), -1, dtype=np.int64)
+        # exits[cell, dir, k] lists the valid directions, minus the reverse of dir
+        self.exits = np.full((cells, STOP + 1, STOP), STOP, dtype=np.int64)
+        self.n_exits = np.zeros((cells, STOP + 1), dtype=np.int64)
+        self.junction = np.zeros(cells, dtype=bool)
+        for y in range(h):
+            for x in range(w):
+                cell = y * w + x
+                valid = []
+                for d, (dy, dx) in enumerate(DIRECTIONS):
+                    if template.is_valid_move(y + dy, x + dx):
+                        self.move[cell, d] = cell + dy * w + dx
+                        valid.append(d)
+                if template.is_valid_move(y, x):
+                    # Standing still "moves" onto the same cell, as in Simulation
+                    self.move[cell, STOP] = cell
+                self.junction[cell] = len(valid) > 2
+                for heading in range(STOP + 1):
+                    choices = [d for d in valid if d != OPPOSITE[heading]]
+                    self.exits[cell, heading, :len(choices)] = choices
+                    self.n_exits[cell, heading] = len(choices)
+        
+        maze = template.maze
+        self.initial_pellets = unpack_bits(maze.pellets, cells)
+        self.initial_power_pills = unpack_bits(maze.power_pills, cells)
+        self.initial_remaining = maze.dot_count
+        
+        self.pacman_start = template.pacman_start.y * w + template.pacman_start.x
+        self.ghost_starts = np.array([p.y * w + p.x for p in template.ghost_starts], dtype=np.int64)
+        self.n_ghosts = len(self.ghost_starts)
+        self.fruit = -1
+        if template.initial_fruit:
+            self.fruit = template.initial_fruit.y * w + template.initial_fruit.x
+        self.warp_left = self.warp_right = -1
+        if template.warp_left and template.warp_right:
+            self.warp_left = template.warp_left.y * w + template.warp_left.x
+            self.warp_right = template.warp_right.y * w + template.warp_right.x
+    
+    def step(self, actions=None):
+        """Advance every game still in play by one tick
+
+        actions is an array of direction indices (STOP for no turn), one
+        per game, or None. Returns the mask of games that were stepped.
+        """
+        active = ~self.game_over & ~self.won
+        if actions is not None:
+            turn = active & (actions != STOP)
+            self.pacman_next[turn] = actions[turn]
+        games = np.nonzero(active)[0]
+        self.ticks[games] += 1
+        
+        self.move_pacman(games)
+        self.move_ghosts(games)
+        self.check_collisions(games)
+        
+        if self.auto_next_level:
+            won = np.nonzero(self.won)[0]
+            if len(won):
+                self.levels_cleared[won] += 1
+                self.next_level(won)
+        return active
+    
+    def due_tick(self, seconds, games):
+        """Tick, per game, on which a timer of seconds started this tick runs out"""
+        speeds = self.speed[games]
+        ticks = np.zeros(len(games), dtype=np.int64)
+        for speed in np.unique(speeds):
+            ticks[speeds == speed] = ticks_after(seconds, float(speed))
+        return self.ticks[games] + ticks
+    
+    def add_score(self, games, points):
+        self.score[games] += points
+        # Award extra life at 10,000 points
+        award = games[~self.extra_life_awarded[games] & (self.score[games] >= 10000)]
+        self.lives[award] += 1
+        self.extra_life_awarded[award] = True
+    
+    def eat_dot(self, games):
+        self.pellets_remaining[games] -= 1
+        self.dots_eaten[games] += 1
+        # Check for fruit spawn triggers
+        dots = self.dots_eaten[games]
+        first = games[(dots == 70) & ~self.fruit_triggered_70[games]]
+        second = games[(dots == 170) & ~self.fruit_triggered_170[games]]
+        self.spawn_fruit(first)
+        self.fruit_triggered_70[first] = True
+        self.spawn_fruit(second)
+        self.fruit_triggered_170[second] = True
+    
+    def spawn_fruit(self, games):
+        if self.fruit >= 0:
+            self.fruit_active[games] = True
+            self.fruit_due[games] = self.due_tick(self.rules.FRUIT_SECONDS, games)
+    
+    def move_pacman(self, games):
+        pos = self.pacman[games]
+        
+        # Try to change direction if new direction pressed
+        wanted = self.pacman_next[games]
+        turn = (wanted != STOP) & (self.move[pos, wanted] >= 0)
+        self.pacman_dir[games[turn]] = wanted[turn]
+        self.pacman_next[games[turn]] = STOP
+        heading = self.pacman_dir[games]
+        
+        # Warping skips the rest of the move, pellets included
+        warped = np.zeros(len(games), dtype=bool)
+        if self.warp_left >= 0:
+            to_right = (pos == self.warp_left) & (heading == LEFT)
+            to_left = (pos == self.warp_right) & (heading == RIGHT)
+            pos[to_right] = self.warp_right
+            pos[to_left] = self.warp_left
+            warped = to_right | to_left
+        
+        # Normal movement, stopping at walls
+        moving = (heading != STOP) & ~warped
+        target = self.move[pos, heading]
+        ok = moving & (target >= 0)
+        pos[ok] = target[ok]
+        self.pacman_dir[games[moving & ~ok]] = STOP
+        self.pacman[games] = pos
+        
+        games, pos = games[~warped], pos[~warped]
+        
+        # Check for pellet collection
+        ate = self.pellets[games, pos]
+        eaters = games[ate]
+        self.pellets[eaters, pos[ate]] = False
+        self.add_score(eaters, 10)
+        self.eat_dot(eaters)
+        
+        # Check for power pill
+        ate = self.power_pills[games, pos]
+        eaters = games[ate]
+        self.power_pills[eaters, pos[ate]] = False
+        self.add_score(eaters, 50)
+        self.eat_dot(eaters)
+        self.power_due[eaters] = self.due_tick(self.rules.POWER_MODE_SECONDS, eaters)
+        self.frightened[eaters] = True
+        
+        # Check for fruit
+        ate = self.fruit_active[games] & (pos == self.fruit)
+        eaters = games[ate]
+        self.fruit_active[eaters] = False
+        self.add_score(eaters, 100)
+        
+        # Check win condition
+        self.won[games[self.pellets_remaining[games] == 0]] = True
+    
+    def random_direction(self, cells, headings):
+        """Pick a random valid direction (minus the reverse of heading) per cell"""
+        counts = self.n_exits[cells, headings]
+        k = (self.rng.random(len(cells)) * counts).astype(np.int64)
+        choice = self.exits[cells, headings, np.minimum(k, STOP - 1)]
+        return choice, counts > 0
+    
+    def move_ghosts(self, games):
+        ticks = self.ticks[games]
+        
+        # Check if power mode expired
+        power_due = self.power_due[games]
+        expired = games[(power_due > 0) & (power_due <= ticks)]
+        self.power_due[expired] = 0
+        self.frightened[expired] = False
+        
+        # Update fruit timer
+        expired = games[self.fruit_active[games] & (self.fruit_due[games] <= ticks)]
+        self.fruit_active[expired] = False
+        
+        for g in range(self.n_ghosts):
+            # Games end their ghost loop early on game over
+            games = games[~self.game_over[games]]
+            if not len(games):
+                return
+            pos = self.ghosts[games, g]
+            heading = self.ghost_dir[games, g]
+            old = pos.copy()
+            
+            # Initialize ghost movement if not moving
+            still = heading == STOP
+            choice, ok = self.random_direction(pos[still], heading[still])
+            heading[np.nonzero(still)[0][ok]] = choice[ok]
+            
+            # Random chance to change direction at junction
+            turn = np.nonzero(self.junction[pos])[0]
+            turn = turn[self.rng.random(len(turn)) < 0.3]
+            choice, ok = self.random_direction(pos[turn], heading[turn])
+            heading[turn[ok]] = choice[ok]
+            
+            # Warp tunnels, then normal movement
+            warped = np.zeros(len(games), dtype=bool)
+            if self.warp_left >= 0:
+                to_right = (pos == self.warp_left) & (heading == LEFT)
+                to_left = (pos == self.warp_right) & (heading == RIGHT)
+                pos[to_right] = self.warp_right
+                pos[to_left] = self.warp_left
+                warped = to_right | to_left
+            # A ghost with nowhere to go stays put, which move[cell, STOP] treats as a move
+            target = self.move[pos, heading]
+            moved = ~warped & (target >= 0)
+            pos[moved] = target[moved]
+            
+            # Hit a wall, choose new random direction
+            blocked = np.nonzero(~warped & ~moved)[0]
+            choice, ok = self.random_direction(pos[blocked], np.full(len(blocked), STOP))
+            heading[blocked[ok]] = choice[ok]
+            
+            self.ghosts[games, g] = pos
+            self.ghost_dir[games, g] = heading
+            
+            # Check for collision after each ghost moves (including crossing detection)
+            check = warped | moved
+            hit = check & self.crossed(games, pos, old)
+            for_games = games[hit]
+            if len(for_games):
+                self.handle_collision(for_games, np.full(len(for_games), g))
+    
+    def crossed(self, games, ghost_pos, old_ghost_pos):
+        """Same cell as pacman, or swapped cells with pacman this tick"""
+        pac = self.pacman[games]
+        heading = self.pacman_dir[games]
+        py, px = pac // self.width, pac % self.width
+        oy, ox = py - DY[heading], px - DX[heading]
+        inside = (oy >= 0) & (oy < self.height) & (ox >= 0) & (ox < self.width)
+        pacman_old = np.where(inside, oy * self.width + ox, -1)
+        return (ghost_pos == pac) | ((pacman_old == ghost_pos) & (old_ghost_pos == pac))
+    
+    def check_collisions(self, games):
+        same = self.ghosts[games] == self.pacman[games][:, None]
+        hit = same.any(axis=1)
+        games = games[hit]
+        if len(games):
+            # Only the first ghost on pacman's cell is dealt with
+            self.handle_collision(games, same[hit].argmax(axis=1))
+    
+    def handle_collision(self, games, ghost):
+        """Handle collision between pacman and ghost[i] in games[i]"""
+        frightened = self.frightened[games, ghost]
+        
+        # Eat ghost and respawn it at its starting position
+        eaten, which = games[frightened], ghost[frightened]
+        self.score[eaten] += 200
+        self.ghosts[eaten, which] = self.ghost_starts[which]
+        self.frightened[eaten, which] = False
+        self.ghost_dir[eaten, which] = STOP
+        
+        # Lose a life
+        caught = games[~frightened]
+        self.lives[caught] -= 1
+        over = self.lives[caught] <= 0
+        self.game_over[caught[over]] = True
+        self.reset_positions(caught[~over])
+    
+    def reset_positions(self, games):
+        self.pacman[games] = self.pacman_start
+        self.pacman_dir[games] = STOP
+        self.pacman_next[games] = STOP
+        self.ghosts[games] = self.ghost_starts
+        self.ghost_dir[games] = STOP
+        self.frightened[games] = False
+        self.power_due[games] = 0
+    
+    def reset_board(self, games):
+        self.pellets[games] = self.initial_pellets
+        self.power_pills[games] = self.initial_power_pills
+        self.pellets_remaining[games] = self.initial_remaining
+    
+    def next_level(self, games):
+        """Advance the given games to their next level"""
+        self.level[games] += 1
+        self.won[games] = False
+        self.power_due[games] = 0
+        
+        # Reset fruit mechanics for new level
+        self.fruit_active[games] = False
+        self.dots_eaten[games] = 0
+        self.fruit_triggered_70[games] = False
+        self.fruit_triggered_170[games] = False
+        
+        self.reset_board(games)
+        self.reset_positions(games)
+        
+        # Increase difficulty slightly (make ghosts a bit faster)
+        self.speed[games] = np.maximum(self.rules.MIN_SPEED, self.speed[games] - self.rules.SPEED_STEP)
+    
+    def reset_game(self, games):
+        """Restart the given games, keeping level and speed like Simulation does"""
+        self.score[games] = 0
+        self.lives[games] = 3
+        self.game_over[games] = False
+        self.won[games] = False
+        self.power_due[games] = 0
+        self.reset_board(games)
+        self.reset_positions(games)
+    
+    def random_actions(self, turn_chance=0.1):
+        """A random steering action per game, STOP most of the time"""
+        actions = self.rng.integers(0, STOP, self.n)
+        actions[self.rng.random(self.n) >= turn_chance] = STOP
+        return actions
+
+def benchmark(map_file, n_games, ticks, seed=None):
+    """Return (batch game-ticks/sec, scalar ticks/sec), both with random ghosts"""
+    engine = BatchEngine(map_file, n_games, seed=seed)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        engine.step(engine.random_actions())
+        over = np.nonzero(engine.game_over)[0]
+        if len(over):
+            engine.reset_game(over)
+    batch_rate = n_games * ticks / (time.perf_counter() - start)
+    
+    # Random ghosts, as the batch engine plays, so like is compared with like
+    _, elapsed = run_headless(map_file, ticks, seed, ghost_ai='random')
+    return batch_rate, ticks / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vectorized batch engine')
+    parser.add_argument('map_file', nargs='?', default='pacman-map.txt')
+    parser.add_argument('--games', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    parser.add_argument('--ticks', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    
+    print("both engines with ghost_ai='random'")
+    print(f"{'games':>8} {'game-ticks/sec':>16} {'scalar ticks/sec':>17} {'speedup':>8}")
+    for n_games in args.games:
+        batch_rate, scalar_rate = benchmark(args.map_file, n_games, args.ticks, args.seed)
+        print(f"{n_games:>8} {batch_rate:>16.0f} {scalar_rate:>17.0f} {batch_rate / scalar_rate:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
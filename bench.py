@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""Benchmarks for the tick and render hot paths
+
+Drives Game with a fake screen and a simulated clock, so no terminal is
+needed, over the shipped map and over synthetic mazes tiled to 10x and
+100x its area with anywhere from 4 to 500 ghosts. For every scenario it
+reports ticks/sec, frames/sec, the mean time spent in move_pacman,
+move_ghosts, check_collisions and draw, and memory allocated per tick.
+
+Results are written as JSON; comparing two result files flags every
+metric that got worse by more than a threshold:
+
+    python3 bench.py --output before.json
+    python3 bench.py --output after.json --baseline before.json
+
+--terminal instead counts the bytes each output backend sends a real
+terminal per frame, drawing the same game through curses and through
+FrameScreen in a pseudo-terminal:
+
+    python3 bench.py --terminal --ticks 500
+"""
+import argparse
+import curses
+import fcntl
+import json
+import os
+import platform
+import pty
+import random
+import struct
+import sys
+import termios
+import time
+import tracemalloc
+
+from ansi import FrameScreen, fd_writer, terminal_glyphs
+from board import Maze
+from navigation import DIRECTIONS
+from pacman import CursesRenderer, Game
+from simulation import SimClock
+
+# Plain characters for the fake screen, in place of curses color pairs
+PLAIN_GLYPHS = {
+    'pacman': ('C', 0),
+    'wall': ('#', 0),
+    'pellet': ('.', 0),
+    'ghost': ('W', 0),
+    'frightened': ('M', 0),
+    'fruit': ('*', 0),
+    'pill': ('O', 0),
+    'blank': (' ', 0),
+}
+
+# (area multiplier, ghosts) pairs run by default
+SCENARIOS = [(scale, ghosts) for scale in (1, 10, 100) for ghosts in (4, 50, 500)]
+
+PHASES = ('move_pacman', 'move_ghosts', 'check_collisions', 'draw')
+
+# Rows and columns of the pseudo-terminal for --terminal
+TERMINAL_SIZE = (30, 80)
+BACKENDS = ('curses', 'ansi')
+
+# Metrics where a larger number is better; for the rest smaller is better
+HIGHER_IS_BETTER = ('ticks_per_sec', 'frames_per_sec')
+
+class FakeScreen:
+    """Just enough of a curses window to draw into, counting the calls"""
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.calls = 0
+    
+    def addch(self, y, x, ch, attr=0):
+        self.calls += 1
+    
+    def addstr(self, y, x, text, attr=0):
+        self.calls += 1
+    
+    def erase(self):
+        self.calls += 1
+    
+    def refresh(self):
+        self.calls += 1
+    
+    def getmaxyx(self):
+        return self.height, self.width
+    
+    def getch(self):
+        return -1
+
+def scaled_rows(map_file, scale, ghosts):
+    """Rows of the map tiled to about scale times its area, with the given ghost count"""
+    with open(map_file, 'rb') as f:
+        rows = [line.rstrip(b'\r\n') for line in f]
+    header, body = rows[:1], rows[1:]
+    width = max(len(row) for row in body)
+    body = [row.ljust(width) for row in body]
+    
+    # Split the scale into a tile grid as close to square as possible
+    tiles_y = max(d for d in range(1, int(scale ** 0.5) + 1) if scale % d == 0)
+    tiles_x = scale // tiles_y
+    grid = [bytearray(row * tiles_x) for _ in range(tiles_y) for row in body]
+    
+    # Open gaps in the walls between stacked tiles so the whole maze connects
+    for seam in range(1, tiles_y):
+        bottom = seam * len(body) - 1
+        for x in range(0, len(grid[0]), 7):
+            if grid[bottom - 1][x] == ord('.') and grid[bottom + 2][x] == ord('.'):
+                grid[bottom][x] = grid[bottom + 1][x] = ord('.')
+    
+    # Keep a single pacman and exactly the requested number of ghosts
+    cells = [(y, x) for y, row in enumerate(grid) for x, ch in enumerate(row)]
+    pacmen = [(y, x) for y, x in cells if grid[y][x] == ord('c')]
+    for y, x in pacmen[1:]:
+        grid[y][x] = ord('.')
+    for y, x in cells:
+        if grid[y][x] == ord('n'):
+            grid[y][x] = ord(' ')
+    floor = [(y, x) for y, x in cells if grid[y][x] == ord('.')]
+    step = max(1, len(floor) // ghosts)
+    for y, x in floor[::step][:ghosts]:
+        grid[y][x] = ord('n')
+    return header + [bytes(row) for row in grid]
+
+def make_game(map_file, scale, ghosts, seed):
+    if scale == 1 and ghosts == 4:
+        maze = Maze.load(map_file)
+    else:
+        maze = Maze(scaled_rows(map_file, scale, ghosts))
+    screen = FakeScreen(maze.height, maze.width + 1)
+    game = Game(screen, maze, renderer=CursesRenderer(screen, PLAIN_GLYPHS), clock=SimClock())
+    game.rng = random.Random(seed)
+    return game
+
+def play_tick(game, rng, phases=None):
+    """One tick and one frame, timing each phase into phases if given"""
+    if rng.random() < 0.1:
+        game.pacman.next_dy, game.pacman.next_dx = rng.choice(DIRECTIONS)
+    game.clock.advance(game.speed)
+    game.ticks += 1
+    for name in PHASES:
+        func = getattr(game, name)
+        if phases is None:
+            func()
+        else:
+            start = time.perf_counter()
+            func()
+            phases[name] += time.perf_counter() - start
+    if game.won:
+        game.next_level()
+    elif game.game_over:
+        game.reset_game()
+
+def run_scenario(map_file, scale, ghosts, ticks, seed=0):
+    game = make_game(map_file, scale, ghosts, seed)
+    rng = random.Random(seed)
+    game.draw()
+    
+    phases = dict.fromkeys(PHASES, 0.0)
+    for _ in range(ticks):
+        play_tick(game, rng, phases)
+    sim_time = phases['move_pacman'] + phases['move_ghosts'] + phases['check_collisions']
+    
+    # A second pass under tracemalloc, which would skew the timings above
+    alloc_ticks = max(1, ticks // 10)
+    tracemalloc.start()
+    peak_total = 0
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(alloc_ticks):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        play_tick(game, rng)
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    blocks_after = sys.getallocatedblocks()
+    tracemalloc.stop()
+    
+    return {
+        'map': f"{game.width}x{game.height}",
+        'ghosts': len(game.ghosts),
+        'ticks': ticks,
+        'ticks_per_sec': ticks / sim_time,
+        'frames_per_sec': ticks / phases['draw'],
+        'phase_us': {name: phases[name] / ticks * 1e6 for name in PHASES},
+        'alloc_bytes_per_tick': peak_total / alloc_ticks,
+        'net_blocks_per_tick': (blocks_after - blocks_before) / alloc_ticks,
+    }
+
+def draw_in_terminal(stdscr, backend, map_file, scale, ticks, seed):
+    """Play ticks ticks on stdscr through the backend, drawing a frame after each"""
+    curses.curs_set(0)
+    if backend == 'ansi':
+        renderer = CursesRenderer(FrameScreen(stdscr, fd_writer(sys.stdout.fileno())), terminal_glyphs('utf-8'))
+    else:
+        renderer = CursesRenderer(stdscr)
+    maze = Maze.load(map_file) if scale == 1 else Maze(scaled_rows(map_file, scale, 4))
+    game = Game(stdscr, maze, renderer=renderer, clock=SimClock())
+    game.rng = random.Random(seed)
+    rng = random.Random(seed)
+    game.draw()
+    for _ in range(ticks):
+        play_tick(game, rng)
+
+def terminal_bytes(backend, map_file, scale, ticks, seed=0):
+    """Bytes a pseudo-terminal receives from a game drawn through the backend"""
+    rows, cols = TERMINAL_SIZE
+    pid, fd = pty.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.environ['TERM'] = 'xterm'
+            os.environ['LANG'] = os.environ['LC_ALL'] = 'C.UTF-8'
+            fcntl.ioctl(sys.stdout.fileno(), termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+            curses.wrapper(draw_in_terminal, backend, map_file, scale, ticks, seed)
+            status = 0
+        finally:
+            os._exit(status)
+    received = 0
+    while True:
+        try:
+            data = os.read(fd, 1 << 16)
+        except OSError:
+            # EIO once the child has gone
+            break
+        if not data:
+            break
+        received += len(data)
+    os.close(fd)
+    _, status = os.waitpid(pid, 0)
+    if status:
+        raise RuntimeError(f"drawing through {backend} failed")
+    return received
+
+def run_terminal(map_file, scales, ticks, seed=0):
+    """Bytes per frame sent by each backend, less what starting and stopping curses sends"""
+    results = {}
+    for scale in scales:
+        for backend in BACKENDS:
+            setup = terminal_bytes(backend, map_file, scale, 0, seed)
+            total = terminal_bytes(backend, map_file, scale, ticks, seed)
+            results[f"x{scale}-{backend}"] = {
+                'backend': backend,
+                'ticks': ticks,
+                'first_frame_bytes': setup,
+                'bytes_per_frame': (total - setup) / ticks,
+            }
+    return results
+
+def flatten(result):
+    """Comparable metrics of one scenario, phase timings included"""
+    metrics = {
+        'ticks_per_sec': result['ticks_per_sec'],
+        'frames_per_sec': result['frames_per_sec'],
+        'alloc_bytes_per_tick': result['alloc_bytes_per_tick'],
+    }
+    for name, value in result['phase_us'].items():
+        metrics[name + '_us'] = value
+    return metrics
+
+def compare(old, new, threshold):
+    """List (scenario, metric, old, new) for metrics worse by more than threshold"""
+    regressions = []
+    for name, result in new['scenarios'].items():
+        if name not in old['scenarios']:
+            continue
+        before, after = flatten(old['scenarios'][name]), flatten(result)
+        for metric, value in after.items():
+            base = before.get(metric)
+            if not base:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                worse = value < base * (1 - threshold)
+            else:
+                worse = value > base * (1 + threshold)
+            if worse:
+                regressions.append((name, metric, base, value))
+    return regressions
+
+def report_regressions(regressions, threshold):
+    if not regressions:
+        print(f"no regressions beyond {threshold:.0%}")
+        return
+    print(f"regressions beyond {threshold:.0%}:")
+    for name, metric, base, value in regressions:
+        print(f"  {name:<14} {metric:<22} {base:>12.1f} -> {value:>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the tick and render hot paths')
+    parser.add_argument('map_file', nargs='?', default='pacman-map.txt')
+    parser.add_argument('--ticks', type=int, default=200, help='ticks per scenario')
+    parser.add_argument('--scale', type=int, nargs='+', help='only these area multipliers')
+    parser.add_argument('--ghosts', type=int, nargs='+', help='only these ghost counts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results with an earlier JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='only compare two earlier result files')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative change counted as a regression (default 0.10)')
+    parser.add_argument('--terminal', action='store_true',
+                        help='only count the bytes per frame each output backend sends a terminal')
+    args = parser.parse_args()
+    
+    if args.terminal:
+        results = run_terminal(args.map_file, args.scale or (1, 10), args.ticks, args.seed)
+        rows, cols = TERMINAL_SIZE
+        print(f"{'scenario':<14} {'first frame':>11} {'bytes/frame':>11}  ({cols}x{rows} terminal, "
+              f"including curses setup)")
+        for name, result in results.items():
+            print(f"{name:<14} {result['first_frame_bytes']:>11} {result['bytes_per_frame']:>11.1f}")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+        return
+    
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        regressions = compare(old, new, args.threshold)
+        report_regressions(regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
+    
+    results = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scenarios': {},
+    }
+    print(f"{'scenario':<14} {'map':>9} {'ghosts':>6} {'ticks/s':>9} {'frames/s':>9} "
+          + ' '.join(f"{name + ' us':>18}" for name in PHASES) + f" {'bytes/tick':>10}")
+    for scale, ghosts in SCENARIOS:
+        if (args.scale and scale not in args.scale) or (args.ghosts and ghosts not in args.ghosts):
+            continue
+        name = f"x{scale}-g{ghosts}"
+        result = run_scenario(args.map_file, scale, ghosts, args.ticks, args.seed)
+        results['scenarios'][name] = result
+        print(f"{name:<14} {result['map']:>9} {result['ghosts']:>6} {result['ticks_per_sec']:>9.0f} {result['frames_per_sec']:>9.0f} "
+              + ' '.join(f"{result['phase_us'][phase]:>18.1f}" for phase in PHASES)
+              + f" {result['alloc_bytes_per_tick']:>10.0f}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            old = json.load(f)
+        regressions = compare(old, results, args.threshold)
+        report_regressions(regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Compact, shareable maze representation
+
+A Maze is parsed once per map file and never changes afterwards, so any
+number of games can share it. The grid is a flat bytearray of map
+characters indexed by y * width + x, and pellets and power pills are
+Bitsets: a game copies the maze's bitsets when a level starts, which is
+one buffer copy, and tests a cell with a shift and a mask.
+"""
+from collections import namedtuple
+
+from navigation import NavGraph
+
+Point = namedtuple('Point', ['y', 'x'])
+
+WALL = ord('#')
+BLANK = ord(' ')
+
+# Characters that become blank floor once their position has been noted
+MARKERS = b'cn@<>'
+# translate() tables turning the grid into '1'/'0' strings for one character
+_PELLET_DIGITS = bytes(ord('1') if c == ord('.') else ord('0') for c in range(256))
+_PILL_DIGITS = bytes(ord('1') if c == ord('o') else ord('0') for c in range(256))
+# translate() table turning the grid into one byte per cell, 1 where it is walkable
+_WALKABLE = bytes(int(c != WALL) for c in range(256))
+
+class Bitset(bytearray):
+    """One bit per cell, cell 0 in the lowest bit of byte 0"""
+    @classmethod
+    def from_digits(cls, digits, size):
+        """Build from a bytes string of b'0'/b'1', one per cell"""
+        value = int(digits[::-1] or b'0', 2)
+        return cls(value.to_bytes((size + 7) // 8, 'little'))
+    
+    def test(self, i):
+        return self[i >> 3] >> (i & 7) & 1
+    
+    def set(self, i):
+        self[i >> 3] |= 1 << (i & 7)
+    
+    def clear(self, i):
+        self[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+    
+    def count(self):
+        return bin(int.from_bytes(self, 'little')).count('1')
+    
+    def indices(self):
+        """Indices of the set bits, in ascending order"""
+        for byte_index, byte in enumerate(self):
+            while byte:
+                low = byte & -byte
+                yield byte_index * 8 + low.bit_length() - 1
+                byte ^= low
+
+class Maze:
+    """Everything about a map that no game ever changes"""
+    def __init__(self, rows):
+        self.height = len(rows)
+        self.width = max((len(row) for row in rows), default=0)
+        # Pad rows to equal width
+        self.grid = bytearray(b''.join(row.ljust(self.width) for row in rows))
+        cells = len(self.grid)
+        
+        pacman = self.grid.rfind(b'c')
+        self.pacman_start = self.point(pacman) if pacman >= 0 else None
+        self.ghost_starts = [self.point(i) for i in self.find_all(ord('n'))]
+        fruit = self.grid.rfind(b'@')
+        self.fruit = self.point(fruit) if fruit >= 0 else None
+        left, right = self.grid.rfind(b'<'), self.grid.rfind(b'>')
+        self.warp_left = self.point(left) if left >= 0 else None
+        self.warp_right = self.point(right) if right >= 0 else None
+        for marker in MARKERS:
+            for i in self.find_all(marker):
+                self.grid[i] = BLANK
+        
+        self.pellets = Bitset.from_digits(self.grid.translate(_PELLET_DIGITS), cells)
+        self.power_pills = Bitset.from_digits(self.grid.translate(_PILL_DIGITS), cells)
+        self.dot_count = self.grid.count(b'.') + self.grid.count(b'o')
+        
+        # Compile exits, junctions and warp links once, for table lookups per tick
+        self.nav = NavGraph(self.width, self.height, self.grid.translate(_WALKABLE),
+                            self.warp_left, self.warp_right)
+    
+    @classmethod
+    def load(cls, map_file):
+        with open(map_file, 'rb') as f:
+            return cls([line.rstrip(b'\r\n') for line in f])
+    
+    def point(self, cell):
+        return Point(*divmod(cell, self.width))
+    
+    def find_all(self, char):
+        i = self.grid.find(char)
+        while i >= 0:
+            yield i
+            i = self.grid.find(char, i + 1)
+    
+    def is_valid_move(self, y, x):
+        if 0 <= y < self.height and 0 <= x < self.width:
+            return self.grid[y * self.width + x] != WALL
+        return False
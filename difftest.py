@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""Differential testing of game engines against the original rules
+
+Each run picks a map (a file, one from mazegen.py, or a single corridor
+between warps, where wrapping round is constant), a seed for the
+ghosts and a random script of inputs: a tick with or without a
+direction press, a restart once the game is over, the next level once
+it is won. The script is played on a ReferenceGame (reference.py) and
+on the candidate engine side by side, and their states are compared
+after every step. Compared are:
+- scores, lives, level, the fruit and power mode
+- pacman's and every ghost's position and direction
+- the RNG state
+- the dots left, cell by cell whenever either side eats one
+
+The first difference stops the run. The script is then shrunk, keeping
+any that still makes the engines differ, and printed as a command that
+reproduces it:
+
+    python3 difftest.py --runs 2000
+    python3 difftest.py --engine clone --maps gen --runs 500 --ticks 3000
+    python3 difftest.py --engine mymodule:make_engine --repro --map gen:23x13:5 --seed 7 --script 40.U12.L
+
+Candidates are Simulation-like objects made by factory(map, rng), where
+map is a file name or a board.Maze, and rng a random.Random to draw the
+ghosts' moves from. They must use random ghosts, which the reference
+has. The built-in ones exercise Simulation and its clone(),
+snapshot()/restore() and event paths.
+"""
+import argparse
+import importlib
+import random
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from board import Maze
+from events import RingBuffer
+from mazegen import generate_rows
+from navigation import DIRECTIONS
+from recording import NEXT_LEVEL, RESET, TICK
+from reference import ReferenceGame
+from simulation import Simulation
+
+# Chance of a direction press on each tick of a random script
+PRESS_CHANCE = 0.1
+# Chance that pacman, stopped or at a junction, is steered to the nearest dot,
+# so that scripts clear levels as well as lose lives
+SEEK_CHANCE = 0.8
+# Sizes of generated maps to test on
+GENERATED_SIZES = ((15, 9), (23, 13), (31, 15), (47, 21))
+# Lengths of tunnel maps, a single corridor between warps that ghosts and
+# pacman wrap around all the time
+TUNNEL_LENGTHS = range(6, 24)
+# Script characters, by recording code: a tick, a tick after pressing
+# up, down, left or right, a restart and the next level
+SCRIPT_CHARS = '.UDLRrn'
+
+FIELDS = ('score', 'lives', 'level', 'game_over', 'won', 'pellets_remaining', 'dots_eaten', 'speed',
+          'fruit_active', 'fruit_triggered_70', 'fruit_triggered_170', 'extra_life_awarded')
+
+def simulation_engine(map_source, rng):
+    return Simulation(map_source, rng=rng, ghost_ai='random')
+
+def events_engine(map_source, rng):
+    return Simulation(map_source, rng=rng, ghost_ai='random', events=RingBuffer())
+
+class CloneEngine:
+    """Plays each tick on a fresh clone() of the game before it"""
+    def __init__(self, map_source, rng):
+        self.game = simulation_engine(map_source, rng)
+    
+    def __getattr__(self, name):
+        return getattr(self.game, name)
+    
+    def step(self):
+        self.game = self.game.clone()
+        self.game.step()
+
+class SnapshotEngine:
+    """Alternates two games, restoring each tick's start from a snapshot() of the other"""
+    def __init__(self, map_source, rng):
+        self.game = simulation_engine(map_source, rng)
+        self.spare = simulation_engine(map_source, random.Random())
+    
+    def __getattr__(self, name):
+        return getattr(self.game, name)
+    
+    def step(self):
+        self.spare.restore(self.game.snapshot())
+        self.game, self.spare = self.spare, self.game
+        self.game.step()
+
+ENGINES = {
+    'simulation': simulation_engine,
+    'clone': CloneEngine,
+    'snapshot': SnapshotEngine,
+    'events': events_engine,
+}
+
+def engine_factory(name):
+    """A built-in engine by name, or module:callable for any other"""
+    if name in ENGINES:
+        return ENGINES[name]
+    module, _, attr = name.partition(':')
+    if not attr:
+        raise ValueError(f"unknown engine {name!r}: use one of {', '.join(ENGINES)} or module:callable")
+    return getattr(importlib.import_module(module), attr)
+
+def tunnel_rows(length, rng):
+    """Rows of a map that is one corridor from < to >, with pacman, two ghosts, the fruit and a pill"""
+    corridor = ['.'] * length
+    for char, cell in zip('cnn@o', rng.sample(range(length), 5)):
+        corridor[cell] = char
+    wall = b'#' * (length + 2)
+    return [b'SCORE', wall, ('<' + ''.join(corridor) + '>').encode(), wall]
+
+def map_sources(spec):
+    """(lines for the reference, map for the candidate) from a file name, gen:WxH:SEED or tunnel:LENGTH:SEED"""
+    match = re.fullmatch(r'gen:(\d+)x(\d+):(\d+)', spec)
+    if match:
+        width, height, seed = map(int, match.groups())
+        rows = generate_rows(width, height, random.Random(seed))
+        return [row.decode() for row in rows], Maze(rows)
+    match = re.fullmatch(r'tunnel:(\d+):(\d+)', spec)
+    if match:
+        length, seed = map(int, match.groups())
+        rows = tunnel_rows(length, random.Random(seed))
+        return [row.decode() for row in rows], Maze(rows)
+    with open(spec) as f:
+        return f.readlines(), spec
+
+def encode_script(codes):
+    """Script codes as text, runs of one code written as count and character, e.g. 40.U12.L"""
+    parts = []
+    i = 0
+    while i < len(codes):
+        j = i
+        while j < len(codes) and codes[j] == codes[i]:
+            j += 1
+        parts.append(f"{j - i if j - i > 1 else ''}{SCRIPT_CHARS[codes[i]]}")
+        i = j
+    return ''.join(parts)
+
+def decode_script(text):
+    codes = []
+    for count, char in re.findall(r'(\d*)(.)', text):
+        codes.extend([SCRIPT_CHARS.index(char)] * int(count or 1))
+    return codes
+
+def reference_state(game):
+    pacman = game.pacman
+    return (tuple(getattr(game, name) for name in FIELDS) +
+            (game.power_mode_time > 0,
+             (pacman.y, pacman.x, pacman.dy, pacman.dx, pacman.next_dy, pacman.next_dx),
+             tuple((g.y, g.x, g.dy, g.dx, g.frightened) for g in game.ghosts),
+             game.rng.getstate()))
+
+def candidate_state(game):
+    pacman = game.pacman
+    return (tuple(getattr(game, name) for name in FIELDS) +
+            (game.timers.pending('end_power_mode') is not None,
+             (pacman.y, pacman.x, pacman.dy, pacman.dx, pacman.next_dy, pacman.next_dx),
+             tuple((g.y, g.x, g.dy, g.dx, g.frightened) for g in game.ghosts),
+             game.rng.getstate()))
+
+STATE_NAMES = FIELDS + ('power_mode', 'pacman', 'ghosts', 'rng_state')
+
+def reference_dots(game):
+    width = game.width
+    return ({p.y * width + p.x for p in game.pellets}, {p.y * width + p.x for p in game.power_pills})
+
+def candidate_dots(game):
+    return set(game.pellets.indices()), set(game.power_pills.indices())
+
+def differences(reference, candidate, check_dots):
+    """(name, reference value, candidate value) for each part of the states that differs"""
+    found = [(name, a, b) for name, a, b in zip(STATE_NAMES, reference_state(reference), candidate_state(candidate))
+             if a != b]
+    if check_dots and not found:
+        for name, a, b in zip(('pellets', 'power_pills'), reference_dots(reference), candidate_dots(candidate)):
+            if a != b:
+                found.append((name, sorted(a - b), sorted(b - a)))
+    return found
+
+def toward_dot(game):
+    """Script code of the first step on a shortest path from pacman to a dot, or None"""
+    start = (game.pacman.y, game.pacman.x)
+    first = {start: None}
+    frontier = [start]
+    while frontier:
+        next_frontier = []
+        for y, x in frontier:
+            for code, (dy, dx) in enumerate(DIRECTIONS, 1):
+                cell = (y + dy, x + dx)
+                if cell not in first and game.is_valid_move(*cell):
+                    first[cell] = first[y, x] or code
+                    if cell in game.pellets or cell in game.power_pills:
+                        return first[cell]
+                    next_frontier.append(cell)
+        frontier = next_frontier
+    return None
+
+def apply(game, code):
+    if code == RESET:
+        game.reset_game()
+    elif code == NEXT_LEVEL:
+        game.next_level()
+    else:
+        if code != TICK:
+            game.pacman.next_dy, game.pacman.next_dx = DIRECTIONS[code - 1]
+        game.step()
+
+def play(factory, map_spec, seed, script=None, ticks=0, input_seed=0):
+    """Play a script, or a random one of about ticks ticks, on both engines
+
+    Returns (codes played, None) if they agree throughout, or (codes up
+    to and including the first step they disagree after, differences).
+    """
+    lines, source = map_sources(map_spec)
+    reference = ReferenceGame(lines, random.Random(seed))
+    try:
+        candidate = factory(source, random.Random(seed))
+    except Exception as e:
+        return [], [('exception', None, repr(e))]
+    inputs = random.Random(input_seed)
+    pacman = reference.pacman
+    codes = []
+    found = differences(reference, candidate, True)
+    if found:
+        return codes, found
+    
+    while True:
+        if script is not None:
+            if len(codes) == len(script):
+                return codes, None
+            code = script[len(codes)]
+        elif len(codes) >= ticks:
+            return codes, None
+        elif reference.game_over:
+            code = RESET
+        elif reference.won:
+            code = NEXT_LEVEL
+        elif inputs.random() < PRESS_CHANCE:
+            code = inputs.randrange(1, len(DIRECTIONS) + 1)
+        elif ((pacman.dy == pacman.dx == 0 or reference.is_junction(pacman.y, pacman.x))
+              and inputs.random() < SEEK_CHANCE):
+            code = toward_dot(reference) or TICK
+        else:
+            code = TICK
+        codes.append(code)
+        
+        dots = reference.pellets_remaining
+        apply(reference, code)
+        try:
+            apply(candidate, code)
+        except Exception as e:
+            return codes, [('exception', None, repr(e))]
+        found = differences(reference, candidate, code >= RESET or reference.pellets_remaining != dots or
+                            candidate.pellets_remaining != dots)
+        if found:
+            return codes, found
+
+def shrink(factory, map_spec, seed, codes, deadline):
+    """A shorter script on which the engines still differ, found by deleting runs of steps
+
+    Tries deleting chunks of the script, halving the chunk size down to
+    single steps, then turning each remaining press into a plain tick;
+    gives up improving at deadline (a time.monotonic() reading).
+    """
+    def fails(candidate_codes):
+        played, found = play(factory, map_spec, seed, candidate_codes)
+        return played if found else None
+    
+    size = max(1, len(codes) // 2)
+    while size >= 1 and time.monotonic() < deadline:
+        start = 0
+        while start < len(codes) and time.monotonic() < deadline:
+            shorter = fails(codes[:start] + codes[start + size:])
+            if shorter is not None:
+                codes = shorter
+            else:
+                start += size
+        size //= 2
+    for i in range(len(codes)):
+        if time.monotonic() >= deadline:
+            break
+        if TICK < codes[i] < RESET:
+            shorter = fails(codes[:i] + [TICK] + codes[i + 1:])
+            if shorter is not None:
+                codes = shorter
+    return codes
+
+def random_case(rng, maps):
+    """(map spec, seed, input seed) for one run"""
+    spec = rng.choice(maps)
+    if spec == 'gen':
+        width, height = rng.choice(GENERATED_SIZES)
+        spec = f"gen:{width}x{height}:{rng.randrange(1 << 16)}"
+    elif spec == 'tunnel':
+        spec = f"tunnel:{rng.choice(TUNNEL_LENGTHS)}:{rng.randrange(1 << 16)}"
+    return spec, rng.randrange(1 << 32), rng.randrange(1 << 32)
+
+def run_cases(args):
+    """Worker entry point: play cases until one fails; returns (ticks played, failure or None)"""
+    engine, cases, ticks = args
+    factory = engine_factory(engine)
+    played = 0
+    for spec, seed, input_seed in cases:
+        codes, found = play(factory, spec, seed, ticks=ticks, input_seed=input_seed)
+        played += len(codes)
+        if found:
+            return played, (spec, seed, codes, found)
+    return played, None
+
+def describe(found):
+    lines = []
+    for name, expected, got in found:
+        if name in ('pellets', 'power_pills'):
+            lines.append(f"  {name}: cells only the reference has {expected}, only the candidate has {got}")
+        elif name == 'rng_state':
+            lines.append("  rng_state: the engines have drawn different random numbers")
+        else:
+            lines.append(f"  {name}: reference {expected!r}, candidate {got!r}")
+    return '\n'.join(lines)
+
+def report_failure(engine, spec, seed, codes, found, shrink_seconds):
+    factory = engine_factory(engine)
+    print(f"{engine} differs from the reference on {spec}, seed {seed}, after step {len(codes)} "
+          f"(tick {sum(code < RESET for code in codes)}):")
+    print(describe(found))
+    if shrink_seconds > 0:
+        codes = shrink(factory, spec, seed, codes, time.monotonic() + shrink_seconds)
+        _, found = play(factory, spec, seed, codes)
+        print(f"\nshrunk to {len(codes)} steps, where it differs in:")
+        print(describe(found))
+    script = encode_script(codes) or "''"
+    print("\nto reproduce:")
+    print(f"  python3 difftest.py --engine {engine} --repro --map {spec} --seed {seed} --script {script}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Check a game engine against the original rules')
+    parser.add_argument('--engine', default='simulation',
+                        help=f"engine to test: {', '.join(ENGINES)}, or module:callable (default: simulation)")
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--ticks', type=int, default=2000, help='steps per run')
+    parser.add_argument('--maps', nargs='+', default=['pacman-map.txt', 'gen', 'tunnel'],
+                        help="map files to pick from; 'gen' stands for generated maps of several sizes "
+                             "and 'tunnel' for small maps of one corridor between warps")
+    parser.add_argument('--seed', type=int, default=0, help='seed for picking the runs, or the game with --repro')
+    parser.add_argument('--workers', type=int, default=1, help='processes to spread the runs over')
+    parser.add_argument('--shrink-seconds', type=float, default=60.0,
+                        help='time allowed for shrinking a failing script (0 to skip)')
+    parser.add_argument('--repro', action='store_true', help='play one script instead of random runs')
+    parser.add_argument('--map', help='with --repro, the map: a file name, gen:WxH:SEED or tunnel:LENGTH:SEED')
+    parser.add_argument('--script', default='', help='with --repro, the script printed for a failure')
+    args = parser.parse_args()
+    
+    if args.repro:
+        codes, found = play(engine_factory(args.engine), args.map, args.seed, decode_script(args.script))
+        if found:
+            report_failure(args.engine, args.map, args.seed, codes, found, 0)
+            sys.exit(1)
+        print(f"{args.engine} matches the reference on all {len(codes)} steps")
+        return
+    
+    engine_factory(args.engine)
+    rng = random.Random(args.seed)
+    cases = [random_case(rng, args.maps) for _ in range(args.runs)]
+    chunks = [(args.engine, cases[i::args.workers], args.ticks) for i in range(args.workers)]
+    start = time.perf_counter()
+    played = 0
+    failure = None
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for ticks, found in pool.map(run_cases, chunks):
+                played += ticks
+                failure = failure or found
+    else:
+        played, failure = run_cases(chunks[0])
+    elapsed = time.perf_counter() - start
+    
+    if failure:
+        report_failure(args.engine, *failure, args.shrink_seconds)
+        sys.exit(1)
+    print(f"{args.engine} matches the reference: {args.runs} runs, {played} steps in {elapsed:.1f}s "
+          f"({played / elapsed:.0f} steps/sec on both engines)")
+
+if __name__ == '__main__':
+    main()
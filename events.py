@@ -0,0 +1,110 @@
+"""Gameplay events, for analytics
+
+Simulation reports what happens in play as Events to its sink: each
+pellet, pill and fruit eaten, fruit coming and going, ghosts eaten,
+lives lost and levels cleared. A sink is any object with write(event)
+and close(). Three are here:
+- RingBuffer keeps the latest events in memory
+- JsonLinesSink writes one JSON object per line
+- BinarySink writes fixed-size records, about a fifth the size
+
+Both files go through a large write buffer, as recordings do, so an
+event costs one buffered write. read_events() streams either kind of
+file back one Event at a time; analytics.py aggregates them.
+
+    python3 pacman.py --events game.jsonl
+    python3 replay.py game.rec --fast --events game.evt
+"""
+import json
+import struct
+from collections import deque, namedtuple
+
+# Event kinds, by code; the codes are what BinarySink stores
+KINDS = ('pellet', 'power_pill', 'fruit_spawned', 'fruit_eaten', 'fruit_expired', 'power_end',
+         'ghost_eaten', 'life_lost', 'game_over', 'extra_life', 'level_cleared', 'level_start',
+         'game_start')
+(PELLET, POWER_PILL, FRUIT_SPAWNED, FRUIT_EATEN, FRUIT_EXPIRED, POWER_END,
+ GHOST_EATEN, LIFE_LOST, GAME_OVER, EXTRA_LIFE, LEVEL_CLEARED, LEVEL_START,
+ GAME_START) = range(len(KINDS))
+KIND_CODES = {name: code for code, name in enumerate(KINDS)}
+
+# y, x is where it happened, if anywhere. value is the points scored,
+# except: the ghost's spawn index for ghost_eaten, the lives left for
+# life_lost and extra_life, and the final score for game_over
+Event = namedtuple('Event', ['tick', 'kind', 'level', 'y', 'x', 'value'])
+
+MAGIC = b'PACEVT1\n'
+# tick, kind, level, y, x, value
+RECORD = struct.Struct('<IBHHHi')
+BUFFER_SIZE = 1 << 16
+# Records unpacked per read by read_events()
+READ_RECORDS = 4096
+
+class RingBuffer:
+    """The last capacity events, in memory"""
+    def __init__(self, capacity=4096):
+        self.events = deque(maxlen=capacity)
+    
+    def write(self, event):
+        self.events.append(event)
+    
+    def close(self):
+        pass
+    
+    def __iter__(self):
+        return iter(self.events)
+
+class JsonLinesSink:
+    """Events as JSON lines, with the kind by name"""
+    def __init__(self, path):
+        self.file = open(path, 'w', buffering=BUFFER_SIZE)
+    
+    def write(self, event):
+        tick, kind, level, y, x, value = event
+        self.file.write(f'{{"tick": {tick}, "kind": "{KINDS[kind]}", "level": {level}, '
+                        f'"y": {y}, "x": {x}, "value": {value}}}\n')
+    
+    def close(self):
+        self.file.close()
+
+class BinarySink:
+    """Events as fixed-size little-endian records after a magic line"""
+    def __init__(self, path):
+        self.file = open(path, 'wb', buffering=BUFFER_SIZE)
+        self.file.write(MAGIC)
+        self.pack = RECORD.pack
+    
+    def write(self, event):
+        self.file.write(self.pack(*event))
+    
+    def close(self):
+        self.file.close()
+
+def open_sink(path):
+    """A file sink for path: binary for a .evt or .bin file, JSON lines otherwise"""
+    if path.endswith(('.evt', '.bin')):
+        return BinarySink(path)
+    return JsonLinesSink(path)
+
+def read_events(path):
+    """Events from a file either sink wrote, read a chunk at a time"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            size = RECORD.size
+            tail = b''
+            while True:
+                chunk = f.read(size * READ_RECORDS)
+                if not chunk:
+                    break
+                data = tail + chunk
+                whole = len(data) - len(data) % size
+                for record in RECORD.iter_unpack(data[:whole]):
+                    yield Event._make(record)
+                tail = data[whole:]
+            return
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield Event(record['tick'], KIND_CODES[record['kind']], record['level'],
+                            record['y'], record['x'], record['value'])
@@ -0,0 +1,127 @@
+"""Keyboard input for the live game: draining, turn buffering and latency
+
+Each pass of Game.run drains every key waiting on the terminal at once,
+stamping each with the time the loop saw it. Direction keys go into a
+TurnBuffer rather than straight into pacman's next_dy/next_dx, which
+hold only one turn: pressing up then left just before a junction kept
+only left, and up was lost even when it was the turn that could be
+taken first.
+
+The buffer keeps the last few distinct turns in the order pressed. A
+new key replaces any buffered turn it contradicts: its reverse, or one
+pacman could already take where it is, as a later key always did. Just
+before each tick it hands the rules the oldest turn pacman can take at
+the cell it is on, dropping it and any turn pressed before it; turns
+that cannot be taken yet wait for a later tick. A turn is handed over
+only on the tick it is taken, so recordings, which log the turn with
+that tick, replay it exactly.
+
+For every turn taken it notes the ticks and milliseconds since the key
+was seen. A turn taken on the very next tick counts one tick, however
+slowly the terminal draws. The numbers appear on the profiler's line
+(P in game) and in pacman.py --profile reports.
+"""
+import time
+from collections import Counter, deque
+
+from navigation import DIRECTIONS
+from profiler import PhaseStats, percentile
+
+# Distinct turns kept; pressing more drops the oldest
+TURN_BUFFER_SIZE = 2
+# Latencies in ticks from here up are counted together
+TICK_BUCKETS = 8
+
+class InputLatency:
+    """Ticks and seconds from key to turn, for every turn taken"""
+    def __init__(self):
+        self.seconds = PhaseStats()
+        self.ticks = Counter()
+        # Turns replaced by a later key, pushed out of a full buffer or passed over
+        self.dropped = 0
+    
+    def add(self, ticks, seconds):
+        self.ticks[min(ticks, TICK_BUCKETS)] += 1
+        self.seconds.add(seconds)
+    
+    def next_tick_share(self):
+        """Share of turns taken on the tick after their key"""
+        count = self.seconds.count
+        return self.ticks[1] / count if count else 1.0
+    
+    def hud(self):
+        """A short summary for the in-game line"""
+        recent = self.seconds.recent()
+        return (f"turn {percentile(recent, 0.5) * 1e3:.1f}/{percentile(recent, 0.99) * 1e3:.1f}ms "
+                f"next {self.next_tick_share():.0%}")
+    
+    def report(self):
+        report = self.seconds.report()
+        return {
+            'turns': report['count'],
+            'dropped': self.dropped,
+            'next_tick_share': self.next_tick_share(),
+            'p50_ms': report['p50_us'] / 1e3,
+            'p99_ms': report['p99_us'] / 1e3,
+            'max_ms': report['max_us'] / 1e3,
+            # {ticks: turns}; the last bucket holds TICK_BUCKETS ticks or more
+            'ticks': {ticks: count for ticks, count in sorted(self.ticks.items())},
+        }
+
+class TurnBuffer:
+    """The latest distinct direction keys, until pacman can take them"""
+    def __init__(self, size=TURN_BUFFER_SIZE):
+        # (direction, seconds seen, tick seen)
+        self.turns = deque()
+        self.size = size
+        self.latency = InputLatency()
+    
+    def __bool__(self):
+        return bool(self.turns)
+    
+    def press(self, direction, seen, tick, exits=0):
+        """Queue a direction key seen at seen seconds (time.monotonic), before tick started
+
+        exits is the exits mask of pacman's cell. Buffered turns the key
+        overrides, its reverse and any other turn pacman could take there
+        already, leave the buffer.
+        """
+        turns = self.turns
+        reverse = (-direction[0], -direction[1])
+        kept = [turn for turn in turns
+                if turn[0] == direction or (turn[0] != reverse and not exits >> DIRECTIONS.index(turn[0]) & 1)]
+        if len(kept) < len(turns):
+            self.latency.dropped += len(turns) - len(kept)
+            turns.clear()
+            turns.extend(kept)
+        if turns and turns[-1][0] == direction:
+            # Held or repeated keys: the first press already stands
+            return
+        turns.append((direction, seen, tick))
+        if len(turns) > self.size:
+            turns.popleft()
+            self.latency.dropped += 1
+    
+    def clear(self):
+        self.turns.clear()
+    
+    def take(self, game, now=None):
+        """The direction to hand the rules for the tick about to run, or None
+
+        That is the oldest buffered turn pacman can take on its current
+        cell; it and any turns pressed before it leave the buffer.
+        """
+        pacman = game.pacman
+        if not self.turns or not pacman:
+            return None
+        exits = game.nav.exits[pacman.y * game.width + pacman.x]
+        for index, (direction, seen, tick) in enumerate(self.turns):
+            if exits >> DIRECTIONS.index(direction) & 1:
+                for _ in range(index + 1):
+                    self.turns.popleft()
+                self.latency.dropped += index
+                if now is None:
+                    now = time.monotonic()
+                self.latency.add(game.ticks - tick + 1, now - seen)
+                return direction
+        return None
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Load generator for server.py
+
+Connects N bot clients that each start a game and press random arrow
+keys. The bots read every byte they are sent, so the server does all
+its usual work. Once the bots have played for a while it asks the
+server for its statistics and reports:
+- the share of a core the sessions used
+- how many sessions one core could host at that rate
+- how late ticks ran
+
+    python3 loadgen.py --bots 200 --seconds 20 --spawn
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from server import DEFAULT_PORT
+
+ARROW_KEYS = (b'\x1b[A', b'\x1b[B', b'\x1b[C', b'\x1b[D')
+
+class Bot:
+    """A client that plays by pressing a random arrow every so often"""
+    def __init__(self, rng, key_interval):
+        self.rng = rng
+        self.key_interval = key_interval
+        self.received = 0
+        self.keys = 0
+    
+    async def run(self, host, port, stop):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b'p')
+        reading = asyncio.create_task(self.read(reader))
+        try:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), self.rng.expovariate(1 / self.key_interval))
+                except asyncio.TimeoutError:
+                    writer.write(self.rng.choice(ARROW_KEYS))
+                    self.keys += 1
+            writer.write(b'q')
+            await writer.drain()
+        finally:
+            writer.close()
+            reading.cancel()
+    
+    async def read(self, reader):
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            self.received += len(data)
+
+async def server_stats(host, port):
+    """The statistics line server.py prints for S in its lobby"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b's')
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("server closed the connection without statistics")
+            start = line.find(b'{')
+            if start >= 0:
+                return json.loads(line[start:])
+    finally:
+        writer.write(b'q')
+        writer.close()
+
+async def wait_for_server(host, port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+async def generate_load(host, port, bots, seconds, warmup, key_interval, seed):
+    rng = random.Random(seed)
+    stop = asyncio.Event()
+    clients = [Bot(random.Random(rng.random()), key_interval) for _ in range(bots)]
+    tasks = []
+    # Spread the connections over the warm-up so they do not all tick in step
+    for bot in clients:
+        tasks.append(asyncio.create_task(bot.run(host, port, stop)))
+        await asyncio.sleep(warmup / max(1, bots))
+    
+    before = await server_stats(host, port)
+    received = sum(bot.received for bot in clients)
+    start = time.monotonic()
+    await asyncio.sleep(seconds)
+    after = await server_stats(host, port)
+    elapsed = time.monotonic() - start
+    received = sum(bot.received for bot in clients) - received
+    
+    stop.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failures = [result for result in results if isinstance(result, BaseException)]
+    return before, after, elapsed, received, failures
+
+def report(bots, before, after, elapsed, received, failures):
+    cores = (after['cpu_seconds'] - before['cpu_seconds']) / (after['wall_seconds'] - before['wall_seconds'])
+    ticks = after['ticks'] - before['ticks']
+    jitter = after['jitter_ms']
+    print(f"{after['sessions']} sessions from {bots} bots ({len(failures)} failed) over {elapsed:.1f}s")
+    print(f"server CPU: {cores:.2f} cores, so about {after['sessions'] / max(cores, 1e-9):.0f} sessions per core")
+    print(f"ticks: {ticks / elapsed:.0f}/s; lateness since start: mean {jitter['mean']:.2f}ms, "
+          f"p50 {jitter['p50']:.2f}ms, p99 {jitter['p99']:.2f}ms, max {jitter['max']:.2f}ms")
+    print(f"sent to bots: {received / elapsed / 1024:.0f} KiB/s, "
+          f"{received / max(1, ticks):.0f} bytes per tick; frames skipped for full buffers: {after['frames_skipped']}")
+    for failure in failures[:3]:
+        print(f"bot failed: {failure!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure how many sessions server.py can host')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--bots', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=10.0, help='measured time after the warm-up')
+    parser.add_argument('--warmup', type=float, default=3.0, help='seconds over which the bots connect')
+    parser.add_argument('--key-interval', type=float, default=0.5, help='mean seconds between key presses')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn', action='store_true', help='start a server.py for the run and stop it after')
+    parser.add_argument('--map', default='pacman-map.txt', help='map for a spawned server')
+    args = parser.parse_args()
+    
+    server = None
+    if args.spawn:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+        server = subprocess.Popen([sys.executable, script, args.map, '--host', args.host, '--port', str(args.port)],
+                                  stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_for_server(args.host, args.port))
+        results = asyncio.run(generate_load(args.host, args.port, args.bots, args.seconds, args.warmup,
+                                            args.key_interval, args.seed))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    report(args.bots, *results)
+
+if __name__ == '__main__':
+    main()
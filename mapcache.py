@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Compiled map cache for instant startup
+
+Parsing a map and building its navigation tables is quick for the
+default maze but takes seconds for huge ones. A compiled map holds the
+padded grid, spawn points, pellet and pill bitsets, warp and fruit
+positions and every navigation table, and loads with a single read.
+
+Compiled maps live in a cache directory, named by a hash of the map
+file's contents, so editing a map simply misses the cache and compiles
+it afresh. The directory is $PACMAN_MAP_CACHE if set, otherwise
+pacman-maps under $XDG_CACHE_HOME or ~/.cache. Maps can be compiled
+ahead of time:
+
+    python3 mapcache.py maps/
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from collections import OrderedDict
+
+from board import Bitset, Maze, Point
+from navigation import NavGraph
+
+MAGIC = b'PACMAP\0'
+# Bump when the layout or the compiled tables change, so old files are ignored
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<7sBI')
+
+# (attribute, typecode) of the NavGraph tables stored verbatim; 'B' is a bytearray
+NAV_TABLES = (
+    ('walkable', 'B'),
+    ('exits', 'B'),
+    ('nodes', 'i'),
+    ('node_index', 'i'),
+    ('corridor', 'i'),
+    ('offset', 'i'),
+    ('corridor_a', 'i'),
+    ('corridor_b', 'i'),
+    ('corridor_length', 'i'),
+    ('edge_start', 'i'),
+    ('edge_node', 'i'),
+    ('edge_length', 'i'),
+)
+
+def cache_dir():
+    path = os.environ.get('PACMAN_MAP_CACHE')
+    if path:
+        return path
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pacman-maps')
+
+def map_hash(text):
+    """Identifies a map by the contents of its file"""
+    return hashlib.sha256(text).hexdigest()
+
+def cache_path(text, directory=None):
+    """Where the compiled form of a map with this text is kept"""
+    return os.path.join(directory or cache_dir(), f"{map_hash(text)}.v{FORMAT_VERSION}.pacmap")
+
+def point(value):
+    return Point(*value) if value is not None else None
+
+def parse(text):
+    """A Maze from the contents of a map file, split into lines as Maze.load does"""
+    return Maze([line.rstrip(b'\r\n') for line in io.BytesIO(text)])
+
+def encode(maze):
+    """Serialise a Maze and its NavGraph to bytes"""
+    nav = maze.nav
+    sections = [('grid', maze.grid), ('pellets', maze.pellets), ('power_pills', maze.power_pills)]
+    sections += [(name, getattr(nav, name)) for name, _ in NAV_TABLES]
+    if nav.junction_distances is not None:
+        table = array('i')
+        for row in nav.junction_distances:
+            table.extend(row)
+        sections.append(('junction_distances', table))
+    sections = [(name, memoryview(data)) for name, data in sections]
+    
+    meta = {
+        'byteorder': sys.byteorder,
+        'int_size': array('i').itemsize,
+        'width': maze.width,
+        'height': maze.height,
+        'pacman_start': maze.pacman_start,
+        'ghost_starts': maze.ghost_starts,
+        'fruit': maze.fruit,
+        'warp_left': maze.warp_left,
+        'warp_right': maze.warp_right,
+        'dot_count': maze.dot_count,
+        'sections': [(name, data.nbytes) for name, data in sections],
+    }
+    meta = json.dumps(meta).encode()
+    return b''.join([HEADER.pack(MAGIC, FORMAT_VERSION, len(meta)), meta] + [data for _, data in sections])
+
+def decode(data):
+    """Rebuild a Maze from encode() output; returns None if it is not usable here"""
+    if len(data) < HEADER.size:
+        return None
+    magic, version, meta_size = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+    meta = json.loads(data[HEADER.size:HEADER.size + meta_size])
+    if meta['byteorder'] != sys.byteorder or meta['int_size'] != array('i').itemsize:
+        return None
+    
+    view = memoryview(data)
+    sections = {}
+    position = HEADER.size + meta_size
+    for name, size in meta['sections']:
+        sections[name] = view[position:position + size]
+        position += size
+    if position != len(data):
+        return None
+    
+    maze = Maze.__new__(Maze)
+    maze.width = meta['width']
+    maze.height = meta['height']
+    maze.grid = bytearray(sections['grid'])
+    maze.pacman_start = point(meta['pacman_start'])
+    maze.ghost_starts = [Point(*start) for start in meta['ghost_starts']]
+    maze.fruit = point(meta['fruit'])
+    maze.warp_left = point(meta['warp_left'])
+    maze.warp_right = point(meta['warp_right'])
+    maze.pellets = Bitset(sections['pellets'])
+    maze.power_pills = Bitset(sections['power_pills'])
+    maze.dot_count = meta['dot_count']
+    
+    nav = maze.nav = NavGraph.__new__(NavGraph)
+    nav.width = maze.width
+    nav.height = maze.height
+    nav.offsets = (-nav.width, nav.width, -1, 1, 0)
+    for name, typecode in NAV_TABLES:
+        if typecode == 'B':
+            table = bytearray(sections[name])
+        else:
+            table = array(typecode)
+            table.frombytes(sections[name])
+        setattr(nav, name, table)
+    nav.link_warps(maze.warp_left, maze.warp_right)
+    nav.junction_distances = None
+    if 'junction_distances' in sections:
+        table = array('i')
+        table.frombytes(sections['junction_distances'])
+        count = len(nav.nodes)
+        nav.junction_distances = [table[i:i + count] for i in range(0, len(table), count)]
+    nav.fields = OrderedDict()
+    return maze
+
+def write(path, data):
+    """Write data to path atomically, so readers never see half a file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def compile_map(map_file, directory=None):
+    """Parse a map file and write its compiled form to the cache; returns the Maze"""
+    with open(map_file, 'rb') as f:
+        text = f.read()
+    maze = parse(text)
+    write(cache_path(text, directory), encode(maze))
+    return maze
+
+def load(map_file, directory=None):
+    """Load a map through the cache, compiling and caching it on a miss"""
+    with open(map_file, 'rb') as f:
+        text = f.read()
+    path = cache_path(text, directory)
+    try:
+        with open(path, 'rb') as f:
+            maze = decode(f.read())
+        if maze is not None:
+            return maze
+    except (OSError, ValueError, KeyError):
+        # Missing, unreadable or corrupt: compile it again
+        pass
+    
+    maze = parse(text)
+    try:
+        write(path, encode(maze))
+    except OSError:
+        # A read-only or missing cache directory only costs the speed-up
+        pass
+    return maze
+
+_mazes = {}
+
+def load_maze(map_file):
+    """Load a map file, reusing the Maze while the file is unchanged
+
+    Within a process the parsed Maze is shared; across processes the
+    compiled cache on disk is.
+    """
+    stat = os.stat(map_file)
+    key = (os.path.abspath(map_file), stat.st_mtime_ns, stat.st_size)
+    maze = _mazes.get(key)
+    if maze is None:
+        maze = _mazes[key] = load(map_file)
+    return maze
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile maps into the map cache ahead of time')
+    parser.add_argument('paths', nargs='+', help='map files, or directories of *.txt maps')
+    parser.add_argument('--cache-dir', default=None, help=f"default: {cache_dir()}")
+    args = parser.parse_args()
+    
+    map_files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            map_files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.txt'))
+        else:
+            map_files.append(path)
+    
+    for map_file in map_files:
+        start = time.perf_counter()
+        maze = compile_map(map_file, args.cache_dir)
+        print(f"{map_file}: {maze.width}x{maze.height} compiled in {time.perf_counter() - start:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""Procedural mazes, for a fresh layout on every level
+
+generate() writes a map in the usual text format: walls mirrored about
+the middle column, a ghost house with a door on top, a <> warp pair, a
+fruit spot, pacman's start and power pills in the corners. Corridors
+run along a lattice of nodes two cells apart. A random spanning tree of
+half the lattice (Kruskal's, with union-find) joins every node; extra
+links then remove all dead ends; the half is mirrored to make the
+whole. validate() checks the result by breadth-first search: every dot
+and ghost must be reachable from pacman, and no dotted corridor may end
+in a dead end.
+
+A LevelQueue hands out the maze for each level. A worker process keeps
+the next few generated and compiled ahead of play, so a new level starts
+without a pause. Each level's maze comes from the game's seed and the
+level number, so a replay sees the same mazes.
+
+    python3 mazegen.py --width 47 --height 21 --seed 7
+    python3 mazegen.py --bench
+"""
+import argparse
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from board import WALL, Maze
+from mapcache import decode, encode
+
+HEADER = b'SCORE: 000000 - LEVEL: 1 - LIVES: 3'
+# Distance between lattice nodes; corridors run along rows and columns of nodes
+STEP = 2
+# Half the ghost house's width, walls included
+HOUSE_HALF_WIDTH = 5
+GHOSTS = 4
+MIN_WIDTH = 15
+MIN_HEIGHT = 9
+# Levels generated ahead of play
+QUEUE_DEPTH = 3
+
+# (width, height) pairs timed by --bench
+BENCH_SIZES = ((23, 13), (47, 21), (99, 41), (199, 81))
+
+def valid_size(width, height):
+    """The nearest usable size at or below (width, height)
+
+    The middle column must be a lattice column, so the width is 3 more
+    than a multiple of 4; the height is odd.
+    """
+    width = max(MIN_WIDTH, width - (width - 3) % 4)
+    height = max(MIN_HEIGHT, height - (height - 1) % 2)
+    return width, height
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+    
+    def find(self, item):
+        parent = self.parent
+        root = item
+        while parent.get(root, root) != root:
+            root = parent[root]
+        # Point everything on the way straight at the root
+        while item != root:
+            parent[item], item = root, parent[item]
+        return root
+    
+    def union(self, a, b):
+        """Join the sets of a and b; returns False if they were already one"""
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return False
+        self.parent[a] = b
+        return True
+
+def generate(width, height, rng):
+    """Rows of a new map of about width x height cells, header line included"""
+    width, height = valid_size(width, height)
+    middle = width // 2
+    house_y = height // 2 | 1
+    house_left = middle - HOUSE_HALF_WIDTH + 1
+    
+    # Lattice nodes of the left half, middle column included; the house row is fixed
+    nodes = [(y, x) for y in range(1, height - 1, STEP) for x in range(1, middle + 1, STEP)]
+    in_house = {(house_y, x) for x in range(house_left, middle + 1, STEP)}
+    open_nodes = [node for node in nodes if node not in in_house]
+    node_set = set(open_nodes)
+    
+    edges = []
+    for y, x in open_nodes:
+        for ny, nx in ((y, x + STEP), (y + STEP, x)):
+            if (ny, nx) in node_set:
+                edges.append(((y, x), (ny, nx)))
+    rng.shuffle(edges)
+    
+    # A random spanning tree joins every node...
+    links = set()
+    sets = UnionFind()
+    for a, b in edges:
+        if sets.union(a, b):
+            links.add((a, b))
+    
+    warp_y = rng.choice([y for y in range(1, height - 1, STEP) if y != house_y])
+    
+    def degree(node):
+        y, x = node
+        count = 0
+        for other in ((y, x - STEP), (y, x + STEP), (y - STEP, x), (y + STEP, x)):
+            if (min(node, other), max(node, other)) in links:
+                count += 1
+        # The mirror image adds a second link across the middle column
+        if x == middle and ((y, x - STEP), node) in links:
+            count += 1
+        if node == (house_y - STEP, middle):
+            count += 1  # The house door
+        if y == warp_y and x == 1:
+            count += 1  # The tunnel
+        return count
+    
+    # ...and extra links take out its dead ends
+    order = open_nodes[:]
+    rng.shuffle(order)
+    for node in order:
+        if degree(node) >= 2:
+            continue
+        y, x = node
+        options = [other for other in ((y, x - STEP), (y, x + STEP), (y - STEP, x), (y + STEP, x))
+                   if other in node_set and (min(node, other), max(node, other)) not in links]
+        if options:
+            other = rng.choice(options)
+            links.add((min(node, other), max(node, other)))
+    
+    grid = [bytearray(b'#' * width) for _ in range(height)]
+    
+    def carve(y, x, char=b'.'):
+        grid[y][x] = grid[y][width - 1 - x] = char[0]
+    
+    for y, x in open_nodes:
+        carve(y, x)
+    for (ay, ax), (by, bx) in links:
+        carve((ay + by) // 2, (ax + bx) // 2)
+        carve(by, bx)
+    
+    # Ghost house: a walled room on house_y with a door in the middle of its roof
+    for x in range(house_left, middle + 1):
+        carve(house_y, x, b' ')
+    carve(house_y - 1, middle, b' ')
+    starts = range(middle - GHOSTS + 1, middle + GHOSTS, 2)
+    for x in starts:
+        grid[house_y][x] = ord('n')
+    
+    grid[warp_y][0] = ord('<')
+    grid[warp_y][width - 1] = ord('>')
+    for y, x in ((1, 1), (height - 2, 1)):
+        carve(y, x, b'o')
+    
+    # Pacman and the fruit on the first row below the house
+    below = house_y + STEP
+    grid[below][middle] = ord('@')
+    grid[below][middle - STEP] = ord('c')
+    return [HEADER[:width].rstrip()] + [bytes(row) for row in grid]
+
+def validate(maze):
+    """Problems with a Maze, as a list of strings; empty if it is fit to play"""
+    problems = []
+    if not maze.pacman_start:
+        return ["no pacman start"]
+    if not maze.ghost_starts:
+        problems.append("no ghosts")
+    if not maze.fruit:
+        problems.append("no fruit spot")
+    if not (maze.warp_left and maze.warp_right):
+        problems.append("no warp pair")
+    
+    width = maze.width
+    walls = bytes(int(c == WALL) for c in maze.grid)
+    # Row 0 is the score line, not part of the maze
+    if any(walls[y * width:(y + 1) * width] != walls[y * width:(y + 1) * width][::-1]
+           for y in range(1, maze.height)):
+        problems.append("walls are not symmetric")
+    
+    nav = maze.nav
+    start = maze.pacman_start.y * width + maze.pacman_start.x
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        for n in nav.neighbors(cell):
+            if n not in seen:
+                seen.add(n)
+                queue.append(n)
+    
+    dots = set(maze.pellets.indices()) | set(maze.power_pills.indices())
+    if not dots <= seen:
+        problems.append(f"{len(dots - seen)} dots out of reach")
+    if any(ghost.y * width + ghost.x not in seen for ghost in maze.ghost_starts):
+        problems.append("ghosts out of reach")
+    if maze.fruit.y * width + maze.fruit.x not in seen:
+        problems.append("fruit out of reach")
+    dead_ends = sum(1 for cell in dots if nav.degree(cell) < 2)
+    if dead_ends:
+        problems.append(f"{dead_ends} dead ends")
+    return problems
+
+def generate_valid(width, height, rng):
+    """(rows, Maze) of a new map that passes validate(), generating again in the unlikely case one fails"""
+    while True:
+        rows = generate(width, height, rng)
+        maze = Maze(rows)
+        if not validate(maze):
+            return rows, maze
+
+def generate_rows(width, height, rng):
+    """Rows of a new map that passes validate(), as generate() gives them"""
+    return generate_valid(width, height, rng)[0]
+
+def generate_maze(width, height, rng):
+    """A new Maze that passes validate()"""
+    return generate_valid(width, height, rng)[1]
+
+def level_rng(seed, level):
+    return random.Random(f"{seed}:{level}")
+
+def compile_level(width, height, seed, level):
+    """A level's maze, compiled as mapcache does, for passing between processes"""
+    return encode(generate_maze(width, height, level_rng(seed, level)))
+
+def level_maze(spec, level):
+    """The maze a LevelQueue with this spec() gives for level"""
+    return generate_maze(spec['width'], spec['height'], level_rng(spec['seed'], level))
+
+class LevelQueue:
+    """Mazes for levels after the first, generated ahead of play
+
+    maze(level) returns the Maze for a level. With background set, a
+    worker process keeps the next QUEUE_DEPTH levels compiled and
+    waiting. Without it, each maze is made when asked for; it is the
+    same maze either way.
+    """
+    def __init__(self, width, height, seed, depth=QUEUE_DEPTH, background=True):
+        self.width, self.height = valid_size(width, height)
+        self.seed = seed
+        self.depth = depth
+        self.pool = ProcessPoolExecutor(max_workers=1) if background else None
+        self.ready = {}
+        self.top_up(2)
+    
+    def spec(self):
+        """What a recording needs to make the same mazes"""
+        return {'width': self.width, 'height': self.height, 'seed': self.seed}
+    
+    def top_up(self, level):
+        if self.pool:
+            for ahead in range(level, level + self.depth):
+                if ahead not in self.ready:
+                    self.ready[ahead] = self.pool.submit(compile_level, self.width, self.height, self.seed, ahead)
+    
+    def maze(self, level):
+        future = self.ready.pop(level, None)
+        data = future.result() if future else compile_level(self.width, self.height, self.seed, level)
+        for old in [ahead for ahead in self.ready if ahead < level]:
+            self.ready.pop(old).cancel()
+        self.top_up(level + 1)
+        return decode(data)
+    
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+
+def bench(sizes, seconds):
+    """Maps per second at each size: generated, then compiled, then validated too"""
+    print(f"{'size':>9} {'generate/s':>11} {'+compile/s':>11} {'+validate/s':>12} {'invalid':>8}")
+    for width, height in sizes:
+        rates = []
+        # Maps validate() found a problem with, which generate_valid() would make again
+        invalid = 0
+        for stage in range(3):
+            rng = random.Random(0)
+            count = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < seconds:
+                rows = generate(width, height, rng)
+                if stage >= 1:
+                    maze = Maze(rows)
+                if stage == 2 and validate(maze):
+                    invalid += 1
+                count += 1
+            rates.append(count / (time.perf_counter() - start))
+        width, height = valid_size(width, height)
+        print(f"{width:>4}x{height:<4} {rates[0]:>11.1f} {rates[1]:>11.1f} {rates[2]:>12.1f} {invalid:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate Pac-Man mazes')
+    parser.add_argument('--width', type=int, default=47)
+    parser.add_argument('--height', type=int, default=21, help='rows, not counting the score line')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', '-o', help='write the map here instead of printing it')
+    parser.add_argument('--bench', action='store_true', help='time generation at several sizes')
+    parser.add_argument('--seconds', type=float, default=1.0, help='per size and stage, with --bench')
+    args = parser.parse_args()
+    
+    if args.bench:
+        bench(BENCH_SIZES, args.seconds)
+        return
+    rows = generate_rows(args.width, args.height, random.Random(args.seed))
+    text = b'\n'.join(rows) + b'\n'
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(text)
+    else:
+        print(text.decode(), end='')
+
+if __name__ == '__main__':
+    main()
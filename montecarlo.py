@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Monte Carlo runner for difficulty and scoring analysis
+
+Plays many headless games of one map in parallel and summarises score,
+levels cleared, lives lost per level and game length. Every game gets
+its own seed, so a run is reproduced exactly from its seed list. Seeds
+are handed to worker processes in chunks to keep inter-process traffic
+small.
+
+    python3 montecarlo.py --games 5000 --policy greedy --power-seconds 8
+"""
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from navigation import DIRECTIONS
+from simulation import Simulation, random_policy
+
+def greedy_policy(game, rng):
+    """Head for the nearest dot, keeping away from ghosts that are not frightened"""
+    nav = game.nav
+    width = game.width
+    start = game.pacman.y * width + game.pacman.x
+    danger = set()
+    for ghost in game.ghosts:
+        if not ghost.frightened:
+            cell = ghost.y * width + ghost.x
+            danger.add(cell)
+            danger.update(nav.neighbors(cell))
+    
+    # Breadth-first search, remembering the first move that led to each cell
+    first_move = {start: None}
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        if cell != start and (game.pellets.test(cell) or game.power_pills.test(cell)):
+            return first_move[cell]
+        for i, direction in enumerate(DIRECTIONS):
+            if nav.exits[cell] >> i & 1:
+                n = cell + nav.offsets[i]
+            else:
+                n = nav.warps.get(cell * 5 + i)
+                if n is None:
+                    continue
+            if n in first_move or n in danger:
+                continue
+            first_move[n] = first_move[cell] or direction
+            queue.append(n)
+    return rng.choice(DIRECTIONS)
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+}
+
+def load_policy(name):
+    """A policy from POLICIES, or any callable named as module:function"""
+    if name in POLICIES:
+        return POLICIES[name]
+    module, _, func = name.partition(':')
+    return getattr(importlib.import_module(module), func)
+
+def play(map_file, seed, policy, rules, max_ticks, max_levels):
+    """Play one game to the end; returns its statistics as a dict"""
+    game = Simulation(map_file, rng=random.Random(seed))
+    for name, value in rules.items():
+        setattr(game, name, value)
+    game.speed = game.START_SPEED
+    # Timers count ticks, so restart the ghost waves at the new tick length
+    game.reset_positions()
+    policy_rng = random.Random(~seed)
+    
+    lives_lost = [0]
+    ticks = 0
+    while ticks < max_ticks:
+        lives = game.lives
+        in_play = game.step(policy(game, policy_rng))
+        ticks += 1
+        if game.lives < lives:
+            # The rules can take a life more on the tick the game ends; lives stop at none
+            lives_lost[-1] += lives - max(game.lives, 0)
+        if not in_play:
+            if game.game_over or game.level >= max_levels:
+                break
+            game.next_level()
+            lives_lost.append(0)
+    return {
+        'seed': seed,
+        'score': game.score,
+        'levels_cleared': game.level - 1 + game.won,
+        'lives_lost': lives_lost,
+        'ticks': ticks,
+        'game_over': game.game_over,
+    }
+
+def play_chunk(args):
+    """Worker entry point: play a list of seeds"""
+    map_file, seeds, policy_name, rules, max_ticks, max_levels = args
+    policy = load_policy(policy_name)
+    return [play(map_file, seed, policy, rules, max_ticks, max_levels) for seed in seeds]
+
+def run(map_file, seeds, policy='random', rules=None, workers=None, chunk_size=None,
+        max_ticks=20000, max_levels=20):
+    """Play one game per seed across worker processes; results follow seed order"""
+    rules = rules or {}
+    workers = workers or os.cpu_count() or 1
+    if not chunk_size:
+        # A few chunks per worker balances load without much pickling
+        chunk_size = max(1, math.ceil(len(seeds) / (workers * 4)))
+    chunks = [(map_file, seeds[i:i + chunk_size], policy, rules, max_ticks, max_levels)
+              for i in range(0, len(seeds), chunk_size)]
+    if workers == 1:
+        return [result for chunk in map(play_chunk, chunks) for result in chunk]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [result for chunk in pool.map(play_chunk, chunks) for result in chunk]
+
+def describe(values):
+    values = sorted(values)
+    return {
+        'mean': statistics.fmean(values),
+        'stdev': statistics.pstdev(values),
+        'min': values[0],
+        'p50': values[len(values) // 2],
+        'p90': values[min(len(values) - 1, int(len(values) * 0.9))],
+        'max': values[-1],
+    }
+
+def summarize(results):
+    """Aggregate per-game results into summary statistics"""
+    deepest = max(len(r['lives_lost']) for r in results)
+    per_level = []
+    for level in range(deepest):
+        reached = [r['lives_lost'][level] for r in results if len(r['lives_lost']) > level]
+        per_level.append({
+            'level': level + 1,
+            'games': len(reached),
+            'mean_lives_lost': statistics.fmean(reached),
+        })
+    return {
+        'games': len(results),
+        'score': describe([r['score'] for r in results]),
+        'levels_cleared': describe([r['levels_cleared'] for r in results]),
+        'ticks': describe([r['ticks'] for r in results]),
+        'lives_lost_per_level': per_level,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Play many headless games and summarise the results')
+    parser.add_argument('map_file', nargs='?', default='pacman-map.txt')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0, help='first seed; games use seed, seed+1, ...')
+    parser.add_argument('--seeds-file', help='read seeds from a file, one per line, instead')
+    parser.add_argument('--policy', default='random',
+                        help=f"one of {', '.join(POLICIES)}, or module:function")
+    parser.add_argument('--workers', type=int, default=None, help='default: one per core')
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--max-ticks', type=int, default=20000, help='per game')
+    parser.add_argument('--max-levels', type=int, default=20, help='per game')
+    parser.add_argument('--speed', type=float, help='seconds per tick on level 1')
+    parser.add_argument('--min-speed', type=float)
+    parser.add_argument('--speed-step', type=float)
+    parser.add_argument('--power-seconds', type=float)
+    parser.add_argument('--fruit-seconds', type=float)
+    parser.add_argument('--json', help='write the summary and every game result to this file')
+    args = parser.parse_args()
+    
+    if args.seeds_file:
+        with open(args.seeds_file) as f:
+            seeds = [int(line) for line in f if line.strip()]
+    else:
+        seeds = list(range(args.seed, args.seed + args.games))
+    overrides = {
+        'START_SPEED': args.speed,
+        'MIN_SPEED': args.min_speed,
+        'SPEED_STEP': args.speed_step,
+        'POWER_MODE_SECONDS': args.power_seconds,
+        'FRUIT_SECONDS': args.fruit_seconds,
+    }
+    rules = {name: value for name, value in overrides.items() if value is not None}
+    
+    start = time.perf_counter()
+    results = run(args.map_file, seeds, args.policy, rules, args.workers, args.chunk_size,
+                  args.max_ticks, args.max_levels)
+    elapsed = time.perf_counter() - start
+    summary = summarize(results)
+    
+    total_ticks = sum(r['ticks'] for r in results)
+    print(f"{len(results)} games, {total_ticks} ticks in {elapsed:.2f}s "
+          f"({len(results) / elapsed:.0f} games/sec, {total_ticks / elapsed:.0f} ticks/sec)")
+    for name in ('score', 'levels_cleared', 'ticks'):
+        stats = summary[name]
+        print(f"{name:>15}: mean {stats['mean']:.1f} sd {stats['stdev']:.1f} "
+              f"min {stats['min']} p50 {stats['p50']} p90 {stats['p90']} max {stats['max']}")
+    for level in summary['lives_lost_per_level']:
+        print(f"{'level ' + str(level['level']):>15}: {level['games']} games, "
+              f"{level['mean_lives_lost']:.2f} lives lost on average")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rules': rules, 'policy': args.policy, 'seeds': seeds,
+                       'summary': summary, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""Navigation tables compiled from the maze once, at load time
+
+Cells are numbered y * width + x. For every cell NavGraph keeps a 4-bit
+mask of the directions that lead to a walkable neighbour, so movement
+and ghost decisions become table lookups instead of repeated
+is_valid_move() calls. Warp tunnels are links from a (cell, direction)
+pair to the far tunnel mouth, and corridors are collapsed into edges
+between junctions.
+
+The per-cell tables are built a whole direction at a time with bytes
+and big-integer operations, and corridors are walked once, so building
+the graph takes time and memory linear in the number of cells even for
+mazes millions of cells in size.
+
+On mazes with few enough junctions, distances between junctions are
+computed for all pairs at load time, so a distance field towards any
+target cell costs one pass over the junctions. Bigger mazes search
+outwards from the target for a bounded number of steps instead. Either
+way a field is cached until a different target is asked for.
+"""
+import heapq
+from array import array
+from collections import OrderedDict
+
+# Directions as (dy, dx), in the order ghosts consider them
+UP = (-1, 0)
+DOWN = (1, 0)
+LEFT = (0, -1)
+RIGHT = (0, 1)
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+
+# Index of a direction in DIRECTIONS; STOP stands for (0, 0)
+STOP = 4
+# DIR_INDEX[(dy + 1) * 3 + dx + 1] is the index of direction (dy, dx)
+DIR_INDEX = (-1, 0, -1, 2, STOP, 3, -1, 1, -1)
+REVERSE = (1, 0, 3, 2, STOP)
+
+# MASK_DIRS[mask] lists the directions whose bits are set, in DIRECTIONS order
+MASK_DIRS = tuple(tuple(d for i, d in enumerate(DIRECTIONS) if mask >> i & 1) for mask in range(16))
+JUNCTION = tuple(len(dirs) > 2 for dirs in MASK_DIRS)
+# Clearing REVERSE_CLEAR[heading] from a mask drops the way back; STOP drops nothing
+REVERSE_CLEAR = tuple(~(1 << REVERSE[i]) & 0xF for i in range(STOP)) + (0xF,)
+
+# FIRST_DIR[mask] is the index of the lowest direction set in mask
+FIRST_DIR = tuple((mask & -mask).bit_length() - 1 for mask in range(16))
+# NOT_TWO_EXITS[mask] is 1 unless exactly two directions are set
+NOT_TWO_EXITS = bytes(int(bin(mask).count('1') != 2) for mask in range(256))
+
+# Larger than any real distance
+UNREACHABLE = 1 << 30
+# Above this many junctions the all-pairs table is skipped for bounded searches
+ALL_PAIRS_LIMIT = 1024
+# Steps a bounded search covers around its target
+FIELD_RADIUS = 128
+# Distance fields kept per maze, least recently used dropped first
+FIELD_CACHE_SIZE = 64
+
+class NodeDistances(dict):
+    """Distances to the nodes a bounded search reached; the rest are unreachable"""
+    def __missing__(self, node):
+        return UNREACHABLE
+
+class NavGraph:
+    """Per-cell exits, warp links and the junction-to-junction corridor graph
+
+    walkable holds one byte per cell, 1 for floor and 0 for wall.
+    """
+    def __init__(self, width, height, walkable, warp_left=None, warp_right=None):
+        self.width = width
+        self.height = height
+        # Cell index step for each direction index
+        self.offsets = (-width, width, -1, 1, 0)
+        self.walkable = bytearray(walkable)
+        self.exits = self.build_exits()
+        
+        self.link_warps(warp_left, warp_right)
+        self.build_corridors()
+        self.build_junction_distances()
+        self.fields = OrderedDict()
+    
+    def link_warps(self, warp_left, warp_right):
+        """warps[cell * 5 + direction] is the far end of a tunnel"""
+        self.warps = {}
+        if warp_left and warp_right:
+            left = warp_left.y * self.width + warp_left.x
+            right = warp_right.y * self.width + warp_right.x
+            self.warps[left * 5 + DIRECTIONS.index(LEFT)] = right
+            self.warps[right * 5 + DIRECTIONS.index(RIGHT)] = left
+        self.warp_cells = {key // 5 for key in self.warps}
+    
+    def build_exits(self):
+        """exits[cell] has bit i set if DIRECTIONS[i] leads somewhere walkable
+
+        Built a direction at a time: the walkable bytes are shifted so each
+        cell lines up with its neighbour, and the four results are added as
+        big integers with each direction shifted to its own bit.
+        """
+        width, height = self.width, self.height
+        cells = width * height
+        if not cells:
+            return bytearray()
+        walkable = bytes(self.walkable)
+        up = bytes(width) + walkable[:cells - width]
+        down = walkable[width:] + bytes(width)
+        # Left and right neighbours must not wrap around to another row
+        left = bytearray(b'\0' + walkable[:-1])
+        left[0::width] = bytes(height)
+        right = bytearray(walkable[1:] + b'\0')
+        right[width - 1::width] = bytes(height)
+        
+        masks = 0
+        for i, shifted in enumerate((up, down, left, right)):
+            masks += int.from_bytes(shifted, 'little') << i
+        return bytearray(masks.to_bytes(cells, 'little'))
+    
+    def is_junction(self, cell):
+        return JUNCTION[self.exits[cell]]
+    
+    def directions(self, cell, heading=STOP):
+        """Valid directions from cell, minus the reverse of heading"""
+        return MASK_DIRS[self.exits[cell] & REVERSE_CLEAR[heading]]
+    
+    def neighbors(self, cell):
+        """Walkable cells one move away, through tunnels too"""
+        for _, n in self.moves(cell):
+            yield n
+    
+    def degree(self, cell):
+        return sum(1 for _ in self.neighbors(cell))
+    
+    def moves(self, cell, heading=STOP):
+        """(direction index, next cell) for every move out of cell, tunnels included, never reversing"""
+        moves = []
+        for i in range(STOP):
+            if i == REVERSE[heading]:
+                continue
+            if self.exits[cell] >> i & 1:
+                moves.append((i, cell + self.offsets[i]))
+            if cell * 5 + i in self.warps:
+                moves.append((i, self.warps[cell * 5 + i]))
+        return moves
+    
+    def build_corridors(self):
+        """Collapse corridors into edges between nodes (cells that are not corridors)
+
+        nodes lists the node cells in order and node_index[cell] is a
+        cell's position in it, or -1. A corridor cell lies offset[cell]
+        steps along corridor[cell] from node corridor_a[...], and
+        corridor_length[...] steps from its other end corridor_b[...].
+        The edges leaving node i are edge_node/edge_length[edge_start[i]:
+        edge_start[i + 1]].
+        """
+        cells = self.width * self.height
+        exits, walkable, warp_cells = self.exits, self.walkable, self.warp_cells
+        
+        # Nodes are walkable cells without exactly two ways out; only cells
+        # by a tunnel can have a way out that their exits mask does not show
+        flags = int.from_bytes(exits.translate(NOT_TWO_EXITS), 'little')
+        flags &= int.from_bytes(walkable, 'little')
+        flags = flags.to_bytes(cells, 'little')
+        nodes = []
+        cell = flags.find(1)
+        while cell >= 0:
+            nodes.append(cell)
+            cell = flags.find(1, cell + 1)
+        for cell in warp_cells:
+            if walkable[cell] and self.degree(cell) != 2:
+                nodes.append(cell)
+            elif flags[cell]:
+                nodes.remove(cell)
+        self.nodes = array('i', sorted(set(nodes)))
+        self.node_index = array('i', [-1]) * cells
+        for i, node in enumerate(self.nodes):
+            self.node_index[node] = i
+        
+        self.corridor = array('i', [-1]) * cells
+        self.offset = array('i', [0]) * cells
+        self.corridor_a = array('i')
+        self.corridor_b = array('i')
+        self.corridor_length = array('i')
+        self.edge_start = array('i', [0])
+        self.edge_node = array('i')
+        self.edge_length = array('i')
+        node_index, corridor, offset, offsets = self.node_index, self.corridor, self.offset, self.offsets
+        for a, node in enumerate(self.nodes):
+            for heading, first in self.moves(node):
+                if node_index[first] >= 0:
+                    self.edge_node.append(node_index[first])
+                    self.edge_length.append(1)
+                    continue
+                if corridor[first] >= 0:
+                    # Walked already from its other end
+                    c = corridor[first]
+                    self.edge_node.append(self.corridor_a[c])
+                    self.edge_length.append(self.corridor_length[c])
+                    continue
+                
+                c = len(self.corridor_length)
+                cur, length = first, 1
+                while node_index[cur] < 0:
+                    corridor[cur] = c
+                    offset[cur] = length
+                    if cur in warp_cells:
+                        heading, cur = self.moves(cur, heading)[0]
+                    else:
+                        heading = FIRST_DIR[exits[cur] & REVERSE_CLEAR[heading]]
+                        cur += offsets[heading]
+                    length += 1
+                self.corridor_a.append(a)
+                self.corridor_b.append(node_index[cur])
+                self.corridor_length.append(length)
+                self.edge_node.append(node_index[cur])
+                self.edge_length.append(length)
+            self.edge_start.append(len(self.edge_node))
+    
+    def build_junction_distances(self):
+        """All-pairs shortest distances between nodes, if there are few enough of them"""
+        self.junction_distances = None
+        if len(self.nodes) > ALL_PAIRS_LIMIT:
+            return
+        self.junction_distances = [self.node_distances({source: 0}) for source in range(len(self.nodes))]
+    
+    def node_distances(self, sources, limit=None):
+        """Dijkstra over the corridor graph from {node: distance} sources
+
+        Returns distances for every node in an array, or with a limit,
+        NodeDistances for the nodes no more than limit steps away.
+        """
+        if limit is None:
+            dist = array('i', [UNREACHABLE]) * len(self.nodes)
+        else:
+            dist = NodeDistances()
+        for node, d in sources.items():
+            dist[node] = d
+        queue = [(d, node) for node, d in sources.items()]
+        heapq.heapify(queue)
+        start, edge_node, edge_length = self.edge_start, self.edge_node, self.edge_length
+        while queue:
+            d, i = heapq.heappop(queue)
+            if d > dist[i]:
+                continue
+            for e in range(start[i], start[i + 1]):
+                j, nd = edge_node[e], d + edge_length[e]
+                if nd < dist[j] and (limit is None or nd <= limit):
+                    dist[j] = nd
+                    heapq.heappush(queue, (nd, j))
+        return dist
+    
+    def distance_field(self, target):
+        """Distances from every cell to target, shared by everyone heading there"""
+        field = self.fields.get(target)
+        if field is not None:
+            self.fields.move_to_end(target)
+            return field
+        if self.junction_distances is not None:
+            field = JunctionField(self, target)
+        else:
+            field = LocalField(self, target)
+        self.fields[target] = field
+        if len(self.fields) > FIELD_CACHE_SIZE:
+            self.fields.popitem(last=False)
+        return field
+
+class JunctionField:
+    """Distance field built from the all-pairs junction table in O(junctions)"""
+    def __init__(self, nav, target):
+        self.nav = nav
+        self.target = target
+        self.corridor = nav.corridor[target]
+        self.offset = nav.offset[target]
+        self.to_node = self.node_distances(nav, target)
+    
+    def node_distances(self, nav, target):
+        node = nav.node_index[target]
+        if node >= 0:
+            return nav.junction_distances[node]
+        if self.corridor < 0:
+            return array('i', [UNREACHABLE]) * len(nav.nodes)
+        # Leave the target's corridor through whichever end is closer
+        from_a = nav.junction_distances[nav.corridor_a[self.corridor]]
+        from_b = nav.junction_distances[nav.corridor_b[self.corridor]]
+        off_a, off_b = self.offset, nav.corridor_length[self.corridor] - self.offset
+        return [min(a + off_a, b + off_b, UNREACHABLE) for a, b in zip(from_a, from_b)]
+    
+    def distance(self, cell):
+        nav = self.nav
+        node = nav.node_index[cell]
+        if node >= 0:
+            return self.to_node[node]
+        corridor = nav.corridor[cell]
+        if corridor == -1:
+            return UNREACHABLE
+        offset = nav.offset[cell]
+        d = min(offset + self.to_node[nav.corridor_a[corridor]],
+                nav.corridor_length[corridor] - offset + self.to_node[nav.corridor_b[corridor]])
+        if corridor == self.corridor:
+            d = min(d, abs(offset - self.offset))
+        return min(d, UNREACHABLE)
+
+class LocalField(JunctionField):
+    """Distance field for mazes too big for the all-pairs table
+
+    Searches the corridor graph outwards from the target for FIELD_RADIUS
+    steps. Cells beyond that get FIELD_RADIUS plus their Manhattan
+    distance to the target, which still points ghosts the right way.
+    """
+    def node_distances(self, nav, target):
+        node = nav.node_index[target]
+        if node >= 0:
+            sources = {node: 0}
+        elif self.corridor >= 0:
+            a, b = nav.corridor_a[self.corridor], nav.corridor_b[self.corridor]
+            off_b = nav.corridor_length[self.corridor] - self.offset
+            sources = {a: self.offset}
+            sources[b] = min(off_b, sources.get(b, UNREACHABLE))
+        else:
+            sources = {}
+        return nav.node_distances(sources, FIELD_RADIUS)
+    
+    def distance(self, cell):
+        d = JunctionField.distance(self, cell)
+        if d < UNREACHABLE or not self.nav.walkable[cell]:
+            return d
+        width = self.nav.width
+        return FIELD_RADIUS + abs(cell // width - self.target // width) + abs(cell % width - self.target % width)
@@ -1,555 +1,538 @@
 #!/usr/bin/env python3
+import argparse
 import curses
-import time
 import random
-from collections import namedtuple
+import select
+import sys
+import time
 
-Point = namedtuple('Point', ['y', 'x'])
+from ansi import FrameScreen, fd_writer, terminal_glyphs
+from autopilot import Autopilot
+from events import open_sink
+from inputs import TurnBuffer
+from mapcache import load_maze
+from mazegen import LevelQueue
+from navigation import DOWN, LEFT, RIGHT, UP
+from profiler import Profiler
+from recording import NEXT_LEVEL, RESET, Recorder
+from simulation import Point, Simulation
 
-class GameObject:
-    def __init__(self, y, x, char):
-        self.y = y
-        self.x = x
-        self.char = char
-        self.dy = 0
-        self.dx = 0
+# Ticks a slow frame may catch up on before the backlog is dropped
+MAX_CATCH_UP_TICKS = 5
+# Share of each tick the autopilot may spend searching, leaving the rest for drawing
+AUTOPILOT_SHARE = 0.6
+# Longest wait for a key when nothing is due; select() sleeps through SIGWINCH, so
+# a resize is only seen (as KEY_RESIZE from getch) once the wait ends
+IDLE_WAIT = 0.25
 
-class Ghost(GameObject):
-    def __init__(self, y, x, char='n'):
-        super().__init__(y, x, char)
-        self.frightened = False
-        self.frightened_time = 0
-        
-class PacMan(GameObject):
-    def __init__(self, y, x, char='c'):
-        super().__init__(y, x, char)
-        self.next_dy = 0
-        self.next_dx = 0
+KEY_DIRECTIONS = {
+    curses.KEY_UP: UP,
+    curses.KEY_DOWN: DOWN,
+    curses.KEY_LEFT: LEFT,
+    curses.KEY_RIGHT: RIGHT,
+}
+
+def curses_glyphs():
+    """Set up the color pairs and return the (char, attr) drawn for each kind of cell"""
+    curses.start_color()
+    curses.init_pair(1, curses.COLOR_YELLOW, curses.COLOR_BLACK)  # Pacman
+    curses.init_pair(2, curses.COLOR_BLUE, curses.COLOR_BLACK)    # Walls
+    curses.init_pair(3, curses.COLOR_WHITE, curses.COLOR_BLACK)   # Pellets
+    curses.init_pair(4, curses.COLOR_RED, curses.COLOR_BLACK)     # Ghosts
+    curses.init_pair(5, curses.COLOR_CYAN, curses.COLOR_BLACK)    # Frightened ghosts
+    curses.init_pair(6, curses.COLOR_MAGENTA, curses.COLOR_BLACK) # Fruit
+    curses.init_pair(7, curses.COLOR_GREEN, curses.COLOR_BLACK)   # Power pills
+    
+    return {
+        'pacman': ('C', curses.color_pair(1) | curses.A_BOLD),
+        'wall': (curses.ACS_CKBOARD, curses.color_pair(2)),
+        'pellet': ('.', curses.color_pair(3)),
+        'ghost': ('W', curses.color_pair(4) | curses.A_BOLD),
+        'frightened': ('M', curses.color_pair(5)),
+        'fruit': ('*', curses.color_pair(6)),
+        'pill': ('O', curses.color_pair(7) | curses.A_BOLD),
+        'blank': (' ', 0),
+    }
+
+class CursesRenderer:
+    """Draws the part of the maze that fits on screen, then repaints only the cells that changed
 
-class Game:
-    def __init__(self, stdscr, map_file):
+    The view is a window onto the maze that follows pacman, so mazes of
+    any size can be played in any terminal; only visible cells are ever
+    drawn. glyphs maps each kind of cell to the (char, attr) to draw; by
+    default the curses color pairs are set up and used.
+    """
+    def __init__(self, stdscr, glyphs=None):
         self.stdscr = stdscr
-        self.load_map(map_file)
-        self.score = 0
-        self.lives = 3
-        self.game_over = False
-        self.won = False
-        self.power_mode_time = 0
-        self.pellets_remaining = 0
-        self.speed = 0.15
-        
-        # Level system
-        self.level = 1
-        self.extra_life_awarded = False
-        
-        # Fruit mechanics
-        self.fruit_spawn_time = 0
-        self.fruit_active = False
-        self.dots_eaten = 0
-        self.fruit_triggered_70 = False
-        self.fruit_triggered_170 = False
-        
-        # Initialize game objects
-        self.pacman = None
-        self.ghosts = []
-        self.fruit = None
-        self.pellets = set()
-        self.power_pills = set()
-        self.initial_pellets = set()
-        self.initial_power_pills = set()
-        self.initial_fruit = None
-        
-        # Warp tunnel positions
-        self.warp_left = None  # Position of '<'
-        self.warp_right = None  # Position of '>'
-        
-        # Store starting positions
-        self.pacman_start = None
-        self.ghost_starts = []
         
-        self.parse_map()
-        
-        # Setup colors
-        curses.start_color()
-        curses.init_pair(1, curses.COLOR_YELLOW, curses.COLOR_BLACK)  # Pacman
-        curses.init_pair(2, curses.COLOR_BLUE, curses.COLOR_BLACK)    # Walls
-        curses.init_pair(3, curses.COLOR_WHITE, curses.COLOR_BLACK)   # Pellets
-        curses.init_pair(4, curses.COLOR_RED, curses.COLOR_BLACK)     # Ghosts
-        curses.init_pair(5, curses.COLOR_CYAN, curses.COLOR_BLACK)    # Frightened ghosts
-        curses.init_pair(6, curses.COLOR_MAGENTA, curses.COLOR_BLACK) # Fruit
-        curses.init_pair(7, curses.COLOR_GREEN, curses.COLOR_BLACK)   # Power pills
-        
-    def load_map(self, map_file):
-        with open(map_file, 'r') as f:
-            lines = f.readlines()
-        self.original_map = [list(line.rstrip('\n')) for line in lines]
-        self.height = len(self.original_map)
-        self.width = max(len(row) for row in self.original_map)
-        
-        # Pad rows to equal width
-        for row in self.original_map:
-            while len(row) < self.width:
-                row.append(' ')
+        glyphs = glyphs or curses_glyphs()
+        self.pacman_glyph = glyphs['pacman']
+        self.wall_glyph = glyphs['wall']
+        self.pellet_glyph = glyphs['pellet']
+        self.ghost_glyph = glyphs['ghost']
+        self.frightened_glyph = glyphs['frightened']
+        self.fruit_glyph = glyphs['fruit']
+        self.pill_glyph = glyphs['pill']
+        self.blank_glyph = glyphs['blank']
+        
+        # Maze cell shown in the top left corner, and the screen size
+        self.top = 0
+        self.left = 0
+        self.rows, self.cols = stdscr.getmaxyx()
+        
+        # What the screen currently shows, so the next frame can be diffed
+        self.shown = {}          # Point -> glyph for cells written since the last full redraw
+        self.entity_cells = []   # Cells occupied by pacman and ghosts last frame
+        self.hud = None
+        self.hud_x = 0
+        # Text for the bottom line, such as the profiler's, and what it last drew there
+        self.status = None
+        self.status_shown = None
+        # Set when the maze was drawn over the status line, which then needs drawing again
+        self.status_stale = False
+        self.message = None
+        self.pellets_remaining = None
+        self.full_redraw = True
+        
+        # Cells written in the last frame, and in total
+        self.cells_written = 0
+        self.total_cells_written = 0
+        self.frames = 0
     
-    def parse_map(self):
-        for y, row in enumerate(self.original_map):
-            for x, char in enumerate(row):
-                if char == 'c':
-                    self.pacman_start = Point(y, x)
-                    self.pacman = PacMan(y, x)
-                    self.original_map[y][x] = ' '
-                elif char == 'n':
-                    self.ghost_starts.append(Point(y, x))
-                    self.ghosts.append(Ghost(y, x))
-                    self.original_map[y][x] = ' '
-                elif char == '@':
-                    self.fruit = Point(y, x)
-                    self.initial_fruit = Point(y, x)
-                    self.original_map[y][x] = ' '  # Remove @ from map so it's not counted elsewhere
-                elif char == '<':
-                    self.warp_left = Point(y, x)
-                    self.original_map[y][x] = ' '
-                elif char == '>':
-                    self.warp_right = Point(y, x)
-                    self.original_map[y][x] = ' '
-                elif char == '.':
-                    self.pellets.add(Point(y, x))
-                    self.initial_pellets.add(Point(y, x))
-                elif char == 'o':
-                    self.power_pills.add(Point(y, x))
-                    self.initial_power_pills.add(Point(y, x))
-        
-        self.pellets_remaining = len(self.pellets) + len(self.power_pills)
+    def invalidate(self):
+        """Force a full repaint on the next frame"""
+        self.full_redraw = True
     
-    def draw(self):
-        self.stdscr.erase()
-        
-        # Draw map
-        for y, row in enumerate(self.original_map):
-            for x, char in enumerate(row):
-                if char == '#':
-                    # Use line drawing characters
-                    self.stdscr.addch(y, x, curses.ACS_CKBOARD, curses.color_pair(2))
-                elif char == ' ':
-                    self.stdscr.addch(y, x, ' ')
-        
-        # Draw fruit
-        if self.fruit and self.fruit_active:
-            self.stdscr.addch(self.fruit.y, self.fruit.x, '*', curses.color_pair(6))
-        
-        # Draw pellets
-        for pellet in self.pellets:
-            self.stdscr.addch(pellet.y, pellet.x, '.', curses.color_pair(3))
-        
-        # Draw power pills
-        for pill in self.power_pills:
-            self.stdscr.addch(pill.y, pill.x, 'O', curses.color_pair(7) | curses.A_BOLD)
-        
-        # Draw ghosts
-        for ghost in self.ghosts:
-            if ghost.frightened:
-                self.stdscr.addch(ghost.y, ghost.x, 'M', curses.color_pair(5))
-            else:
-                self.stdscr.addch(ghost.y, ghost.x, 'W', curses.color_pair(4) | curses.A_BOLD)
-        
-        # Draw pacman
-        if self.pacman:
-            self.stdscr.addch(self.pacman.y, self.pacman.x, 'C', curses.color_pair(1) | curses.A_BOLD)
-        
-        # Draw score and lives at top
-        score_str = f"Score: {self.score} - Level: {self.level} - Lives: {self.lives}"
-        self.stdscr.addstr(0, (self.width - len(score_str)) // 2, score_str, curses.A_BOLD)
-        
-        if self.game_over:
-            msg = "GAME OVER - Hit R to restart, Q to quit"
-            self.stdscr.addstr(self.height // 2, (self.width - len(msg)) // 2, msg, curses.A_BOLD)
-
-        if self.won:
-            msg = "LEVEL UP - Hit SPACE to continue, Q to quit"
-            self.stdscr.addstr(self.height // 2, (self.width - len(msg)) // 2, msg, curses.A_BOLD)
-        
-        self.stdscr.refresh()
+    def resize(self):
+        """Pick up a new terminal size, e.g. after KEY_RESIZE"""
+        self.rows, self.cols = self.stdscr.getmaxyx()
+        self.invalidate()
+    
+    def visible(self, pos):
+        return self.top <= pos.y < self.top + self.rows and self.left <= pos.x < self.left + self.cols
     
-    def is_wall(self, y, x):
-        if 0 <= y < self.height and 0 <= x < self.width:
-            return self.original_map[y][x] == '#'
+    def follow(self, game):
+        """Scroll the view once pacman gets near its edge; returns True if it moved"""
+        if not game.pacman:
+            return False
+        top = scroll(self.top, game.pacman.y, self.rows, game.height)
+        left = scroll(self.left, game.pacman.x, self.cols, game.width)
+        if (top, left) == (self.top, self.left):
+            return False
+        self.top, self.left = top, left
         return True
     
-    def is_valid_move(self, y, x):
-        if 0 <= y < self.height and 0 <= x < self.width:
-            return self.original_map[y][x] != '#'
-        return False
+    def entity_glyphs(self, game):
+        """Glyphs of pacman and the ghosts in view, keyed by position"""
+        top, left = self.top, self.left
+        bottom, right = top + self.rows, left + self.cols
+        entities = {}
+        for ghost in game.ghosts:
+            if top <= ghost.y < bottom and left <= ghost.x < right:
+                entities[Point(ghost.y, ghost.x)] = self.frightened_glyph if ghost.frightened else self.ghost_glyph
+        pacman = game.pacman
+        if pacman and top <= pacman.y < bottom and left <= pacman.x < right:
+            entities[Point(pacman.y, pacman.x)] = self.pacman_glyph
+        return entities
     
-    def move_pacman(self):
-        if not self.pacman:
-            return
-        
-        # Try to change direction if new direction pressed
-        if self.pacman.next_dy != 0 or self.pacman.next_dx != 0:
-            new_y = self.pacman.y + self.pacman.next_dy
-            new_x = self.pacman.x + self.pacman.next_dx
-            
-            if self.is_valid_move(new_y, new_x):
-                self.pacman.dy = self.pacman.next_dy
-                self.pacman.dx = self.pacman.next_dx
-                self.pacman.next_dy = 0
-                self.pacman.next_dx = 0
-        
-        # Continue in current direction
-        if self.pacman.dy != 0 or self.pacman.dx != 0:
-            new_y = self.pacman.y + self.pacman.dy
-            new_x = self.pacman.x + self.pacman.dx
-            
-            # Check if we're at a warp tunnel entrance
-            current_pos = Point(self.pacman.y, self.pacman.x)
-            if self.warp_left and self.warp_right:
-                if current_pos == self.warp_left and self.pacman.dx < 0:
-                    # Warp from left to right
-                    self.pacman.y = self.warp_right.y
-                    self.pacman.x = self.warp_right.x
-                    return
-                elif current_pos == self.warp_right and self.pacman.dx > 0:
-                    # Warp from right to left
-                    self.pacman.y = self.warp_left.y
-                    self.pacman.x = self.warp_left.x
-                    return
-            
-            # Normal movement
-            if self.is_valid_move(new_y, new_x):
-                self.pacman.y = new_y
-                self.pacman.x = new_x
-            else:
-                # Hit a wall, stop
-                self.pacman.dy = 0
-                self.pacman.dx = 0
-        
-        # Check for pellet collection
-        pos = Point(self.pacman.y, self.pacman.x)
-        if pos in self.pellets:
-            self.pellets.remove(pos)
-            self.score += 10
-            self.pellets_remaining -= 1
-            self.dots_eaten += 1
-            self.check_extra_life()
-            
-            # Check for fruit spawn triggers
-            if self.dots_eaten == 70 and not self.fruit_triggered_70:
-                self.spawn_fruit()
-                self.fruit_triggered_70 = True
-            elif self.dots_eaten == 170 and not self.fruit_triggered_170:
-                self.spawn_fruit()
-                self.fruit_triggered_170 = True
-        
-        # Check for power pill
-        if pos in self.power_pills:
-            self.power_pills.remove(pos)
-            self.score += 50
-            self.pellets_remaining -= 1
-            self.dots_eaten += 1
-            self.check_extra_life()
-            
-            # Check for fruit spawn triggers
-            if self.dots_eaten == 70 and not self.fruit_triggered_70:
-                self.spawn_fruit()
-                self.fruit_triggered_70 = True
-            elif self.dots_eaten == 170 and not self.fruit_triggered_170:
-                self.spawn_fruit()
-                self.fruit_triggered_170 = True
-            
-            self.power_mode_time = time.time()
-            for ghost in self.ghosts:
-                ghost.frightened = True
-        
-        # Check for fruit
-        if self.fruit and self.fruit_active and pos.y == self.fruit.y and pos.x == self.fruit.x:
-            self.score += 100
-            self.fruit_active = False
-            self.check_extra_life()
-        
-        # Check win condition
-        if self.pellets_remaining == 0:
-            self.won = True
+    def base_glyph(self, game, pos):
+        """Glyph of a cell ignoring pacman and the ghosts"""
+        cell = pos.y * game.width + pos.x
+        if game.power_pills.test(cell):
+            return self.pill_glyph
+        if game.pellets.test(cell):
+            return self.pellet_glyph
+        if game.fruit and game.fruit_active and pos == game.fruit:
+            return self.fruit_glyph
+        if game.is_wall(pos.y, pos.x):
+            return self.wall_glyph
+        return self.blank_glyph
     
-    def check_extra_life(self):
-        """Award extra life at 10,000 points"""
-        if not self.extra_life_awarded and self.score >= 10000:
-            self.lives += 1
-            self.extra_life_awarded = True
+    def put(self, pos, glyph):
+        try:
+            self.stdscr.addch(pos.y - self.top, pos.x - self.left, glyph[0], glyph[1])
+        except curses.error:
+            # Writing the bottom right corner fails once the cursor cannot advance
+            pass
+        self.shown[pos] = glyph
+        self.cells_written += 1
     
-    def next_level(self):
-        """Advance to the next level"""
-        self.level += 1
-        self.won = False
-        self.power_mode_time = 0
-        
-        # Reset fruit mechanics for new level
-        self.fruit_spawn_time = 0
-        self.fruit_active = False
-        self.dots_eaten = 0
-        self.fruit_triggered_70 = False
-        self.fruit_triggered_170 = False
-        
-        # Reset pellets and power pills to initial state
-        self.pellets = self.initial_pellets.copy()
-        self.power_pills = self.initial_power_pills.copy()
-        self.pellets_remaining = len(self.pellets) + len(self.power_pills)
-        
-        # Reset fruit to initial position (but not active)
-        if hasattr(self, 'initial_fruit') and self.initial_fruit:
-            self.fruit = self.initial_fruit
+    def draw(self, game):
+        self.cells_written = 0
+        
+        message = None
+        if game.game_over:
+            message = "GAME OVER - Hit R to restart, Q to quit"
+        elif game.won:
+            message = "LEVEL UP - Hit SPACE to continue, Q to quit"
+        
+        # Pellets only come back on a level change or restart, which repaints everything
+        if (self.follow(game) or self.full_redraw or message != self.message or
+                game.pellets_remaining > self.pellets_remaining):
+            self.draw_full(game, message)
+        else:
+            self.draw_changes(game)
         
-        # Reset positions
-        self.reset_positions()
+        self.message = message
+        self.pellets_remaining = game.pellets_remaining
+        self.frames += 1
+        self.total_cells_written += self.cells_written
         
-        # Increase difficulty slightly (make ghosts a bit faster)
-        self.speed = max(0.08, self.speed - 0.01)
-    
-    def spawn_fruit(self):
-        """Spawn the fruit and start the 10-second timer"""
-        if self.initial_fruit:
-            self.fruit_active = True
-            self.fruit_spawn_time = time.time()
-    
-    def update_fruit(self):
-        """Check if fruit timer has expired"""
-        if self.fruit_active and time.time() - self.fruit_spawn_time > 10:
-            self.fruit_active = False
+        if self.cells_written:
+            self.stdscr.refresh()
     
-    def get_valid_directions(self, y, x):
-        directions = []
-        for dy, dx in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            new_y, new_x = y + dy, x + dx
-            if self.is_valid_move(new_y, new_x):
-                directions.append((dy, dx))
-        return directions
+    def draw_full(self, game, message):
+        self.stdscr.erase()
+        self.shown = {}
+        # Note pellets eaten from now on, for draw_changes
+        game.eaten = []
+        
+        # Draw the visible part of the map, walls, fruit, pellets and power pills
+        bottom = min(game.height, self.top + self.rows)
+        right = min(game.width, self.left + self.cols)
+        for y in range(self.top, bottom):
+            for x in range(self.left, right):
+                pos = Point(y, x)
+                glyph = self.base_glyph(game, pos)
+                if glyph is not self.blank_glyph:
+                    self.put(pos, glyph)
+        
+        # Draw ghosts and pacman
+        entities = self.entity_glyphs(game)
+        for pos, glyph in entities.items():
+            self.put(pos, glyph)
+        self.entity_cells = list(entities)
+        
+        self.hud = None
+        self.draw_hud(game, entities)
+        self.status_shown = None
+        self.draw_status(game, entities)
+        
+        if message:
+            width = min(game.width, self.cols)
+            message = message[:width]
+            self.stdscr.addstr(min(game.height, self.rows) // 2, (width - len(message)) // 2, message, curses.A_BOLD)
+            self.cells_written += len(message)
+        
+        self.full_redraw = False
     
-    def is_junction(self, y, x):
-        return len(self.get_valid_directions(y, x)) > 2
+    def draw_changes(self, game):
+        entities = self.entity_glyphs(game)
+        
+        # Only cells an entity left or entered, or a pellet was eaten from,
+        # can have changed; the fruit cell is checked every frame
+        dirty = set(self.entity_cells)
+        dirty.update(entities)
+        if game.fruit and self.visible(game.fruit):
+            dirty.add(game.fruit)
+        # Pellets eaten since the last frame, which pacman may since have left
+        # (a life lost on the same tick sends it back to the start)
+        eaten = game.eaten
+        if eaten:
+            for cell in eaten:
+                pos = Point(*divmod(cell, game.width))
+                if self.visible(pos):
+                    dirty.add(pos)
+            eaten.clear()
+        
+        touched_hud = touched_status = False
+        status_y = self.top + self.status_row(game)
+        for pos in dirty:
+            glyph = entities.get(pos) or self.base_glyph(game, pos)
+            if self.shown.get(pos) != glyph:
+                self.put(pos, glyph)
+                if pos.y == self.top:
+                    touched_hud = True
+                elif pos.y == status_y:
+                    touched_status = True
+        self.entity_cells = list(entities)
+        
+        if touched_hud:
+            self.hud = None
+        self.draw_hud(game, entities)
+        if touched_status:
+            # Keep status_shown, whose length says how much to blank if the line is cleared
+            self.status_stale = True
+        self.draw_status(game, entities)
     
-    def move_ghosts(self):
-        current_time = time.time()
-        
-        # Check if power mode expired
-        if self.power_mode_time > 0 and current_time - self.power_mode_time > 6:
-            self.power_mode_time = 0
-            for ghost in self.ghosts:
-                ghost.frightened = False
-        
-        # Update fruit timer
-        self.update_fruit()
+    def draw_hud(self, game, entities):
+        """Draw score and lives at top"""
+        width = min(game.width, self.cols)
+        score_str = f"Score: {game.score} - Level: {game.level} - Lives: {game.lives}"[:width]
+        if score_str == self.hud:
+            return
         
-        for ghost in self.ghosts:
-            # Store old position for crossing detection
-            old_ghost_y = ghost.y
-            old_ghost_x = ghost.x
-            
-            # Initialize ghost movement if not moving
-            if ghost.dy == 0 and ghost.dx == 0:
-                directions = self.get_valid_directions(ghost.y, ghost.x)
-                if directions:
-                    ghost.dy, ghost.dx = random.choice(directions)
-            
-            # Random chance to change direction at junction
-            if self.is_junction(ghost.y, ghost.x) and random.random() < 0.3:
-                directions = self.get_valid_directions(ghost.y, ghost.x)
-                # Remove opposite direction
-                if directions:
-                    opposite = (-ghost.dy, -ghost.dx)
-                    directions = [d for d in directions if d != opposite]
-                    if directions:
-                        ghost.dy, ghost.dx = random.choice(directions)
-            
-            # Try to move
-            new_y = ghost.y + ghost.dy
-            new_x = ghost.x + ghost.dx
-            
-            # Check if we're at a warp tunnel entrance
-            current_pos = Point(ghost.y, ghost.x)
-            if self.warp_left and self.warp_right:
-                if current_pos == self.warp_left and ghost.dx < 0:
-                    # Warp from left to right
-                    ghost.y = self.warp_right.y
-                    ghost.x = self.warp_right.x
-                    # Check collision after warp
-                    if self.check_ghost_collision_with_crossing(ghost, old_ghost_y, old_ghost_x):
-                        self.handle_collision(ghost)
-                        if self.game_over:
-                            return
-                    continue
-                elif current_pos == self.warp_right and ghost.dx > 0:
-                    # Warp from right to left
-                    ghost.y = self.warp_left.y
-                    ghost.x = self.warp_left.x
-                    # Check collision after warp
-                    if self.check_ghost_collision_with_crossing(ghost, old_ghost_y, old_ghost_x):
-                        self.handle_collision(ghost)
-                        if self.game_over:
-                            return
-                    continue
-            
-            # Normal movement
-            if self.is_valid_move(new_y, new_x):
-                ghost.y = new_y
-                ghost.x = new_x
-                
-                # Check for collision after each ghost moves (including crossing detection)
-                if self.check_ghost_collision_with_crossing(ghost, old_ghost_y, old_ghost_x):
-                    self.handle_collision(ghost)
-                    if self.game_over:
-                        return
-            else:
-                # Hit a wall, choose new random direction
-                directions = self.get_valid_directions(ghost.y, ghost.x)
-                if directions:
-                    ghost.dy, ghost.dx = random.choice(directions)
+        # Restore whatever the previous, possibly longer, line covered
+        if self.hud:
+            for x in range(self.hud_x, self.hud_x + len(self.hud)):
+                pos = Point(self.top, self.left + x)
+                self.put(pos, entities.get(pos) or self.base_glyph(game, pos))
+        
+        self.hud_x = (width - len(score_str)) // 2
+        try:
+            self.stdscr.addstr(0, self.hud_x, score_str, curses.A_BOLD)
+        except curses.error:
+            pass
+        for x in range(self.hud_x, self.hud_x + len(score_str)):
+            self.shown.pop(Point(self.top, self.left + x), None)
+        self.cells_written += len(score_str)
+        self.hud = score_str
+    
+    def status_row(self, game):
+        """Screen row of the status line: below the maze if it fits, else the last one"""
+        return min(game.height, self.rows - 1)
     
-    def check_collisions(self):
-        if not self.pacman:
+    def draw_status(self, game, entities):
+        """Draw self.status along the bottom, over the maze if there is no room below it"""
+        text = (self.status or '')[:max(0, self.cols - 1)]
+        if text == (self.status_shown or '') and not self.status_stale:
             return
         
-        for ghost in self.ghosts[:]:
-            # Check if they occupy the same position
-            if ghost.y == self.pacman.y and ghost.x == self.pacman.x:
-                self.handle_collision(ghost)
-                return
+        row = self.status_row(game)
+        if self.status_shown:
+            try:
+                self.stdscr.addstr(row, 0, ' ' * len(self.status_shown))
+            except curses.error:
+                pass
+            self.cells_written += len(self.status_shown)
+            # Put back the maze cells the old line covered
+            if self.top + row < game.height:
+                for x in range(self.left, min(game.width, self.left + len(self.status_shown))):
+                    pos = Point(self.top + row, x)
+                    self.put(pos, entities.get(pos) or self.base_glyph(game, pos))
+        
+        if text:
+            try:
+                self.stdscr.addstr(row, 0, text, curses.A_REVERSE)
+            except curses.error:
+                pass
+            for x in range(len(text)):
+                self.shown.pop(Point(self.top + row, self.left + x), None)
+            self.cells_written += len(text)
+        self.status_shown = text
+        self.status_stale = False
+
+def scroll(start, pos, size, total):
+    """Start of a view of size cells over total that keeps pos clear of the edges
+
+    The view stays put while pos is more than a quarter of it from either
+    edge, and recentres on pos otherwise.
+    """
+    if total <= size:
+        return 0
+    margin = size // 4
+    if not start + margin <= pos < start + size - margin:
+        start = pos - size // 2
+    return max(0, min(start, total - size))
+
+class Game(Simulation):
+    """Curses front end: keyboard input, the real-time loop and drawing"""
+    def __init__(self, stdscr, map_file, renderer=None, clock=None, rng=None, recorder=None, autopilot=None,
+                 profiler=None, levels=None, events=None):
+        super().__init__(map_file, clock=clock, rng=rng, levels=levels, events=events)
+        self.stdscr = stdscr
+        self.renderer = renderer or CursesRenderer(stdscr)
+        self.recorder = recorder
+        self.autopilot = autopilot
+        self.turns = TurnBuffer()
+        self.profiler = None
+        if profiler:
+            self.profile(profiler)
     
-    def check_ghost_collision_with_crossing(self, ghost, old_ghost_y, old_ghost_x):
-        """Check if pacman and ghost crossed paths (edge case detection)"""
-        if not self.pacman:
-            return False
-        
-        # Check if they're now at the same position
-        if ghost.y == self.pacman.y and ghost.x == self.pacman.x:
-            return True
-        
-        # Check if they crossed paths (swapped positions)
-        # This happens when they move towards each other and pass through
-        pacman_old_y = self.pacman.y - self.pacman.dy
-        pacman_old_x = self.pacman.x - self.pacman.dx
-        
-        # Did pacman move from where ghost is now, and ghost move from where pacman is now?
-        if (pacman_old_y == ghost.y and pacman_old_x == ghost.x and
-            old_ghost_y == self.pacman.y and old_ghost_x == self.pacman.x):
-            return True
-        
-        return False
+    def profile(self, profiler):
+        """Start timing the game's phases with a Profiler"""
+        profiler.attach(self)
+        self.profiler = profiler
     
-    def handle_collision(self, ghost):
-        """Handle collision between pacman and a ghost"""
-        if ghost.frightened:
-            # Eat ghost
-            self.score += 200
-            # Respawn ghost at its starting position
-            ghost_index = self.ghosts.index(ghost)
-            if ghost_index < len(self.ghost_starts):
-                ghost.y = self.ghost_starts[ghost_index].y
-                ghost.x = self.ghost_starts[ghost_index].x
-            ghost.frightened = False
-            ghost.dy = 0
-            ghost.dx = 0
-        else:
-            # Lose a life
-            self.lives -= 1
-            if self.lives <= 0:
-                self.game_over = True
-            else:
-                # Reset positions
-                self.reset_positions()
+    def toggle_profiler_hud(self):
+        """Show or hide the timings line, profiling from now on if not already"""
+        if not self.profiler:
+            self.profile(Profiler())
+        self.profiler.hud_visible = not self.profiler.hud_visible
+        if not self.profiler.hud_visible:
+            self.renderer.status = None
     
-    def reset_positions(self):
-        # Reset pacman to starting position
-        if self.pacman_start:
-            self.pacman.y = self.pacman_start.y
-            self.pacman.x = self.pacman_start.x
-        
-        self.pacman.dy = 0
-        self.pacman.dx = 0
-        self.pacman.next_dy = 0
-        self.pacman.next_dx = 0
-        
-        # Reset ghosts to their starting positions
-        for i, ghost in enumerate(self.ghosts):
-            if i < len(self.ghost_starts):
-                ghost.y = self.ghost_starts[i].y
-                ghost.x = self.ghost_starts[i].x
-            ghost.dy = 0
-            ghost.dx = 0
-            ghost.frightened = False
-        
-        self.power_mode_time = 0
+    def handle_key(self, key, seen=None):
+        """Apply a key press seen at seen (time.monotonic); returns True if the game state changed"""
+        if key == ord('r') or key == ord('R'):
+            if self.game_over or self.won:
+                self.reset_game()
+                self.turns.clear()
+                if self.recorder:
+                    self.recorder.event(RESET)
+                return True
+        elif key == ord(' '):
+            if self.won:
+                self.next_level()
+                self.turns.clear()
+                if self.recorder:
+                    self.recorder.event(NEXT_LEVEL)
+                return True
+        elif not self.game_over and not self.won:
+            direction = KEY_DIRECTIONS.get(key)
+            if direction:
+                # Handed to the rules on the tick pacman can take it
+                exits = self.nav.exits[self.pacman.y * self.width + self.pacman.x] if self.pacman else 0
+                self.turns.press(direction, time.monotonic() if seen is None else seen, self.ticks, exits)
+        return False
     
-    def reset_game(self):
-        # Reset game state
-        self.score = 0
-        self.lives = 3
-        self.game_over = False
-        self.won = False
-        self.power_mode_time = 0
-        
-        # Reset pellets and power pills to initial state
-        self.pellets = self.initial_pellets.copy()
-        self.power_pills = self.initial_power_pills.copy()
-        self.pellets_remaining = len(self.pellets) + len(self.power_pills)
-        
-        # Reset fruit to initial position
-        # Find it from the stored initial position
-        if hasattr(self, 'initial_fruit') and self.initial_fruit:
-            self.fruit = self.initial_fruit
-        
-        # Reset positions
-        self.reset_positions()
+    def wait_for_input(self, timeout):
+        """Block until stdin is readable or timeout seconds pass (None waits forever)"""
+        try:
+            select.select([sys.stdin], [], [], timeout)
+        except (OSError, ValueError):
+            # No select() on console handles (e.g. Windows), fall back to a short nap
+            time.sleep(0.01 if timeout is None else min(timeout, 0.01))
     
-    def run(self):
+    def run(self, fps=60):
         self.stdscr.nodelay(1)
         self.stdscr.keypad(1)
         curses.curs_set(0)
         
-        last_move_time = time.time()
+        frame_interval = 1.0 / fps
+        accumulator = 0.0
+        last_time = time.monotonic()
+        last_frame = 0.0
+        dirty = True
         
         while True:
-            current_time = time.time()
+            playing = not self.game_over and not self.won
             
-            # Handle input
+            # Sleep until the next tick or frame is due, or a key arrives
+            now = time.monotonic()
+            deadline = None
+            if playing:
+                deadline = last_time + self.speed - accumulator
+            if dirty:
+                frame_due = last_frame + frame_interval
+                deadline = frame_due if deadline is None else min(deadline, frame_due)
+            if deadline is None:
+                self.wait_for_input(IDLE_WAIT)
+            elif deadline > now:
+                self.wait_for_input(deadline - now)
+            
+            # Handle every key waiting, all seen now
+            seen = time.monotonic()
             key = self.stdscr.getch()
-            if key == ord('q') or key == ord('Q'):
-                break
-            elif key == ord('r') or key == ord('R'):
-                if self.game_over or self.won:
-                    self.reset_game()
-                    last_move_time = time.time()
-            elif key == ord(' '):
-                if self.won:
-                    self.next_level()
-                    last_move_time = time.time()
-            elif not self.game_over and not self.won:
-                if key == curses.KEY_UP:
-                    self.pacman.next_dy = -1
-                    self.pacman.next_dx = 0
-                elif key == curses.KEY_DOWN:
-                    self.pacman.next_dy = 1
-                    self.pacman.next_dx = 0
-                elif key == curses.KEY_LEFT:
-                    self.pacman.next_dy = 0
-                    self.pacman.next_dx = -1
-                elif key == curses.KEY_RIGHT:
-                    self.pacman.next_dy = 0
-                    self.pacman.next_dx = 1
+            while key != -1:
+                if key == ord('q') or key == ord('Q'):
+                    return
+                if key == curses.KEY_RESIZE:
+                    self.renderer.resize()
+                    dirty = True
+                elif key == ord('p') or key == ord('P'):
+                    self.toggle_profiler_hud()
+                    dirty = True
+                if self.handle_key(key, seen):
+                    # New level or restart: start the tick clock afresh
+                    accumulator = 0.0
+                    last_time = time.monotonic()
+                    dirty = True
+                key = self.stdscr.getch()
             
-            # Update game state
+            # Update game state in fixed steps of self.speed seconds. One frame can
+            # follow several ticks (catching up, or --fps below the tick rate): the
+            # renderer repaints every cell eaten from since it last drew, not only
+            # where pacman is and was
+            now = time.monotonic()
             if not self.game_over and not self.won:
-                if current_time - last_move_time >= self.speed:
-                    self.move_pacman()
-                    self.move_ghosts()
-                    # Final collision check after all movements
-                    self.check_collisions()
-                    last_move_time = current_time
+                accumulator += now - last_time
+                steps = 0
+                while accumulator >= self.speed and not self.game_over and not self.won:
+                    # The rules run on game time, one tick of self.speed seconds per step
+                    if self.profiler and accumulator >= 2 * self.speed:
+                        # Running after the next tick was already due
+                        self.profiler.tick_late(accumulator - self.speed)
+                    direction = None
+                    if self.autopilot:
+                        direction = self.autopilot.choose(self, self.speed * AUTOPILOT_SHARE)
+                    if self.turns:
+                        # A key the player pressed outranks the autopilot
+                        direction = self.turns.take(self) or direction
+                    if direction:
+                        self.pacman.next_dy, self.pacman.next_dx = direction
+                        if self.recorder:
+                            self.recorder.steer(direction)
+                    if self.recorder:
+                        self.recorder.tick()
+                    self.step()
+                    accumulator -= self.speed
+                    steps += 1
+                    dirty = True
+                    if steps == MAX_CATCH_UP_TICKS:
+                        # Too far behind (e.g. suspended): drop the backlog instead of spiralling
+                        if self.profiler:
+                            self.profiler.ticks_dropped(int(accumulator // self.speed))
+                        accumulator = 0.0
+                        break
+                if self.game_over or self.won:
+                    accumulator = 0.0
+            last_time = now
             
-            self.draw()
-            time.sleep(0.01)
+            if self.profiler and self.profiler.hud_visible:
+                line = self.profiler.hud()
+                if line != self.renderer.status:
+                    self.renderer.status = line
+                    dirty = True
+            if dirty and now - last_frame >= frame_interval:
+                self.draw()
+                last_frame = now
+                dirty = False
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Terminal Pac-Man')
+    parser.add_argument('map_file', nargs='?', default='pacman-map.txt',
+                        help='maze file to load (default: pacman-map.txt)')
+    parser.add_argument('--fps', type=float, default=60,
+                        help='maximum frames drawn per second (default: 60)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the ghosts (default: a random one)')
+    parser.add_argument('--record', metavar='FILE',
+                        help='record the game to FILE for replay.py')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='time each phase of the game loop and write the timings to FILE on exit')
+    parser.add_argument('--autopilot', action='store_true',
+                        help='let a search autopilot steer pacman (arrow keys still work)')
+    parser.add_argument('--autopilot-workers', type=int, default=1, metavar='N',
+                        help='processes the autopilot searches in (default: 1)')
+    parser.add_argument('--events', metavar='FILE',
+                        help='log gameplay events to FILE for analytics.py (binary if it ends in .evt)')
+    parser.add_argument('--backend', choices=('curses', 'ansi'), default='curses',
+                        help='draw through curses, or as one diffed ANSI write per frame (default: curses)')
+    parser.add_argument('--endless', action='store_true',
+                        help='play a freshly generated maze, the size of the map, on every level after the first')
+    return parser.parse_args()
 
-def main(stdscr):
-    game = Game(stdscr, 'pacman-map.txt')
-    game.run()
+def main(stdscr, args):
+    seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+    levels = None
+    if args.endless:
+        maze = load_maze(args.map_file)
+        # The map's first line is the score line, which generate() adds itself
+        levels = LevelQueue(maze.width, maze.height - 1, seed)
+    recorder = Recorder(args.record, args.map_file, seed, levels=levels) if args.record else None
+    autopilot = Autopilot(workers=args.autopilot_workers, map_file=args.map_file) if args.autopilot else None
+    profiler = Profiler() if args.profile else None
+    events = open_sink(args.events) if args.events else None
+    renderer = None
+    if args.backend == 'ansi':
+        # curses still reads the keys and tracks the terminal's size
+        renderer = CursesRenderer(FrameScreen(stdscr, fd_writer(sys.stdout.fileno())), terminal_glyphs())
+    try:
+        game = Game(stdscr, args.map_file, renderer=renderer, rng=random.Random(seed), recorder=recorder,
+                    autopilot=autopilot, profiler=profiler, levels=levels, events=events)
+        game.run(fps=args.fps)
+    finally:
+        if profiler:
+            profiler.export(args.profile)
+        if recorder:
+            recorder.close()
+        if autopilot:
+            autopilot.close()
+        if levels:
+            levels.close()
+        if events:
+            events.close()
 
 if __name__ == '__main__':
-    curses.wrapper(main)
+    curses.wrapper(main, parse_args())
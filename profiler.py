@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""Phase timings for the live game, for finding out why it stutters
+
+A Profiler attached to a Game times every call of move_pacman,
+move_ghosts, check_collisions and draw, and every getch and refresh on
+the screen, and notes ticks that ran late. Attaching wraps those methods
+on the one Game instance; nothing is wrapped until then, so the game
+pays nothing for profiling it does not use. It also shows how long
+turns waited between key and tick, from the game's TurnBuffer.
+
+Each phase keeps its last WINDOW timings, for the p50/p99 shown on the
+in-game line (toggled with P), and a log-scale histogram of every
+timing, for the report written on exit with pacman.py --profile FILE:
+
+    python3 pacman.py --profile profile.json
+    python3 profiler.py profile.json
+"""
+import argparse
+import json
+import math
+import time
+from array import array
+
+PHASES = ('getch', 'move_pacman', 'move_ghosts', 'check_collisions', 'draw', 'refresh')
+# Short names for the in-game line
+LABELS = {'getch': 'key', 'move_pacman': 'pac', 'move_ghosts': 'gho',
+          'check_collisions': 'col', 'draw': 'drw', 'refresh': 'ref'}
+
+# Timings kept per phase for the rolling percentiles
+WINDOW = 512
+# Histogram buckets per doubling of duration, from 1us up
+BUCKETS_PER_OCTAVE = 4
+BUCKETS = 32 * BUCKETS_PER_OCTAVE
+# Seconds between updates of the in-game line
+HUD_INTERVAL = 0.5
+
+def bucket(seconds):
+    """Histogram bucket of a duration"""
+    if seconds < 1e-6:
+        return 0
+    return min(BUCKETS - 1, int(math.log2(seconds * 1e6) * BUCKETS_PER_OCTAVE) + 1)
+
+def bucket_limit(index):
+    """Seconds at the top of a histogram bucket"""
+    return 2 ** (index / BUCKETS_PER_OCTAVE) * 1e-6
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class PhaseStats:
+    """Timings of one phase: the last WINDOW in a ring, and a histogram of all"""
+    def __init__(self):
+        self.window = array('d', bytes(8 * WINDOW))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * BUCKETS
+    
+    def add(self, seconds):
+        self.window[self.count % WINDOW] = seconds
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram[bucket(seconds)] += 1
+    
+    def recent(self):
+        """The timings in the window, sorted"""
+        return sorted(self.window[:min(self.count, WINDOW)])
+    
+    def histogram_percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of all timings"""
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(bucket_limit(index), self.max)
+        return 0.0
+    
+    def report(self):
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count * 1e6 if self.count else 0.0,
+            'p50_us': self.histogram_percentile(0.5) * 1e6,
+            'p99_us': self.histogram_percentile(0.99) * 1e6,
+            'max_us': self.max * 1e6,
+            # (upper bound in us, timings) for every bucket in use
+            'histogram': [(round(bucket_limit(i) * 1e6, 2), n) for i, n in enumerate(self.histogram) if n],
+        }
+
+class TimedScreen:
+    """Stands in for a curses window, timing getch and refresh
+
+    Every other attribute is looked up on the real window once and then
+    cached, so drawing through it costs the same as drawing directly.
+    """
+    def __init__(self, screen, profiler):
+        self.screen = screen
+        self.getch_stats = profiler.phases['getch']
+        self.refresh_stats = profiler.phases['refresh']
+        self.profiler = profiler
+    
+    def __getattr__(self, name):
+        value = getattr(self.screen, name)
+        setattr(self, name, value)
+        return value
+    
+    def getch(self):
+        start = time.perf_counter()
+        key = self.screen.getch()
+        self.getch_stats.add(time.perf_counter() - start)
+        return key
+    
+    def refresh(self):
+        start = time.perf_counter()
+        self.screen.refresh()
+        elapsed = time.perf_counter() - start
+        self.refresh_stats.add(elapsed)
+        self.profiler.nested += elapsed
+
+class Profiler:
+    """Per-phase timings, tick and frame rates and late ticks of a running Game"""
+    def __init__(self):
+        self.phases = {name: PhaseStats() for name in PHASES}
+        self.start = time.perf_counter()
+        self.late_ticks = 0
+        self.dropped_ticks = 0
+        self.worst_lateness = 0.0
+        # Time spent in timed calls made from inside another timed call
+        self.nested = 0.0
+        self.hud_visible = False
+        self.hud_time = self.start
+        self.hud_ticks = 0
+        self.hud_frames = 0
+        self.hud_line = ''
+        # The game's InputLatency, if it buffers turns
+        self.input_latency = None
+        # The renderer's screen, if it counts the bytes it sends
+        self.output = None
+    
+    @property
+    def ticks(self):
+        return self.phases['move_pacman'].count
+    
+    @property
+    def frames(self):
+        return self.phases['draw'].count
+    
+    def attach(self, game):
+        """Start timing a Game's phases and its screen"""
+        for name in ('move_pacman', 'move_ghosts', 'check_collisions', 'draw'):
+            setattr(game, name, self.timed(name, getattr(game, name)))
+        self.input_latency = getattr(getattr(game, 'turns', None), 'latency', None)
+        screen = TimedScreen(game.stdscr, self)
+        game.stdscr = screen
+        renderer_screen = getattr(game.renderer, 'stdscr', None)
+        if renderer_screen is screen.screen:
+            game.renderer.stdscr = screen
+        elif renderer_screen is not None:
+            # Drawing on a screen of its own, such as a FrameScreen
+            game.renderer.stdscr = TimedScreen(renderer_screen, self)
+            if hasattr(renderer_screen, 'stats'):
+                self.output = renderer_screen
+    
+    def timed(self, name, func):
+        """Wrap func so each call's time, less any timed calls within it, goes to the phase"""
+        stats = self.phases[name]
+        clock = time.perf_counter
+        
+        def wrapper():
+            nested = self.nested
+            start = clock()
+            result = func()
+            elapsed = clock() - start
+            # Inner timings (refresh inside draw) are not counted twice
+            inner = self.nested - nested
+            stats.add(elapsed - inner)
+            self.nested = nested + elapsed
+            return result
+        return wrapper
+    
+    def tick_late(self, lateness):
+        """Note a tick that ran lateness seconds after it was due"""
+        self.late_ticks += 1
+        if lateness > self.worst_lateness:
+            self.worst_lateness = lateness
+    
+    def ticks_dropped(self, count):
+        """Note ticks given up on because the game fell too far behind"""
+        self.dropped_ticks += count
+    
+    def hud(self):
+        """The in-game line: rates, late ticks and p50/p99 per phase in us, refreshed every HUD_INTERVAL"""
+        now = time.perf_counter()
+        elapsed = now - self.hud_time
+        if elapsed >= HUD_INTERVAL:
+            fps = (self.frames - self.hud_frames) / elapsed
+            tps = (self.ticks - self.hud_ticks) / elapsed
+            parts = [f"fps {fps:.0f} tps {tps:.1f} late {self.late_ticks}"]
+            for name in PHASES:
+                recent = self.phases[name].recent()
+                parts.append(f"{LABELS[name]} {percentile(recent, 0.5) * 1e6:.0f}/{percentile(recent, 0.99) * 1e6:.0f}")
+            if self.input_latency:
+                parts.append(self.input_latency.hud())
+            if self.output:
+                parts.append(f"out {self.output.frame_bytes}B")
+            self.hud_line = ' | '.join(parts)
+            self.hud_time, self.hud_frames, self.hud_ticks = now, self.frames, self.ticks
+        return self.hud_line
+    
+    def report(self):
+        report = {
+            'seconds': time.perf_counter() - self.start,
+            'ticks': self.ticks,
+            'frames': self.frames,
+            'late_ticks': self.late_ticks,
+            'dropped_ticks': self.dropped_ticks,
+            'worst_lateness_ms': self.worst_lateness * 1e3,
+            'phases': {name: stats.report() for name, stats in self.phases.items()},
+        }
+        if self.input_latency:
+            report['input'] = self.input_latency.report()
+        if self.output:
+            report['output'] = self.output.stats()
+        return report
+    
+    def export(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+def summarize(report):
+    """Lines describing an exported report"""
+    seconds = report['seconds'] or 1
+    lines = [f"{report['seconds']:.1f}s: {report['ticks']} ticks ({report['ticks'] / seconds:.1f}/s), "
+             f"{report['frames']} frames ({report['frames'] / seconds:.1f}/s)",
+             f"late ticks {report['late_ticks']} (worst {report['worst_lateness_ms']:.1f}ms), "
+             f"dropped ticks {report['dropped_ticks']}",
+             f"{'phase':<17} {'calls':>8} {'mean us':>9} {'p50 us':>9} {'p99 us':>9} {'max us':>9}"]
+    for name, stats in report['phases'].items():
+        lines.append(f"{name:<17} {stats['count']:>8} {stats['mean_us']:>9.1f} {stats['p50_us']:>9.1f} "
+                     f"{stats['p99_us']:>9.1f} {stats['max_us']:>9.1f}")
+    if 'input' in report:
+        turns = report['input']
+        spread = ', '.join(f"{ticks}: {count}" for ticks, count in turns['ticks'].items())
+        lines.append(f"turns {turns['turns']}, {turns['next_tick_share']:.0%} on the next tick "
+                     f"(by ticks taken {spread or 'none'}), {turns['dropped']} dropped")
+        lines.append(f"key to turn p50 {turns['p50_ms']:.1f}ms p99 {turns['p99_ms']:.1f}ms "
+                     f"max {turns['max_ms']:.1f}ms")
+    if 'output' in report:
+        output = report['output']
+        lines.append(f"sent {output['bytes']} bytes in {output['frames']} frames, "
+                     f"{output['bytes_per_frame']:.1f} per frame (largest {output['max_frame_bytes']})")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise a profile written by pacman.py --profile')
+    parser.add_argument('report')
+    args = parser.parse_args()
+    with open(args.report) as f:
+        report = json.load(f)
+    print('\n'.join(summarize(report)))
+
+if __name__ == '__main__':
+    main()
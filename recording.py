@@ -0,0 +1,79 @@
+"""Recordings of played games, for deterministic replay
+
+A game is reproducible from its map, its RNG seed and the keys that
+mattered, because the rules run on a tick-driven clock. A recording is a
+one-line header naming the map (with a hash of its contents), the seed,
+the ghost AI and, for games with a generated maze on each level, what
+made the mazes, followed by the input log: one byte per tick, plus one
+per restart or level change. Bytes go through a large write buffer, so
+recording costs about one buffered write call per tick.
+"""
+import json
+
+from mapcache import map_hash
+from navigation import DIRECTIONS
+
+MAGIC = b'PACREC1\n'
+# Input log codes: 0 is a tick, 1-4 a tick after a press of DIRECTIONS[code - 1]
+TICK = 0
+RESET = 5
+NEXT_LEVEL = 6
+CODE_BYTES = [bytes([code]) for code in range(NEXT_LEVEL + 1)]
+
+BUFFER_SIZE = 1 << 16
+
+class Recorder:
+    """Writes a recording while a game is played"""
+    def __init__(self, path, map_file, seed, ghost_ai='chase', levels=None):
+        with open(map_file, 'rb') as f:
+            text = f.read()
+        header = {'map': map_file, 'map_hash': map_hash(text), 'seed': seed, 'ghost_ai': ghost_ai,
+                  'levels': levels.spec() if levels else None}
+        self.file = open(path, 'wb', buffering=BUFFER_SIZE)
+        self.file.write(MAGIC + json.dumps(header).encode() + b'\n')
+        self.code = TICK
+        self.ticks = 0
+    
+    def steer(self, direction):
+        """Note a direction key; it is logged with the next tick"""
+        self.code = DIRECTIONS.index(direction) + 1
+    
+    def tick(self):
+        self.file.write(CODE_BYTES[self.code])
+        self.code = TICK
+        self.ticks += 1
+    
+    def event(self, code):
+        """Log RESET or NEXT_LEVEL"""
+        self.file.write(CODE_BYTES[code])
+    
+    def close(self):
+        self.file.close()
+
+class Recording:
+    """A recording read back from disk"""
+    def __init__(self, map_file, map_hash, seed, ghost_ai, codes, levels=None):
+        self.map_file = map_file
+        self.map_hash = map_hash
+        self.seed = seed
+        self.ghost_ai = ghost_ai
+        # LevelQueue.spec() of the mazes after level 1, or None if every level was on the map
+        self.levels = levels
+        self.codes = codes
+        self.ticks = sum(codes.count(CODE_BYTES[code]) for code in range(len(DIRECTIONS) + 1))
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{path} is not a Pac-Man recording")
+        end = data.index(b'\n', len(MAGIC))
+        header = json.loads(data[len(MAGIC):end])
+        return cls(header['map'], header['map_hash'], header['seed'], header['ghost_ai'], data[end + 1:],
+                   header.get('levels'))
+    
+    def matches(self, map_file):
+        """Whether map_file holds the map this was recorded on"""
+        with open(map_file, 'rb') as f:
+            return map_hash(f.read()) == self.map_hash
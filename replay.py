@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Replay games recorded with pacman.py --record
+
+Re-simulates a recording tick by tick from its seed and input log. It
+can run at full speed and report where the game ended up, or any tick
+along the way. It can also show the game in the terminal at the
+recorded pace, with seeking. Snapshots of the game state are kept every
+SNAPSHOT_INTERVAL ticks, so seeking restores the nearest earlier
+snapshot rather than re-running from tick 0.
+
+    python3 pacman.py --record game.rec
+    python3 replay.py game.rec
+    python3 replay.py game.rec --fast --tick 1200
+"""
+import argparse
+import bisect
+import curses
+import random
+import sys
+import time
+
+from navigation import DIRECTIONS
+from pacman import CursesRenderer
+from events import open_sink
+from mazegen import LevelQueue
+from recording import NEXT_LEVEL, RESET, Recording
+from simulation import Simulation
+
+SNAPSHOT_INTERVAL = 500
+# Ticks skipped by each seek key in the viewer
+SEEK_TICKS = 100
+
+class Replayer:
+    """Steps a Simulation through a recording, snapshotting as it goes
+
+    events, a sink from events.py, is sent the game's events as ticks
+    are simulated, so seeking backwards sends some of them again.
+    """
+    def __init__(self, recording, map_file=None, interval=SNAPSHOT_INTERVAL, events=None):
+        map_file = map_file or recording.map_file
+        if not recording.matches(map_file):
+            raise ValueError(f"{map_file} is not the map this game was recorded on")
+        self.recording = recording
+        spec = recording.levels
+        levels = LevelQueue(spec['width'], spec['height'], spec['seed'], background=False) if spec else None
+        self.game = Simulation(map_file, rng=random.Random(recording.seed), ghost_ai=recording.ghost_ai,
+                               levels=levels, events=events)
+        self.codes = recording.codes
+        self.interval = interval
+        self.tick = 0
+        self.position = 0
+        # (log position, maze, game snapshot) after each tick in snapshot_ticks
+        self.snapshot_ticks = [0]
+        self.snapshots = [(0, self.game.maze, self.game.snapshot())]
+    
+    def step(self):
+        """Play the log up to and including its next tick; returns False at its end"""
+        game = self.game
+        codes = self.codes
+        while self.position < len(codes):
+            code = codes[self.position]
+            self.position += 1
+            if code == RESET:
+                game.reset_game()
+            elif code == NEXT_LEVEL:
+                game.next_level()
+            else:
+                if code:
+                    game.pacman.next_dy, game.pacman.next_dx = DIRECTIONS[code - 1]
+                game.step()
+                self.tick += 1
+                if self.tick % self.interval == 0 and self.tick > self.snapshot_ticks[-1]:
+                    self.snapshot_ticks.append(self.tick)
+                    self.snapshots.append((self.position, game.maze, game.snapshot()))
+                return True
+        return False
+    
+    def seek(self, tick):
+        """Move to just after the given tick, or the end if the log is shorter"""
+        if tick < self.tick or tick - self.tick > self.interval:
+            # Restore the latest snapshot at or before the tick, if it saves work
+            i = bisect.bisect_right(self.snapshot_ticks, tick) - 1
+            if tick < self.tick or self.snapshot_ticks[i] > self.tick:
+                self.position, maze, state = self.snapshots[i]
+                if maze is not self.game.maze:
+                    self.game.use_maze(maze)
+                self.game.restore(state)
+                self.tick = self.snapshot_ticks[i]
+        while self.tick < tick and self.step():
+            pass
+
+def describe(game, tick):
+    pacman = game.pacman
+    return (f"tick {tick}: score {game.score}, level {game.level}, lives {game.lives}, "
+            f"pacman at {pacman.y},{pacman.x}, {game.pellets_remaining} dots left"
+            + (", game over" if game.game_over else ", level cleared" if game.won else ""))
+
+def watch(stdscr, replayer, rate):
+    """Show the replay at rate times the recorded pace
+
+    Space pauses, left and right seek by SEEK_TICKS, + and - change the
+    rate and q quits.
+    """
+    stdscr.nodelay(1)
+    stdscr.keypad(1)
+    curses.curs_set(0)
+    game = replayer.game
+    renderer = CursesRenderer(stdscr)
+    total = replayer.recording.ticks
+    paused = False
+    next_tick = time.monotonic()
+    
+    while True:
+        key = stdscr.getch()
+        while key != -1:
+            if key in (ord('q'), ord('Q')):
+                return
+            if key == ord(' '):
+                paused = not paused
+            elif key in (curses.KEY_LEFT, curses.KEY_RIGHT):
+                step = SEEK_TICKS if key == curses.KEY_RIGHT else -SEEK_TICKS
+                replayer.seek(max(0, replayer.tick + step))
+                renderer.invalidate()
+            elif key == ord('+'):
+                rate *= 2
+            elif key == ord('-'):
+                rate /= 2
+            elif key == curses.KEY_RESIZE:
+                renderer.resize()
+            key = stdscr.getch()
+        
+        now = time.monotonic()
+        if paused or replayer.tick >= total:
+            next_tick = now
+        elif now >= next_tick:
+            replayer.step()
+            # Keep to the recorded pace, but never try to catch up a long backlog
+            next_tick = max(next_tick + game.speed / rate, now - game.speed / rate)
+        
+        renderer.draw(game)
+        rows, cols = stdscr.getmaxyx()
+        state = 'paused' if paused else 'end' if replayer.tick >= total else f"x{rate:g}"
+        status = f" tick {replayer.tick}/{total} {state} "
+        try:
+            stdscr.addstr(rows - 1, 0, status[:cols - 1].ljust(min(cols - 1, 32)), curses.A_REVERSE)
+        except curses.error:
+            pass
+        stdscr.refresh()
+        time.sleep(max(0.0, min(next_tick - time.monotonic(), 0.02)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded game')
+    parser.add_argument('recording')
+    parser.add_argument('--map', help='map file, if it has moved since recording')
+    parser.add_argument('--fast', action='store_true',
+                        help='re-simulate at full speed and print the state instead of watching')
+    parser.add_argument('--tick', type=int, default=None,
+                        help='stop at this tick (with --fast) or start watching from it')
+    parser.add_argument('--rate', type=float, default=1.0, help='playback speed when watching')
+    parser.add_argument('--events', metavar='FILE',
+                        help='with --fast, log the game\'s events to FILE (binary if it ends in .evt)')
+    args = parser.parse_args()
+    
+    recording = Recording.load(args.recording)
+    events = open_sink(args.events) if args.events and args.fast else None
+    try:
+        replayer = Replayer(recording, args.map, events=events)
+    except ValueError as e:
+        sys.exit(str(e))
+    
+    if args.fast:
+        start = time.perf_counter()
+        replayer.seek(recording.ticks if args.tick is None else args.tick)
+        elapsed = time.perf_counter() - start
+        if events:
+            events.close()
+        print(describe(replayer.game, replayer.tick))
+        print(f"{replayer.tick} ticks re-simulated in {elapsed:.3f}s")
+        return
+    
+    if args.tick:
+        replayer.seek(args.tick)
+    curses.wrapper(watch, replayer, args.rate)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Timers that run on simulation ticks instead of a clock
+
+Power mode, the fruit and the ghosts' scatter/chase waves each have a
+named timer in a Scheduler. Setting a timer that is already running
+moves it, which is how a second power pill extends power mode.
+Cancelling one simply forgets it. The timers are a heap ordered by due
+tick, so a tick with nothing due costs one comparison.
+
+Durations are given in seconds and converted to ticks at the tick
+length in force, with exact arithmetic, so a timer fires on the same
+tick whether the game is played live, headless or replayed.
+"""
+import heapq
+import math
+from fractions import Fraction
+
+def ticks_after(seconds, tick_seconds):
+    """Fewest ticks of tick_seconds that last longer than seconds"""
+    return math.floor(Fraction(seconds) / Fraction(tick_seconds)) + 1
+
+def ticks_until(seconds, tick_seconds):
+    """Fewest ticks of tick_seconds that last at least seconds"""
+    return math.ceil(Fraction(seconds) / Fraction(tick_seconds))
+
+class Scheduler:
+    """Named timers, each due on a tick, kept in a heap
+
+    heap holds (tick, sequence, name) for every timer set, including
+    ones since moved or cancelled; due maps each running timer's name to
+    its (tick, sequence), and heap entries that no longer match are
+    skipped when they come up.
+    """
+    def __init__(self):
+        self.heap = []
+        self.due = {}
+        self.sequence = 0
+    
+    def set(self, name, tick):
+        """Run the timer name on tick, replacing it if it is already running"""
+        self.sequence += 1
+        self.due[name] = (tick, self.sequence)
+        heapq.heappush(self.heap, (tick, self.sequence, name))
+    
+    def cancel(self, name):
+        self.due.pop(name, None)
+        if not self.due:
+            self.heap.clear()
+    
+    def pending(self, name):
+        """The tick the timer name is due on, or None if it is not running"""
+        entry = self.due.get(name)
+        return entry[0] if entry else None
+    
+    def pop_due(self, tick):
+        """Names of the timers due on or before tick, in the order they fall due"""
+        heap = self.heap
+        due = self.due
+        names = []
+        while heap and heap[0][0] <= tick:
+            when, sequence, name = heapq.heappop(heap)
+            if due.get(name) == (when, sequence):
+                del due[name]
+                names.append(name)
+        return names
+    
+    def copy(self):
+        other = Scheduler.__new__(Scheduler)
+        other.heap = self.heap[:]
+        other.due = dict(self.due)
+        other.sequence = self.sequence
+        return other
+    
+    def state(self):
+        """The timers as plain data, for snapshots"""
+        return tuple(self.heap), tuple(self.due.items()), self.sequence
+    
+    @classmethod
+    def from_state(cls, state):
+        heap, due, sequence = state
+        other = cls.__new__(cls)
+        other.heap = list(heap)
+        other.due = dict(due)
+        other.sequence = sequence
+        return other
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""Pac-Man over TCP: many games in one process, one asyncio event loop
+
+Every player gets a session of their own: a Simulation on one of the
+server's maps, an input queue filled as keys arrive and a timer that
+ticks the game at its speed. Frames are drawn by CursesRenderer on an
+AnsiScreen, so only changed cells are sent. Other connections can
+watch any session read-only, each with its own view.
+
+A client whose socket buffer backs up past HIGH_WATER is skipped,
+rather than queuing frames it cannot take. Once it drains below
+LOW_WATER it is sent a full redraw. The game itself never waits.
+
+    python3 server.py --port 7777
+    telnet localhost 7777
+    stty raw -echo; nc localhost 7777; stty sane
+
+In the lobby, P starts a game, a session number and Enter watch one,
+S prints server statistics as JSON and Q leaves. In a game, the arrow
+keys (or WASD) steer, R restarts after a game over, space starts the
+next level and Q quits.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from ansi import ANSI_GLYPHS, RESTORE, AnsiScreen
+from navigation import DOWN, LEFT, RIGHT, UP
+from pacman import MAX_CATCH_UP_TICKS, CursesRenderer
+from profiler import PhaseStats
+from simulation import Simulation
+
+DEFAULT_PORT = 7777
+# Screen size for clients that do not report theirs
+DEFAULT_ROWS = 24
+DEFAULT_COLS = 80
+# Bytes queued for a client before its frames are skipped, and before it is caught up again
+HIGH_WATER = 64 * 1024
+LOW_WATER = 16 * 1024
+# Keys a session holds before further ones are dropped
+INPUT_QUEUE_SIZE = 32
+
+# Telnet commands and options
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+ECHO, SGA, NAWS = 1, 3, 31
+# We echo nothing and want characters as they are typed, and the window size
+NEGOTIATION = bytes([IAC, WILL, ECHO, IAC, WILL, SGA, IAC, DO, NAWS])
+
+# Final byte of the ESC [ x or ESC O x sequences sent by arrow keys
+ARROWS = {ord('A'): UP, ord('B'): DOWN, ord('C'): RIGHT, ord('D'): LEFT}
+LETTERS = {'w': UP, 's': DOWN, 'a': LEFT, 'd': RIGHT}
+
+class TelnetDecoder:
+    """Splits bytes from a telnet or raw TCP client into keys and window sizes
+
+    feed() returns events: a direction from DIRECTIONS for an arrow key,
+    a one-character string for any other key (Enter is '\\r'), or
+    ('size', rows, cols) when a telnet client reports its window.
+    Sequences split across reads are held until the rest arrives.
+    """
+    def __init__(self):
+        self.pending = b''
+        self.after_cr = False
+    
+    def feed(self, data):
+        data = self.pending + data
+        events = []
+        i, n = 0, len(data)
+        while i < n:
+            byte = data[i]
+            if byte == IAC:
+                if i + 1 >= n:
+                    break
+                command = data[i + 1]
+                if command == SB:
+                    end = data.find(bytes([IAC, SE]), i + 2)
+                    if end < 0:
+                        break
+                    option = data[i + 2:end]
+                    if option[:1] == bytes([NAWS]) and len(option) >= 5:
+                        cols = option[1] << 8 | option[2]
+                        rows = option[3] << 8 | option[4]
+                        if rows and cols:
+                            events.append(('size', rows, cols))
+                    i = end + 2
+                elif command in (WILL, WONT, DO, DONT):
+                    if i + 2 >= n:
+                        break
+                    i += 3
+                else:
+                    i += 2
+                continue
+            
+            if byte == 0x1b:
+                # Arrow keys; a lone escape waits for the next read to tell
+                if i + 1 >= n or (data[i + 1] in b'[O' and i + 2 >= n):
+                    break
+                if data[i + 1] in b'[O':
+                    direction = ARROWS.get(data[i + 2])
+                    if direction:
+                        events.append(direction)
+                    i += 3
+                else:
+                    i += 1
+                continue
+            
+            # Telnet sends Enter as CR LF or CR NUL, a raw terminal as CR or LF
+            if not (self.after_cr and byte in (0, 10)):
+                if byte in (10, 13):
+                    events.append('\r')
+                elif byte:
+                    events.append(chr(byte))
+            self.after_cr = byte == 13
+            i += 1
+        self.pending = data[i:]
+        return events
+
+class Viewer:
+    """One connection's view of a session, drawn with its own renderer"""
+    def __init__(self, writer, rows=DEFAULT_ROWS, cols=DEFAULT_COLS):
+        self.writer = writer
+        self.screen = AnsiScreen(rows, cols, writer.write)
+        self.renderer = CursesRenderer(self.screen, ANSI_GLYPHS)
+        # Set while frames are being skipped for a full buffer
+        self.stale = False
+        self.frames_skipped = 0
+    
+    def resize(self, rows, cols):
+        self.screen.resize(rows, cols)
+        self.renderer.resize()
+    
+    def draw(self, game):
+        """Send the next frame, unless the client is still busy with earlier ones"""
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        queued = transport.get_write_buffer_size()
+        if queued > (LOW_WATER if self.stale else HIGH_WATER):
+            self.stale = True
+            self.frames_skipped += 1
+            return
+        if self.stale:
+            # What the client last saw is unknown: start again from a blank screen
+            self.renderer.invalidate()
+            self.stale = False
+        self.renderer.draw(game)
+    
+    def close(self, message=''):
+        if not self.writer.transport.is_closing():
+            self.writer.write((RESTORE + message + '\r\n').encode())
+            self.writer.close()
+
+class Session:
+    """A game with one player and any number of spectators, ticking on its own timer"""
+    def __init__(self, number, map_file, seed, player):
+        self.number = number
+        self.map_file = map_file
+        self.game = Simulation(map_file, rng=random.Random(seed))
+        self.player = player
+        self.spectators = []
+        self.inputs = asyncio.Queue(INPUT_QUEUE_SIZE)
+        self.closed = False
+        self.ticks = 0
+    
+    def viewers(self):
+        return [self.player] + self.spectators
+    
+    def key(self, key):
+        """Queue a key from the player; dropped if they have typed far ahead of the game"""
+        try:
+            self.inputs.put_nowait(key)
+        except asyncio.QueueFull:
+            pass
+    
+    def handle_key(self, key):
+        game = self.game
+        if key in ('q', 'Q'):
+            self.close("Thanks for playing")
+        elif key in ('r', 'R'):
+            if game.game_over or game.won:
+                game.reset_game()
+        elif key == ' ':
+            if game.won:
+                game.next_level()
+        elif not game.game_over and not game.won:
+            direction = LETTERS.get(key.lower()) if isinstance(key, str) else key
+            if direction:
+                game.pacman.next_dy, game.pacman.next_dx = direction
+    
+    def draw(self):
+        for viewer in self.viewers():
+            viewer.draw(self.game)
+    
+    async def run(self, jitter):
+        """Tick the game every game.speed seconds until the player leaves, noting how late each tick runs"""
+        loop = asyncio.get_running_loop()
+        game = self.game
+        self.draw()
+        next_tick = loop.time()
+        while not self.closed:
+            next_tick += game.speed
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            if self.closed:
+                break
+            now = loop.time()
+            jitter.add(now - next_tick)
+            if now - next_tick > MAX_CATCH_UP_TICKS * game.speed:
+                # Too far behind (e.g. the machine stalled): drop the backlog
+                next_tick = now
+            
+            while not self.inputs.empty():
+                self.handle_key(self.inputs.get_nowait())
+                if self.closed:
+                    return
+            if not game.game_over and not game.won:
+                game.step()
+                self.ticks += 1
+            self.draw()
+    
+    def close(self, message="Session over"):
+        if self.closed:
+            return
+        self.closed = True
+        for viewer in self.viewers():
+            viewer.close(message)
+
+class Server:
+    """Accepts connections, hosts their sessions and keeps statistics"""
+    def __init__(self, map_files, seed=None):
+        self.map_files = itertools.cycle(map_files)
+        self.rng = random.Random(seed)
+        self.sessions = {}
+        self.numbers = itertools.count(1)
+        self.jitter = PhaseStats()
+        self.start = time.monotonic()
+        self.start_cpu = time.process_time()
+        self.connections = 0
+    
+    def stats(self):
+        """Server load as a dict: sessions, CPU use and how late ticks run"""
+        wall = time.monotonic() - self.start
+        cpu = time.process_time() - self.start_cpu
+        jitter = self.jitter.report()
+        return {
+            'sessions': len(self.sessions),
+            'spectators': sum(len(session.spectators) for session in self.sessions.values()),
+            'connections': self.connections,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'ticks': self.jitter.count,
+            'frames_skipped': sum(viewer.frames_skipped for session in self.sessions.values()
+                                  for viewer in session.viewers()),
+            'jitter_ms': {name: jitter[f'{name}_us'] / 1e3 for name in ('mean', 'p50', 'p99', 'max')},
+        }
+    
+    def lobby(self):
+        lines = [RESTORE, "Pac-Man server", ""]
+        for number, session in sorted(self.sessions.items()):
+            game = session.game
+            lines.append(f"  {number:>4}: level {game.level}, score {game.score}, lives {game.lives}, "
+                         f"{len(session.spectators)} watching")
+        if not self.sessions:
+            lines.append("  No games in progress")
+        lines += ["", "P to play, a session number and Enter to watch, S for statistics, Q to quit", ""]
+        return '\r\n'.join(lines).encode()
+    
+    async def handle_client(self, reader, writer):
+        self.connections += 1
+        try:
+            await self.serve(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            if not writer.transport.is_closing():
+                writer.close()
+    
+    async def serve(self, reader, writer):
+        writer.write(NEGOTIATION + self.lobby())
+        decoder = TelnetDecoder()
+        size = (DEFAULT_ROWS, DEFAULT_COLS)
+        digits = ''
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                return
+            for event in decoder.feed(data):
+                if isinstance(event, tuple) and event[0] == 'size':
+                    size = event[1:]
+                elif event in ('q', 'Q'):
+                    writer.write(RESTORE.encode())
+                    return
+                elif event in ('s', 'S'):
+                    writer.write(json.dumps(self.stats()).encode() + b'\r\n')
+                elif event in ('p', 'P'):
+                    await self.play(reader, writer, decoder, size)
+                    return
+                elif isinstance(event, str) and event.isdigit():
+                    digits += event
+                elif event == '\r' and digits:
+                    session = self.sessions.get(int(digits))
+                    digits = ''
+                    if session:
+                        await self.watch(reader, writer, decoder, size, session)
+                        return
+                    writer.write(b"No such session\r\n")
+    
+    async def play(self, reader, writer, decoder, size):
+        number = next(self.numbers)
+        seed = self.rng.randrange(1 << 32)
+        player = Viewer(writer, *size)
+        session = Session(number, next(self.map_files), seed, player)
+        self.sessions[number] = session
+        task = asyncio.create_task(session.run(self.jitter))
+        try:
+            while not session.closed:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                for event in decoder.feed(data):
+                    if isinstance(event, tuple) and event[0] == 'size':
+                        player.resize(*event[1:])
+                    else:
+                        session.key(event)
+        finally:
+            session.close()
+            del self.sessions[number]
+            await task
+    
+    async def watch(self, reader, writer, decoder, size, session):
+        spectator = Viewer(writer, *size)
+        session.spectators.append(spectator)
+        spectator.draw(session.game)
+        try:
+            while not session.closed:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                for event in decoder.feed(data):
+                    if isinstance(event, tuple) and event[0] == 'size':
+                        spectator.resize(*event[1:])
+                    elif event in ('q', 'Q'):
+                        spectator.close()
+                        return
+        finally:
+            if spectator in session.spectators:
+                session.spectators.remove(spectator)
+
+async def serve(map_files, host, port, seed=None):
+    server = Server(map_files, seed)
+    listener = await asyncio.start_server(server.handle_client, host, port)
+    addresses = ', '.join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in listener.sockets)
+    print(f"Serving Pac-Man on {addresses}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Host Pac-Man games for telnet and nc clients')
+    parser.add_argument('map_files', nargs='*', default=['pacman-map.txt'],
+                        help='maps handed out to new sessions in turn (default: pacman-map.txt)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--seed', type=int, default=None, help='seed for the sessions\' seeds')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.map_files, args.host, args.port, args.seed))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,769 @@
+"""Pac-Man game rules, independent of any terminal
+
+Simulation holds the maze, the entities and every rule of the game, and
+can be stepped headlessly with step(). The curses front end in pacman.py
+builds on it.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from operator import attrgetter
+
+from ai import GhostAI
+from board import WALL, Bitset, Maze, Point
+from events import (EXTRA_LIFE, FRUIT_EATEN, FRUIT_EXPIRED, FRUIT_SPAWNED, GAME_OVER, GAME_START,
+                    GHOST_EATEN, LEVEL_CLEARED, LEVEL_START, LIFE_LOST, PELLET, POWER_END, POWER_PILL, Event)
+from mapcache import load_maze
+from navigation import DIRECTIONS, DIR_INDEX, JUNCTION, MASK_DIRS, REVERSE_CLEAR, STOP
+from scheduler import Scheduler, ticks_after
+
+class GameObject:
+    __slots__ = ('y', 'x', 'char', 'dy', 'dx')
+    
+    def __init__(self, y, x, char):
+        self.y = y
+        self.x = x
+        self.char = char
+        self.dy = 0
+        self.dx = 0
+
+class Ghost(GameObject):
+    __slots__ = ('frightened', 'frightened_time', 'spawn_index')
+    
+    def __init__(self, y, x, char='n', spawn_index=0):
+        super().__init__(y, x, char)
+        self.frightened = False
+        self.frightened_time = 0
+        # Position in the game's ghost list, and in ghost_starts if it has a start
+        self.spawn_index = spawn_index
+    
+    def copy(self):
+        other = Ghost(self.y, self.x, self.char, self.spawn_index)
+        other.dy, other.dx = self.dy, self.dx
+        other.frightened, other.frightened_time = self.frightened, self.frightened_time
+        return other
+
+class PacMan(GameObject):
+    __slots__ = ('next_dy', 'next_dx')
+    
+    def __init__(self, y, x, char='c'):
+        super().__init__(y, x, char)
+        self.next_dy = 0
+        self.next_dx = 0
+    
+    def copy(self):
+        other = PacMan(self.y, self.x, self.char)
+        other.dy, other.dx = self.dy, self.dx
+        other.next_dy, other.next_dx = self.next_dy, self.next_dx
+        return other
+
+class SimClock:
+    """Virtual clock for headless runs, advanced by step() one tick at a time"""
+    def __init__(self, start=1000.0):
+        # Timers treat a timestamp of 0 as "not running", so start past it
+        self.now = start
+    
+    def __call__(self):
+        return self.now
+    
+    def advance(self, seconds):
+        self.now += seconds
+
+class NullRenderer:
+    """Renderer that draws nothing, for headless runs"""
+    def draw(self, game):
+        pass
+
+NULL_RENDERER = NullRenderer()
+
+class Occupancy:
+    """Index from cell to the ghosts standing in it
+
+    It is updated as each ghost moves, so a collision check looks up one
+    cell rather than scanning every ghost, however many ghosts there are
+    and whichever of them moved this tick.
+    """
+    def __init__(self, ghosts, width):
+        self.cells = {}
+        self.reset(ghosts, width)
+    
+    def reset(self, ghosts, width):
+        """Re-index every ghost, after they were put back or restored"""
+        self.cells.clear()
+        for ghost in ghosts:
+            self.add(ghost, ghost.y * width + ghost.x)
+    
+    def add(self, ghost, cell):
+        ghosts = self.cells.get(cell)
+        if ghosts is None:
+            self.cells[cell] = [ghost]
+        else:
+            ghosts.append(ghost)
+    
+    def remove(self, ghost, cell):
+        ghosts = self.cells[cell]
+        if len(ghosts) == 1:
+            del self.cells[cell]
+        else:
+            ghosts.remove(ghost)
+    
+    def move(self, ghost, old_cell, new_cell):
+        if old_cell != new_cell:
+            self.remove(ghost, old_cell)
+            self.add(ghost, new_cell)
+    
+    def first(self, cell):
+        """The ghost in cell that comes first in the ghost list, or None"""
+        ghosts = self.cells.get(cell)
+        if not ghosts:
+            return None
+        if len(ghosts) == 1:
+            return ghosts[0]
+        return min(ghosts, key=attrgetter('spawn_index'))
+
+# Simulation attributes that change during play, captured by snapshot()
+STATE_FIELDS = ('score', 'lives', 'game_over', 'won', 'pellets_remaining', 'ticks',
+                'speed', 'level', 'extra_life_awarded', 'fruit_active',
+                'dots_eaten', 'fruit_triggered_70', 'fruit_triggered_170', 'fruit')
+# Attributes fixed by the map and options, shared as they are by clone()
+SHARED_FIELDS = ('maze', 'height', 'width', 'grid', 'nav', 'warp_left', 'warp_right',
+                 'pacman_start', 'ghost_starts', 'initial_fruit', 'ghost_ai', 'levels')
+
+class Simulation:
+    """Game rules and state, with no dependency on a terminal
+
+    The power mode, fruit and ghost wave timers count ticks, in a
+    Scheduler, so the rules never read a clock. clock is a callable
+    returning seconds of game time for anything else that wants it; it
+    defaults to a SimClock that step() advances by one tick. rng supplies
+    the ghosts' random choices and defaults to the random module. ghost_ai
+    is 'chase' for target-seeking ghosts or 'random' for ghosts that
+    wander and turn at random. levels, such as a mazegen.LevelQueue, gives
+    each level after the first its own maze through levels.maze(level);
+    without it every level replays the map. events is a sink from
+    events.py that is sent an Event for everything that happens in play;
+    clones never have one.
+    """
+    # Tunable rules; instances may override them, e.g. for balancing runs
+    START_SPEED = 0.15        # Seconds per tick on level 1
+    MIN_SPEED = 0.08          # Fastest the ramp goes
+    SPEED_STEP = 0.01         # Taken off the tick length each level
+    POWER_MODE_SECONDS = 6
+    FRUIT_SECONDS = 10
+    
+    def __init__(self, map_file, clock=None, rng=None, renderer=None, ghost_ai='chase', levels=None,
+                 events=None):
+        self.clock = clock or SimClock()
+        self.rng = rng or random
+        self.ghost_ai = ghost_ai
+        self.levels = levels
+        self.events = events
+        self.renderer = renderer or NullRenderer()
+        self.load_map(map_file)
+        self.score = 0
+        self.lives = 3
+        self.game_over = False
+        self.won = False
+        self.pellets_remaining = 0
+        # Ticks played, which is the time every timer runs on
+        self.ticks = 0
+        self.timers = Scheduler()
+        self.speed = self.START_SPEED
+        
+        # Level system
+        self.level = 1
+        self.extra_life_awarded = False
+        
+        # Cells whose pellet or pill was eaten since the renderer last looked;
+        # None until a renderer that repaints only changes starts the list
+        self.eaten = None
+        
+        # Fruit mechanics
+        self.fruit_active = False
+        self.dots_eaten = 0
+        self.fruit_triggered_70 = False
+        self.fruit_triggered_170 = False
+        
+        # Initialize game objects
+        self.pacman = None
+        self.ghosts = []
+        self.fruit = None
+        
+        self.parse_map()
+        if events:
+            self.emit(GAME_START)
+    
+    def load_map(self, map_file):
+        """Use a Maze, or the shared Maze parsed from a map file"""
+        self.maze = map_file if isinstance(map_file, Maze) else load_maze(map_file)
+        maze = self.maze
+        self.height = maze.height
+        self.width = maze.width
+        self.grid = maze.grid
+        self.nav = maze.nav
+        
+        # Warp tunnel positions
+        self.warp_left = maze.warp_left  # Position of '<'
+        self.warp_right = maze.warp_right  # Position of '>'
+        
+        # Store starting positions
+        self.pacman_start = maze.pacman_start
+        self.ghost_starts = maze.ghost_starts
+        self.initial_fruit = maze.fruit
+    
+    def parse_map(self):
+        """Create this game's entities and copy of the pellets from the maze"""
+        if self.pacman_start:
+            self.pacman = PacMan(*self.pacman_start)
+        self.ghosts = [Ghost(start.y, start.x, spawn_index=i) for i, start in enumerate(self.ghost_starts)]
+        self.occupancy = Occupancy(self.ghosts, self.width)
+        self.fruit = self.initial_fruit
+        
+        self.refill_pellets()
+        
+        self.ai = GhostAI(self) if self.ghost_ai == 'chase' else None
+    
+    def use_maze(self, maze):
+        """Move play to another Maze, with new entities and a full set of pellets"""
+        self.load_map(maze)
+        self.parse_map()
+    
+    def refill_pellets(self):
+        """Put every pellet and power pill back, as at the start of a level"""
+        self.pellets = Bitset(self.maze.pellets)
+        self.power_pills = Bitset(self.maze.power_pills)
+        # False while the bitsets are shared with a clone, until either side eats
+        self.pellets_owned = True
+        self.pellets_remaining = self.maze.dot_count
+    
+    def own_pellets(self):
+        """Take private copies of bitsets shared with a clone, before changing them"""
+        self.pellets = Bitset(self.pellets)
+        self.power_pills = Bitset(self.power_pills)
+        self.pellets_owned = True
+    
+    def draw(self):
+        self.renderer.draw(self)
+    
+    def emit(self, kind, y=0, x=0, value=0):
+        """Send an event to the sink; callers check there is one first"""
+        self.events.write(Event(self.ticks, kind, self.level, y, x, value))
+    
+    def is_wall(self, y, x):
+        if 0 <= y < self.height and 0 <= x < self.width:
+            return self.grid[y * self.width + x] == WALL
+        return True
+    
+    def is_valid_move(self, y, x):
+        if 0 <= y < self.height and 0 <= x < self.width:
+            return self.grid[y * self.width + x] != WALL
+        return False
+    
+    def move_pacman(self):
+        if not self.pacman:
+            return
+        
+        pacman = self.pacman
+        nav = self.nav
+        cell = pacman.y * self.width + pacman.x
+        
+        # Try to change direction if new direction pressed
+        if pacman.next_dy != 0 or pacman.next_dx != 0:
+            turn = DIR_INDEX[(pacman.next_dy + 1) * 3 + pacman.next_dx + 1]
+            if nav.exits[cell] >> turn & 1:
+                pacman.dy = pacman.next_dy
+                pacman.dx = pacman.next_dx
+                pacman.next_dy = 0
+                pacman.next_dx = 0
+        
+        # Continue in current direction
+        if pacman.dy != 0 or pacman.dx != 0:
+            heading = DIR_INDEX[(pacman.dy + 1) * 3 + pacman.dx + 1]
+            
+            # Check if we're at a warp tunnel entrance
+            if nav.warps:
+                target = nav.warps.get(cell * 5 + heading)
+                if target is not None:
+                    pacman.y, pacman.x = divmod(target, self.width)
+                    return
+            
+            # Normal movement
+            if nav.exits[cell] >> heading & 1:
+                pacman.y += pacman.dy
+                pacman.x += pacman.dx
+            else:
+                # Hit a wall, stop
+                pacman.dy = 0
+                pacman.dx = 0
+        
+        # Check for pellet collection
+        cell = pacman.y * self.width + pacman.x
+        byte, bit = cell >> 3, 1 << (cell & 7)
+        if self.pellets[byte] & bit:
+            if not self.pellets_owned:
+                self.own_pellets()
+            self.pellets[byte] ^= bit
+            if self.eaten is not None:
+                self.eaten.append(cell)
+            self.score += 10
+            self.pellets_remaining -= 1
+            self.dots_eaten += 1
+            if self.events:
+                self.emit(PELLET, pacman.y, pacman.x, 10)
+            self.check_extra_life()
+            
+            # Check for fruit spawn triggers
+            if self.dots_eaten == 70 and not self.fruit_triggered_70:
+                self.spawn_fruit()
+                self.fruit_triggered_70 = True
+            elif self.dots_eaten == 170 and not self.fruit_triggered_170:
+                self.spawn_fruit()
+                self.fruit_triggered_170 = True
+        
+        # Check for power pill
+        if self.power_pills[byte] & bit:
+            if not self.pellets_owned:
+                self.own_pellets()
+            self.power_pills[byte] ^= bit
+            if self.eaten is not None:
+                self.eaten.append(cell)
+            self.score += 50
+            self.pellets_remaining -= 1
+            self.dots_eaten += 1
+            if self.events:
+                self.emit(POWER_PILL, pacman.y, pacman.x, 50)
+            self.check_extra_life()
+            
+            # Check for fruit spawn triggers
+            if self.dots_eaten == 70 and not self.fruit_triggered_70:
+                self.spawn_fruit()
+                self.fruit_triggered_70 = True
+            elif self.dots_eaten == 170 and not self.fruit_triggered_170:
+                self.spawn_fruit()
+                self.fruit_triggered_170 = True
+            
+            # A second pill while the first is working starts the time again
+            self.start_timer('end_power_mode', ticks_after(self.POWER_MODE_SECONDS, self.speed))
+            for ghost in self.ghosts:
+                ghost.frightened = True
+        
+        # Check for fruit
+        if self.fruit and self.fruit_active and pacman.y == self.fruit.y and pacman.x == self.fruit.x:
+            self.score += 100
+            self.fruit_active = False
+            self.timers.cancel('expire_fruit')
+            if self.events:
+                self.emit(FRUIT_EATEN, pacman.y, pacman.x, 100)
+            self.check_extra_life()
+        
+        # Check win condition
+        if self.pellets_remaining == 0 and not self.won:
+            self.won = True
+            if self.events:
+                self.emit(LEVEL_CLEARED, pacman.y, pacman.x)
+    
+    def check_extra_life(self):
+        """Award extra life at 10,000 points"""
+        if not self.extra_life_awarded and self.score >= 10000:
+            self.lives += 1
+            self.extra_life_awarded = True
+            if self.events:
+                self.emit(EXTRA_LIFE, value=self.lives)
+    
+    def next_level(self):
+        """Advance to the next level"""
+        self.level += 1
+        self.won = False
+        if self.levels:
+            self.use_maze(self.levels.maze(self.level))
+        
+        # Reset fruit mechanics for new level
+        self.fruit_active = False
+        self.timers.cancel('expire_fruit')
+        self.dots_eaten = 0
+        self.fruit_triggered_70 = False
+        self.fruit_triggered_170 = False
+        
+        # Reset pellets and power pills to initial state
+        self.refill_pellets()
+        
+        # Reset fruit to initial position (but not active)
+        if self.initial_fruit:
+            self.fruit = self.initial_fruit
+        
+        # Increase difficulty slightly (make ghosts a bit faster)
+        self.speed = max(self.MIN_SPEED, self.speed - self.SPEED_STEP)
+        
+        # Reset positions, restarting the ghost waves at the new speed
+        self.reset_positions()
+        if self.events:
+            self.emit(LEVEL_START)
+    
+    def spawn_fruit(self):
+        """Spawn the fruit and start its timer (10 seconds by default)"""
+        if self.initial_fruit:
+            self.fruit_active = True
+            self.start_timer('expire_fruit', ticks_after(self.FRUIT_SECONDS, self.speed))
+            if self.events:
+                self.emit(FRUIT_SPAWNED, self.fruit.y, self.fruit.x)
+    
+    def expire_fruit(self):
+        self.fruit_active = False
+        if self.events:
+            self.emit(FRUIT_EXPIRED, self.fruit.y, self.fruit.x)
+    
+    def end_power_mode(self):
+        for ghost in self.ghosts:
+            ghost.frightened = False
+        if self.events:
+            self.emit(POWER_END)
+    
+    def next_ghost_wave(self):
+        if self.ai:
+            self.ai.next_wave()
+    
+    def start_timer(self, name, ticks):
+        """Call the method name once this many more ticks have started, replacing any such timer"""
+        self.timers.set(name, self.ticks + ticks)
+    
+    def run_timers(self):
+        """Call the methods of timers due by this tick"""
+        for name in self.timers.pop_due(self.ticks):
+            getattr(self, name)()
+    
+    def get_valid_directions(self, y, x):
+        if 0 <= y < self.height and 0 <= x < self.width:
+            return list(MASK_DIRS[self.nav.exits[y * self.width + x]])
+        directions = []
+        for dy, dx in DIRECTIONS:
+            new_y, new_x = y + dy, x + dx
+            if self.is_valid_move(new_y, new_x):
+                directions.append((dy, dx))
+        return directions
+    
+    def is_junction(self, y, x):
+        return len(self.get_valid_directions(y, x)) > 2
+    
+    def move_ghosts(self):
+        # Power mode, fruit and ghost wave timers due this tick
+        heap = self.timers.heap
+        if heap and heap[0][0] <= self.ticks:
+            self.run_timers()
+        
+        nav = self.nav
+        exits = nav.exits
+        warps = nav.warps
+        width = self.width
+        offsets = nav.offsets
+        rng = self.rng
+        ai = self.ai
+        occupancy = self.occupancy
+        
+        for index, ghost in enumerate(self.ghosts):
+            # Store old position for crossing detection
+            old_ghost_y = ghost.y
+            old_ghost_x = ghost.x
+            cell = old_ghost_y * width + old_ghost_x
+            mask = exits[cell]
+            
+            if ai:
+                ai.steer(ghost, index, cell, mask)
+            else:
+                # Initialize ghost movement if not moving
+                if ghost.dy == 0 and ghost.dx == 0:
+                    directions = MASK_DIRS[mask]
+                    if directions:
+                        ghost.dy, ghost.dx = rng.choice(directions)
+                
+                # Random chance to change direction at junction, never reversing
+                if JUNCTION[mask] and rng.random() < 0.3:
+                    heading = DIR_INDEX[(ghost.dy + 1) * 3 + ghost.dx + 1]
+                    directions = MASK_DIRS[mask & REVERSE_CLEAR[heading]]
+                    if directions:
+                        ghost.dy, ghost.dx = rng.choice(directions)
+            
+            heading = DIR_INDEX[(ghost.dy + 1) * 3 + ghost.dx + 1]
+            
+            # Check if we're at a warp tunnel entrance
+            if warps:
+                target = warps.get(cell * 5 + heading)
+                if target is not None:
+                    ghost.y, ghost.x = divmod(target, width)
+                    occupancy.move(ghost, cell, target)
+                    # Check collision after warp
+                    if self.check_ghost_collision_with_crossing(ghost, old_ghost_y, old_ghost_x):
+                        self.handle_collision(ghost)
+                        if self.game_over:
+                            return
+                    continue
+            
+            # Normal movement
+            if heading == STOP or mask >> heading & 1:
+                ghost.y += ghost.dy
+                ghost.x += ghost.dx
+                occupancy.move(ghost, cell, cell + offsets[heading])
+                
+                # Check for collision after each ghost moves (including crossing detection)
+                if self.check_ghost_collision_with_crossing(ghost, old_ghost_y, old_ghost_x):
+                    self.handle_collision(ghost)
+                    if self.game_over:
+                        return
+            else:
+                # Hit a wall, choose new random direction
+                directions = MASK_DIRS[mask]
+                if directions:
+                    ghost.dy, ghost.dx = rng.choice(directions)
+    
+    def check_collisions(self):
+        if not self.pacman:
+            return
+        
+        # The first ghost on pacman's cell, as a scan of the ghost list would find
+        ghost = self.occupancy.first(self.pacman.y * self.width + self.pacman.x)
+        if ghost:
+            self.handle_collision(ghost)
+    
+    def check_ghost_collision_with_crossing(self, ghost, old_ghost_y, old_ghost_x):
+        """Check if pacman and ghost crossed paths (edge case detection)"""
+        if not self.pacman:
+            return False
+        
+        # Check if they're now at the same position
+        if ghost.y == self.pacman.y and ghost.x == self.pacman.x:
+            return True
+        
+        # Check if they crossed paths (swapped positions)
+        # This happens when they move towards each other and pass through
+        pacman_old_y = self.pacman.y - self.pacman.dy
+        pacman_old_x = self.pacman.x - self.pacman.dx
+        
+        # Did pacman move from where ghost is now, and ghost move from where pacman is now?
+        if (pacman_old_y == ghost.y and pacman_old_x == ghost.x and
+            old_ghost_y == self.pacman.y and old_ghost_x == self.pacman.x):
+            return True
+        
+        return False
+    
+    def handle_collision(self, ghost):
+        """Handle collision between pacman and a ghost"""
+        if ghost.frightened:
+            # Eat ghost
+            self.score += 200
+            if self.events:
+                self.emit(GHOST_EATEN, ghost.y, ghost.x, ghost.spawn_index)
+            # Respawn ghost at its starting position
+            if ghost.spawn_index < len(self.ghost_starts):
+                start = self.ghost_starts[ghost.spawn_index]
+                old_cell = ghost.y * self.width + ghost.x
+                ghost.y = start.y
+                ghost.x = start.x
+                self.occupancy.move(ghost, old_cell, start.y * self.width + start.x)
+            ghost.frightened = False
+            ghost.dy = 0
+            ghost.dx = 0
+        else:
+            # Lose a life
+            self.lives -= 1
+            # A second check on the tick the game ends can land here again; report the end once
+            reported = self.events and not self.game_over
+            if reported:
+                self.emit(LIFE_LOST, self.pacman.y, self.pacman.x, self.lives)
+            if self.lives <= 0:
+                self.game_over = True
+                if reported:
+                    self.emit(GAME_OVER, value=self.score)
+            else:
+                # Reset positions
+                self.reset_positions()
+    
+    def reset_positions(self):
+        # Reset pacman to starting position
+        if self.pacman_start:
+            self.pacman.y = self.pacman_start.y
+            self.pacman.x = self.pacman_start.x
+        
+        self.pacman.dy = 0
+        self.pacman.dx = 0
+        self.pacman.next_dy = 0
+        self.pacman.next_dx = 0
+        
+        # Reset ghosts to their starting positions
+        for i, ghost in enumerate(self.ghosts):
+            if i < len(self.ghost_starts):
+                ghost.y = self.ghost_starts[i].y
+                ghost.x = self.ghost_starts[i].x
+            ghost.dy = 0
+            ghost.dx = 0
+            ghost.frightened = False
+        self.occupancy.reset(self.ghosts, self.width)
+        
+        self.timers.cancel('end_power_mode')
+        if self.ai:
+            self.ai.reset()
+    
+    def reset_game(self):
+        # Reset game state
+        self.score = 0
+        self.lives = 3
+        self.game_over = False
+        self.won = False
+        
+        # Reset pellets and power pills to initial state
+        self.refill_pellets()
+        
+        # Reset fruit to initial position
+        # Find it from the stored initial position
+        if self.initial_fruit:
+            self.fruit = self.initial_fruit
+        
+        # Reset positions
+        self.reset_positions()
+        if self.events:
+            self.emit(GAME_START)
+    
+    def snapshot(self):
+        """Everything that changes during play, for restore() to rewind to
+
+        Needs a clock with a settable now, such as SimClock, and an rng
+        with getstate(); the maze is shared and never copied.
+        """
+        pacman = self.pacman
+        return (
+            tuple(getattr(self, name) for name in STATE_FIELDS),
+            (pacman.y, pacman.x, pacman.dy, pacman.dx, pacman.next_dy, pacman.next_dx) if pacman else None,
+            [(g.y, g.x, g.dy, g.dx, g.frightened, g.frightened_time) for g in self.ghosts],
+            bytes(self.pellets),
+            bytes(self.power_pills),
+            self.clock.now,
+            self.rng.getstate(),
+            self.timers.state(),
+            self.ai.state() if self.ai else None,
+        )
+    
+    def restore(self, snapshot):
+        """Return to the state a snapshot() was taken in"""
+        fields, pacman, ghosts, pellets, power_pills, now, rng_state, timers, ai_mode = snapshot
+        for name, value in zip(STATE_FIELDS, fields):
+            setattr(self, name, value)
+        if pacman:
+            p = self.pacman
+            p.y, p.x, p.dy, p.dx, p.next_dy, p.next_dx = pacman
+        for g, state in zip(self.ghosts, ghosts):
+            g.y, g.x, g.dy, g.dx, g.frightened, g.frightened_time = state
+        self.occupancy.reset(self.ghosts, self.width)
+        self.pellets = Bitset(pellets)
+        self.power_pills = Bitset(power_pills)
+        self.pellets_owned = True
+        self.clock.now = now
+        self.rng.setstate(rng_state)
+        self.timers = Scheduler.from_state(timers)
+        if self.ai:
+            self.ai.set_state(ai_mode)
+    
+    def clone(self, rng=None):
+        """An independent headless copy of this game, cheap enough for search rollouts
+
+        The copy shares the maze and, copy-on-write, the pellet bitsets;
+        it gets its own entities, a SimClock at the current time and a
+        renderer that draws nothing. rng defaults to a copy of this
+        game's generator, so the copy plays out exactly as this would.
+        """
+        other = Simulation.__new__(Simulation)
+        state = other.__dict__
+        source = self.__dict__
+        for name in SHARED_FIELDS:
+            state[name] = source[name]
+        for name in STATE_FIELDS:
+            state[name] = source[name]
+        if rng is None:
+            rng = random.Random()
+            rng.setstate(self.rng.getstate())
+        other.rng = rng
+        other.clock = SimClock(self.clock())
+        other.renderer = NULL_RENDERER
+        other.events = None
+        other.eaten = None
+        other.pacman = self.pacman.copy() if self.pacman else None
+        other.ghosts = [ghost.copy() for ghost in self.ghosts]
+        other.occupancy = Occupancy(other.ghosts, other.width)
+        other.pellets = self.pellets
+        other.power_pills = self.power_pills
+        other.pellets_owned = self.pellets_owned = False
+        other.timers = self.timers.copy()
+        other.ai = GhostAI(other, self.ai.state()) if self.ai else None
+        return other
+    
+    def tick(self):
+        """Advance the simulation by one step"""
+        self.ticks += 1
+        self.move_pacman()
+        self.move_ghosts()
+        # Final collision check after all movements
+        self.check_collisions()
+    
+    def step(self, action=None):
+        """Advance one tick headlessly
+
+        action is one of DIRECTIONS to steer pacman, or None to keep going.
+        Returns True while the level is still being played.
+        """
+        if action is not None:
+            self.pacman.next_dy, self.pacman.next_dx = action
+        advance = getattr(self.clock, 'advance', None)
+        if advance:
+            advance(self.speed)
+        self.tick()
+        return not self.game_over and not self.won
+
+def random_policy(game, rng):
+    """Steer pacman in a random direction now and then"""
+    if rng.random() < 0.1:
+        return rng.choice(DIRECTIONS)
+    return None
+
+def run_headless(map_file, ticks, seed=None, ghost_ai='chase'):
+    """Play a headless game for a number of ticks; returns (game, seconds)"""
+    rng = random.Random(seed)
+    game = Simulation(map_file, rng=rng, ghost_ai=ghost_ai)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        if not game.step(random_policy(game, rng)):
+            if game.won:
+                game.next_level()
+            else:
+                game.reset_game()
+    return game, time.perf_counter() - start
+
+def measure_memory(map_file, games=1000):
+    """Return (bytes of the shared Maze, bytes per game) as traced by tracemalloc"""
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    maze = Maze.load(map_file)
+    after_maze = tracemalloc.get_traced_memory()[0]
+    sims = [Simulation(maze) for _ in range(games)]
+    after_games = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sims
+    return after_maze - start, (after_games - after_maze) / games
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Pac-Man headlessly as fast as possible')
+    parser.add_argument('map_file', nargs='?', default='pacman-map.txt')
+    parser.add_argument('--ticks', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--memory', action='store_true',
+                        help='report memory used by the maze and by each game instead')
+    args = parser.parse_args()
+    
+    if args.memory:
+        maze_bytes, game_bytes = measure_memory(args.map_file)
+        print(f"shared maze: {maze_bytes} bytes, per game: {game_bytes:.0f} bytes")
+        return
+    
+    game, elapsed = run_headless(args.map_file, args.ticks, args.seed)
+    print(f"{args.ticks} ticks in {elapsed:.3f}s ({args.ticks / elapsed:.0f} ticks/sec), "
+          f"score {game.score}, level {game.level}")
+
+if __name__ == '__main__':
+    main()